@@ -1,24 +1,60 @@
-import io
+import re
 import time
-import boto3
-from chalice import Chalice
+import uuid
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, List, Optional, Union
+import pandas as pd
+import pyarrow as pa
+from chalice import Chalice, Rate
 
 from .chalicelib.factory import lambda_name_standardization_factory
-from .chalicelib.iso3166.utils import load_to_s3
+from .chalicelib.iso3166.utils import load_to_s3, load_partitioned_to_s3, \
+    mapping_table, ParquetSpool, MappingSpool, RANDOM_ACCESS_FILE_TYPES, \
+    DetailedReportWriter
+from .chalicelib.iso3166.readers import split_extension, read_body, \
+    read_parquet
+from .chalicelib.iso3166.deferred import DeferredCollector, \
+    collect_deferred, resolve_deferred
+from .chalicelib.iso3166.converter import take_match_counts
+from .chalicelib.iso3166.aliases import encode_match_counts
 from .chalicelib.core.config import settings
+from .chalicelib.core.memory import plan_chunksize, peak_rss_mb
+from .chalicelib.core.profiling import profiled
+from .chalicelib.core.idempotency import create_idempotency_store, \
+    idempotency_key
 
 app = Chalice(app_name=settings.PROJECT_NAME)
 
-s3_client = boto3.client(
-    "s3",
-    endpoint_url="http://host.docker.internal:4566",
-    use_ssl=False,
-    aws_access_key_id=settings.ACCESS_KEY,
-    aws_secret_access_key=settings.SECRET_KEY,
-    aws_session_token=settings.SESSION_TOKEN)
+# One client per container, shared by all S3 operations and uploads
+s3_client = settings.create_client("s3")
+
+idempotency_store = create_idempotency_store(settings)
+
+# Unresolved values of the exact-only pass wait here for the batch worker,
+# one uniquely named object per invocation ({key}/{time}-{id}.parquet)
+DEFERRED_PREFIX = "deferred/"
+DEFERRED_SUFFIX = re.compile(r"/\d{8}-\d{6}-[0-9a-f]{8}\.parquet$")
+CORRECTIONS_PREFIX = "corrections/"
+MAPPING_PREFIX = "mapping/"
+DIAGNOSTICS_PREFIX = "diagnostics/"
+# Fuzzy match counts of each invocation, input of the alias promotion
+MATCH_COUNTS_PREFIX = "match_counts/"
+
+
+def _upload_diagnostics(name: str, payload: bytes) -> None:
+    """
+    Uploads a profile next to the error reports in the output bucket.
+    """
+
+    s3_client.put_object(Bucket=settings.OUTPUT_BUCKET,
+                         Key=f"{DIAGNOSTICS_PREFIX}{name}",
+                         Body=payload)
 
 
 @app.on_s3_event(bucket=settings.INPUT_BUCKET, events=["s3:ObjectCreated:*"])
+@profiled(settings.PROFILE_SAMPLE_RATE, sink=_upload_diagnostics,
+          profile_format=settings.PROFILE_FORMAT)
 def handle_object_creation(event):
     """
     ## **Function**
@@ -38,22 +74,323 @@ def handle_object_creation(event):
         Returns nothing.
     """
 
+    # Duplicate notifications and identical re-uploads are skipped, the key
+    # is claimed up front so concurrent duplicates can't both process it
+    dedup_key = None
+    if idempotency_store is not None:
+        dedup_key = _object_idempotency_key(event)
+        if not idempotency_store.claim(dedup_key):
+            app.log.info("Skipping already processed object %s", event.key)
+            return
+
+    try:
+        _standardize_object(event)
+
+    except BaseException:
+        # A failed run gives the object back to the retries
+        if dedup_key is not None:
+            idempotency_store.release(dedup_key)
+        raise
+
+    if dedup_key is not None:
+        idempotency_store.mark(dedup_key)
+
+
+def _standardize_object(event) -> None:
+    """
+    ## **Function**
+    ----------
+
+    Downloads the object of the event, standardizes it and uploads the
+    outputs.
+    """
+
     response = s3_client.get_object(Bucket=settings.INPUT_BUCKET,
                                     Key=event.key)
 
-    with io.BytesIO(response['Body'].read()) as data:
-        df1, df2 = lambda_name_standardization_factory(data=data,
-                                                       file_name=event.key)
+    # Files that do not fit the memory budget are read in chunks
+    chunksize = plan_chunksize(event.key, response["ContentLength"],
+                               settings.MEMORY_BUDGET_MB * 1024 ** 2)
+
+    # The body is decoded while streaming, only formats that need random
+    # access are buffered, once, into a preallocated buffer
+    file_type, compression = split_extension(event.key)
+    body = response['Body']
+
+    if compression or file_type not in RANDOM_ACCESS_FILE_TYPES:
+        data = body
+    else:
+        data = pa.BufferReader(read_body(body, response["ContentLength"]))
+
+    # The exact-only pass leaves the fuzzy matching to the batch worker
+    fuzzy_sample = 0.0 if settings.DEFER_FUZZY else settings.FUZZY_SAMPLE
+
+    # Drops the counts left by a failed invocation of the warm container
+    take_match_counts()
+
+    # The detailed report is spooled to /tmp while the chunks are converted
+    report_writer = None
+    if settings.DETAILED_REPORT is not None:
+        report_writer = DetailedReportWriter(
+            tempfile.TemporaryFile(),
+            aggregate=settings.DETAILED_REPORT == "values")
+
+    # Files read in chunks are spooled to /tmp as well, so the memory
+    # doesn't grow with the size of the file. Files that fit the budget are
+    # converted and uploaded as one dataframe
+    output, deferred, chunk_sinks = None, None, None
+    if chunksize is not None:
+        if settings.OUTPUT_MODE == "mapping":
+            output = MappingSpool(settings.OUTPUT_ROW_INDEX)
+        else:
+            output = ParquetSpool(partitioned=settings.PARTITION_OUTPUT)
+
+        chunk_sinks = [output]
+        if settings.DEFER_FUZZY:
+            deferred = DeferredCollector()
+            chunk_sinks.append(deferred)
+
+    try:
+        with data:
+            df1, df2 = lambda_name_standardization_factory(
+                data=data,
+                file_name=event.key,
+                fuzzy_threshold=settings.FUZZY_THRESHOLD,
+                sample_size=settings.DETECTION_SAMPLE_SIZE,
+                scorer=settings.SCORER,
+                fuzzy_sample=fuzzy_sample,
+                chunksize=chunksize,
+                report_writer=report_writer,
+                chunk_sinks=chunk_sinks)
+
+        _upload_outputs(event.key, df1, df2, output, report_writer,
+                        deferred)
+
+    finally:
+        if output is not None:
+            output.discard()
+        if report_writer is not None:
+            report_writer.sink.close()
+
+    app.log.info("Processed %s (chunksize %s), peak RSS %s MB", event.key,
+                 chunksize, peak_rss_mb())
+
+
+def _upload_outputs(key: str, df: pd.DataFrame, report: pd.DataFrame,
+                    output: Union[ParquetSpool, MappingSpool, None] = None,
+                    report_writer: Optional[DetailedReportWriter] = None,
+                    deferred: Optional[DeferredCollector] = None) -> None:
+    """
+    ## **Function**
+    ----------
+
+    Uploads the data, the error report and the deferred values of a
+    converted object. The data comes from the spool of a file read in
+    chunks, otherwise from the converted dataframe. The uploads are sent
+    concurrently over the pooled connections of the shared client.
+    """
+
+    current_time = time.strftime("%Y%m%d-%H%M%S")
+
+    with ThreadPoolExecutor(max_workers=settings.UPLOAD_WORKERS) as executor:
         # Load data to output bucket
+        if settings.OUTPUT_MODE == "mapping":
+            # Only the distinct values are uploaded, not the input columns
+            table, rows = (mapping_table(df, settings.OUTPUT_ROW_INDEX)
+                           if output is None else output.close(df.attrs))
+            uploads = [_submit_upload(executor, f"{MAPPING_PREFIX}{key}",
+                                      table)]
 
-        load_to_s3(s3_client=s3_client,
-                   destination=settings.OUTPUT_BUCKET,
-                   name="silver/{}".format(event.key),
-                   dataframe=df1)
+            if rows is not None:
+                uploads.append(_submit_upload(
+                    executor, f"{MAPPING_PREFIX}{key}-rows", rows))
+
+        elif settings.PARTITION_OUTPUT:
+            if output is None:
+                uploads = [executor.submit(
+                    load_partitioned_to_s3,
+                    s3_client=s3_client,
+                    destination=settings.OUTPUT_BUCKET,
+                    prefix="silver/{}".format(key),
+                    dataframe=df,
+                    max_partitions=settings.MAX_PARTITIONS,
+                    max_workers=settings.UPLOAD_WORKERS)]
+            else:
+                uploads = [executor.submit(
+                    output.upload_partitioned,
+                    s3_client=s3_client,
+                    destination=settings.OUTPUT_BUCKET,
+                    prefix="silver/{}".format(key),
+                    attrs=df.attrs,
+                    max_partitions=settings.MAX_PARTITIONS,
+                    max_workers=settings.UPLOAD_WORKERS)]
+        else:
+            uploads = [_submit_upload(
+                executor, "silver/{}".format(key),
+                df if output is None else output.close(df.attrs))]
 
         # Load error report to bucket
-        current_time = time.strftime("%Y%m%d-%H%M%S")
+        uploads.append(executor.submit(
+            load_to_s3,
+            s3_client=s3_client,
+            destination=settings.OUTPUT_BUCKET,
+            name=f"error_report/{key}-{current_time}",
+            dataframe=report))
+
+        if report_writer is not None:
+            uploads.append(executor.submit(
+                s3_client.put_object,
+                Bucket=settings.OUTPUT_BUCKET,
+                Key=f"error_report/{key}-{current_time}-detailed",
+                Body=report_writer.close()))
+
+        match_counts = take_match_counts()
+        if match_counts:
+            uploads.append(executor.submit(
+                s3_client.put_object,
+                Bucket=settings.OUTPUT_BUCKET,
+                Key=f"{MATCH_COUNTS_PREFIX}{key}-{current_time}.json",
+                Body=encode_match_counts(match_counts)))
+
+        if settings.DEFER_FUZZY:
+            values = (collect_deferred(df) if deferred is None
+                      else deferred.values)
+            if values is not None and not values.empty:
+                uploads.append(_submit_upload(
+                    executor, _deferred_key(key, current_time), values))
+
+        # Raises the error of a failed upload before the object is marked
+        for upload in uploads:
+            upload.result()
+
+
+def _submit_upload(executor: ThreadPoolExecutor, key: str,
+                   data: Union[pd.DataFrame, BinaryIO]):
+    """
+    Submits the upload of a dataframe or of a finished spool file.
+    """
+
+    if isinstance(data, pd.DataFrame):
+        return executor.submit(load_to_s3,
+                               s3_client=s3_client,
+                               destination=settings.OUTPUT_BUCKET,
+                               name=key,
+                               dataframe=data)
+
+    return executor.submit(s3_client.put_object,
+                           Bucket=settings.OUTPUT_BUCKET,
+                           Key=key,
+                           Body=data)
+
+
+@app.schedule(Rate(settings.DEFERRED_SCHEDULE_MINUTES, unit=Rate.MINUTES))
+def resolve_deferred_queue(event):
+    """
+    ## **Function**
+    ----------
+
+    Batch worker that fuzzy matches the values deferred by the exact-only
+    pass of `handle_object_creation`. The queued values of all files are
+    matched together in bounded batches (`DEFERRED_BATCH_SIZE` objects), so
+    a value shared by many files is matched once per batch. A correction
+    file is written per input file and the resolved objects are deleted.
+    Without `DEFER_FUZZY` the schedule returns without listing the bucket.
+
+    ## **Parameters**
+    ----------
+
+    `event`:
+        Event is a parameter defined by the chalice wrapper.
+
+    `return None`:
+        Returns nothing.
+    """
+
+    if not settings.DEFER_FUZZY:
+        return
+
+    batch = []
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=settings.OUTPUT_BUCKET,
+                                   Prefix=DEFERRED_PREFIX):
+        for item in page.get("Contents", []):
+            batch.append(item["Key"])
+
+            if len(batch) >= settings.DEFERRED_BATCH_SIZE:
+                _resolve_deferred_batch(batch)
+                batch = []
+
+    if batch:
+        _resolve_deferred_batch(batch)
+
+
+def _resolve_deferred_batch(keys: List[str]) -> None:
+    """
+    ## **Function**
+    ----------
+
+    Resolves a bounded batch of queued objects. The keys are listed in
+    order, so when an input was uploaded again its newest deferred object is
+    resolved last and its corrections replace the older ones. Every deferred
+    object has a unique name, so deleting it can't drop the values of an
+    upload that was queued in the meantime.
+    """
+
+    queued = {}
+    for key in keys:
+        response = s3_client.get_object(Bucket=settings.OUTPUT_BUCKET,
+                                        Key=key)
+        queued[key] = read_parquet(pa.BufferReader(
+            read_body(response["Body"], response["ContentLength"])))
+
+    corrections = resolve_deferred(pd.concat(queued.values(),
+                                             ignore_index=True),
+                                   fuzzy_threshold=settings.FUZZY_THRESHOLD,
+                                   scorer=settings.SCORER)
+
+    for key, deferred in queued.items():
         load_to_s3(s3_client=s3_client,
                    destination=settings.OUTPUT_BUCKET,
-                   name=f"error_report/{event.key}-{current_time}",
-                   dataframe=df2)
+                   name=CORRECTIONS_PREFIX + _deferred_input_key(key),
+                   dataframe=corrections[
+                       corrections["value"].isin(deferred["value"])])
+        s3_client.delete_object(Bucket=settings.OUTPUT_BUCKET, Key=key)
+
+
+def _deferred_key(key: str, current_time: str) -> str:
+    """
+    Creates a unique queue key for the deferred values of an invocation.
+    """
+
+    return f"{DEFERRED_PREFIX}{key}/{current_time}-{uuid.uuid4().hex[:8]}" \
+           ".parquet"
+
+
+def _deferred_input_key(deferred_key: str) -> str:
+    """
+    Returns the input key of a queued object.
+    """
+
+    return DEFERRED_SUFFIX.sub("", deferred_key[len(DEFERRED_PREFIX):])
+
+
+def _object_idempotency_key(event) -> str:
+    """
+    ## **Function**
+    ----------
+
+    Creates the idempotency key of the object in the event. The ETag and
+    size are taken from the notification itself and only requested with
+    head_object if the notification does not contain them.
+    """
+
+    try:
+        s3_object = event.to_dict()["Records"][0]["s3"]["object"]
+        etag, size = s3_object["eTag"], s3_object["size"]
+
+    except (KeyError, IndexError):
+        head = s3_client.head_object(Bucket=settings.INPUT_BUCKET,
+                                     Key=event.key)
+        etag, size = head["ETag"], head["ContentLength"]
+
+    return idempotency_key(settings.INPUT_BUCKET, event.key, etag, size)
@@ -0,0 +1,406 @@
+import os
+import sys
+import glob
+import time
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional
+
+import pandas as pd
+
+from . import iso3166
+from .factory import standardize_file
+from .core.manifest import ProcessedFileManifest
+from .core.profiling import Profiler
+from .error.exceptions import FileLoadingError, FileSavingError
+from .iso3166 import dispatcher, readers
+from .iso3166.aliases import ALIAS_PATH, save_match_counts, \
+    merge_match_counts, promote_matches
+from .iso3166.converter import take_match_counts
+from .iso3166.scorers import scorers
+from .iso3166.utils import StageTimer, EXPORT_FORMATS, OUTPUT_MODES, \
+    REPORT_PATH
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    ## **Function**
+    ----------
+
+    Parses the command line arguments of the batch interface. The
+    subcommands "convert", "restandardize" and "promote" set the function
+    that runs them as `args.func`.
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="python -m application.chalicelib",
+        description="Standardizes the country names and codes of local "
+                    "files to the ISO3166 format.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    convert = subparsers.add_parser(
+        "convert", help="Standardizes local files.",
+        description="Standardizes the country names and codes of local "
+                    "files to the ISO3166 format.")
+    convert.set_defaults(func=run)
+    convert.add_argument("inputs", nargs="+",
+                         help="Files, folders or glob patterns "
+                              "(e.g. 'exports/**/*.csv.gz').")
+    convert.add_argument("-o", "--output", required=True,
+                         help="Folder the standardized files are written "
+                              "to.")
+    convert.add_argument("-w", "--workers", type=int, default=1,
+                         help="Number of files processed in parallel.")
+    convert.add_argument("--chunksize", type=int, default=None,
+                         help="Rows per chunk for the file types that can be "
+                              "read in chunks.")
+    convert.add_argument("--format", dest="output_format", default="parquet",
+                         choices=sorted(EXPORT_FORMATS),
+                         help="Format of the standardized files.")
+    convert.add_argument("--output-mode", default="frame",
+                         choices=OUTPUT_MODES,
+                         help="Writes the whole file or only a mapping table "
+                              "of the distinct values.")
+    convert.add_argument("--row-index", action="store_true",
+                         help="Writes the mapping table row of each input "
+                              "row as well (mapping mode).")
+    convert.add_argument("--manifest", default=None,
+                         help="Manifest of the processed files, unchanged "
+                              "files are skipped on reruns.")
+    convert.add_argument("--colspec-cache", default=None,
+                         help="Cache file of the fixed-width layouts.")
+    convert.add_argument("--report-dir", default=REPORT_PATH,
+                         help="Folder the error report is written to.")
+    convert.add_argument("--detailed-report", action="store_true",
+                         help="Report the unmatched rows instead of counts.")
+    convert.add_argument("--fuzzy-threshold", type=int, default=70)
+    convert.add_argument("--sample-size", type=int, default=10,
+                         help="Values sampled from each column by the "
+                              "column auto-detection.")
+    convert.add_argument("--scorer", default="levenshtein",
+                         choices=sorted(scorers.registry))
+    convert.add_argument("--fuzzy-sample", type=float, default=None,
+                         help="Share of the unmatched values that is fuzzy "
+                              "matched, 0 only runs the exact matching.")
+    convert.add_argument("--fast-mode", action="store_true",
+                         help="Only match against the detected naming "
+                              "column.")
+    convert.add_argument("--profile", action="store_true",
+                         help="Print the time spent in each stage.")
+    convert.add_argument("--profile-dump", default=None,
+                         help="Writes a profile of the main process, in the "
+                              "pstats format for .prof files and as "
+                              "collapsed stacks otherwise.")
+    convert.add_argument("--match-counts", default=None,
+                         help="Json file the fuzzy match counts are merged "
+                              "into, defaults to the report folder.")
+
+    restandardize_parser = subparsers.add_parser(
+        "restandardize", help="Updates standardized files in place.",
+        description="Updates standardized parquet files in place after the "
+                    "reference data changed.")
+    restandardize_parser.set_defaults(func=restandardize)
+    restandardize_parser.add_argument(
+        "inputs", nargs="+",
+        help="Standardized parquet files, folders or glob patterns.")
+
+    promote_parser = subparsers.add_parser(
+        "promote", help="Promotes fuzzy matches into the aliases.",
+        description="Promotes frequent fuzzy matches into the aliases.")
+    promote_parser.set_defaults(func=promote)
+    promote_parser.add_argument("counts", nargs="+",
+                                help="Match count files of the CLI or the "
+                                     "handler.")
+    promote_parser.add_argument("--min-count", type=int, default=10)
+    promote_parser.add_argument("--aliases", default=ALIAS_PATH,
+                                help="Alias json file that is updated.")
+
+    return parser.parse_args(argv)
+
+
+def expand_inputs(patterns: List[str]) -> List[str]:
+    """
+    ## **Function**
+    ----------
+
+    Expands the input arguments into a sorted list of files. Folders are
+    expanded to the files they contain and glob patterns support `**`.
+
+    `return list[str]`:
+        Returns the paths of the files.
+    """
+
+    files = set()
+    for pattern in patterns:
+        for path in glob.glob(pattern, recursive=True) or [pattern]:
+            if os.path.isdir(path):
+                files.update(os.path.join(path, f) for f in os.listdir(path)
+                             if os.path.isfile(os.path.join(path, f)))
+            elif os.path.isfile(path):
+                files.add(path)
+
+    if not files:
+        raise FileLoadingError(message="Error - no files found for "
+                                       f"{' '.join(patterns)}")
+
+    return sorted(files)
+
+
+def output_names(files: List[str]) -> List[str]:
+    """
+    ## **Function**
+    ----------
+
+    Names the outputs of the input files by their path relative to the
+    common folder of all inputs, so that e.g. `a/data.csv.gz` and
+    `b/data.csv.gz` are written to `a/` and `b/` in the output folder
+    instead of to the same file.
+
+    `return list[str]`:
+        Returns the output name of each file.
+    """
+
+    if not files:
+        return []
+
+    paths = [os.path.abspath(path) for path in files]
+    root = os.path.commonpath([os.path.dirname(path) for path in paths])
+
+    return [os.path.relpath(path, root) for path in paths]
+
+
+def _init_worker(colspec_cache: Optional[str]) -> None:
+    """
+    Sets up the shared state of a worker process.
+    """
+
+    if colspec_cache is not None:
+        dispatcher.COLSPEC_CACHE = readers.ColspecCache(colspec_cache)
+
+
+def _process(file_path: str, output_name: str,
+             args: argparse.Namespace) -> tuple:
+    """
+    Standardizes one file, in the main process or in a worker.
+    """
+
+    timer = StageTimer()
+    start_time = time.perf_counter()
+
+    report, output_path, rows = standardize_file(
+        file_path,
+        output_name,
+        args.output,
+        iso3166.utils.generate_report_template(),
+        detailed_report=args.detailed_report,
+        chunksize=args.chunksize,
+        output_format=args.output_format,
+        timer=timer,
+        output_mode=args.output_mode,
+        row_index=args.row_index,
+        output_name=output_name,
+        fuzzy_threshold=args.fuzzy_threshold,
+        sample_size=args.sample_size,
+        fast_mode=args.fast_mode,
+        scorer=args.scorer,
+        fuzzy_sample=args.fuzzy_sample)
+
+    # The counts are taken per file, so the workers report them as well
+    return (file_path, report, output_path, rows,
+            time.perf_counter() - start_time, timer.timings,
+            take_match_counts())
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    ## **Function**
+    ----------
+
+    Entry point of the batch interface, optionally profiled.
+
+    ## **Parameters**
+    ----------
+
+    `argv`:
+        The command line arguments, defaults to `sys.argv`.
+
+    `return int`:
+        Returns the exit code.
+    """
+
+    args = parse_args(argv)
+
+    # Only the conversion can be profiled
+    if getattr(args, "profile_dump", None) is None:
+        return args.func(args)
+
+    profile_format = ("pstats" if args.profile_dump.endswith(".prof")
+                      else "collapsed")
+
+    with Profiler(profile_format) as profiler:
+        exit_code = run(args)
+
+    with open(args.profile_dump, "wb") as fh:
+        fh.write(profiler.dump())
+
+    return exit_code
+
+
+def run(args: argparse.Namespace) -> int:
+    """
+    ## **Function**
+    ----------
+
+    Runs the batch interface. The files are standardized one after the
+    other or by a pool of worker processes, the progress is printed with
+    the throughput in rows per second.
+
+    ## **Parameters**
+    ----------
+
+    `args`:
+        The parsed command line arguments.
+
+    `return int`:
+        Returns the exit code.
+    """
+
+    os.makedirs(args.output, exist_ok=True)
+
+    manifest = None
+    if args.manifest is not None:
+        manifest = ProcessedFileManifest(args.manifest)
+
+    # The outputs are named relative to the root of all inputs, also of the
+    # files skipped by the manifest, so reruns keep the same names
+    files = expand_inputs(args.inputs)
+    names = dict(zip(files, output_names(files)))
+    files = [path for path in files
+             if manifest is None or not manifest.is_processed(path)]
+
+    timer = StageTimer()
+    reports = []
+    total_rows = 0
+    match_counts = Counter()
+    start_time = time.perf_counter()
+
+    _init_worker(args.colspec_cache)
+
+    if args.workers > 1:
+        executor = ProcessPoolExecutor(max_workers=args.workers,
+                                       initializer=_init_worker,
+                                       initargs=(args.colspec_cache,))
+        results = as_completed([executor.submit(_process, path,
+                                                names[path], args)
+                                for path in files])
+        results = (future.result() for future in results)
+    else:
+        executor = None
+        results = (_process(path, names[path], args) for path in files)
+
+    try:
+        for done, result in enumerate(results, start=1):
+            (file_path, report, output_path, rows, seconds, timings,
+             counts) = result
+
+            reports.append(report)
+            timer.merge(timings)
+            match_counts.update(counts)
+            total_rows += rows
+
+            if manifest is not None:
+                manifest.record(file_path, output_path)
+
+            elapsed = time.perf_counter() - start_time
+            print(f"[{done}/{len(files)}] {file_path}: {rows} rows in "
+                  f"{seconds:.2f}s ({rows / max(seconds, 1e-9):,.0f} rows/s)"
+                  f" - total {total_rows / max(elapsed, 1e-9):,.0f} rows/s",
+                  file=sys.stderr)
+
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    report = (pd.concat(reports, ignore_index=True) if reports
+              else iso3166.utils.generate_report_template())
+    iso3166.utils.finalize_report(report, path=args.report_dir)
+
+    if match_counts:
+        save_match_counts(match_counts, args.match_counts or os.path.join(
+            args.report_dir, "fuzzy_match_counts.json"))
+
+    if args.profile:
+        print(timer.summary(), file=sys.stderr)
+
+    return 0
+
+
+def restandardize(args: argparse.Namespace) -> int:
+    """
+    ## **Function**
+    ----------
+
+    Rewrites the rows of standardized parquet files whose values map to
+    different iso3166 fields with the current reference data. The other
+    files are only opened to read the recorded reference version.
+
+    ## **Parameters**
+    ----------
+
+    `args`:
+        The parsed command line arguments.
+
+    `return int`:
+        Returns the exit code.
+    """
+
+    files = [path for path in expand_inputs(args.inputs)
+             if readers.split_extension(path)[0] == ".parquet"]
+
+    exit_code = 0
+    for done, file_path in enumerate(files, start=1):
+        # Partition files whose codes changed are reported and left as
+        # they are, the other files are still rewritten
+        try:
+            rows = iso3166.restandardize.restandardize_file(file_path)
+
+        except FileSavingError as e:
+            print(f"[{done}/{len(files)}] {file_path}: {e}", file=sys.stderr)
+            exit_code = 1
+            continue
+
+        print(f"[{done}/{len(files)}] {file_path}: {rows} rows rewritten",
+              file=sys.stderr)
+
+    return exit_code
+
+
+def promote(args: argparse.Namespace) -> int:
+    """
+    ## **Function**
+    ----------
+
+    Promotes the fuzzy matches collected by previous runs into the alias
+    dictionary, e.g. `python -m application.chalicelib promote
+    reports/fuzzy_match_counts.json match_counts/*.json --min-count 10`.
+
+    ## **Parameters**
+    ----------
+
+    `args`:
+        The parsed command line arguments.
+
+    `return int`:
+        Returns the exit code.
+    """
+
+    promoted = promote_matches(merge_match_counts(args.counts),
+                               min_count=args.min_count, path=args.aliases)
+    print(f"Promoted {promoted} aliases", file=sys.stderr)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
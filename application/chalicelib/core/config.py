@@ -1,9 +1,23 @@
 from os import getenv
+from typing import Any, Optional
+
+import boto3
+from botocore.config import Config
 from dotenv import main
 
 main.load_dotenv()
 
 
+def getenv_bool(name: str, default: bool = False) -> bool:
+    """
+    Reads a boolean flag from the environment.
+    """
+    value = getenv(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+
 class ApplicationSettings:
 
     PROJECT_NAME: str = "ISO-3166-Standardizer"
@@ -12,6 +26,105 @@ class ApplicationSettings:
     ACCESS_KEY: str = getenv("ACCESS_KEY")
     SECRET_KEY: str = getenv("SECRET_KEY")
     SESSION_TOKEN: str = getenv("SESSION_TOKEN")
+    # LocalStack by default, an empty value uses the AWS endpoint
+    S3_ENDPOINT_URL: str = getenv("S3_ENDPOINT_URL",
+                                  "http://host.docker.internal:4566") or None
+    # Shared by the main upload, the report upload and the partition uploads
+    MAX_POOL_CONNECTIONS: int = int(getenv("MAX_POOL_CONNECTIONS", "32"))
+    TCP_KEEPALIVE: bool = getenv_bool("TCP_KEEPALIVE", True)
+    RETRY_MODE: str = getenv("RETRY_MODE", "adaptive")
+    MAX_ATTEMPTS: int = int(getenv("MAX_ATTEMPTS", "5"))
+    CONNECT_TIMEOUT: float = float(getenv("CONNECT_TIMEOUT", "5"))
+    READ_TIMEOUT: float = float(getenv("READ_TIMEOUT", "60"))
+    PARTITION_OUTPUT: bool = getenv_bool("PARTITION_OUTPUT")
+    # "frame" (input with the iso3166 columns) or "mapping" (distinct values)
+    OUTPUT_MODE: str = getenv("OUTPUT_MODE", "frame")
+    OUTPUT_ROW_INDEX: bool = getenv_bool("OUTPUT_ROW_INDEX")
+    MAX_PARTITIONS: int = int(getenv("MAX_PARTITIONS", "64"))
+    CSV_ENGINE: str = getenv("CSV_ENGINE")
+    CSV_SAMPLE_ROWS: int = int(getenv("CSV_SAMPLE_ROWS", "100"))
+    JSON_CHUNK_SIZE: int = int(getenv("JSON_CHUNK_SIZE", "10000"))
+    FWF_CHUNK_SIZE: int = int(getenv("FWF_CHUNK_SIZE", "50000"))
+    COLSPEC_CACHE_PATH: str = getenv("COLSPEC_CACHE_PATH")
+    IDEMPOTENCY_STORE: str = getenv("IDEMPOTENCY_STORE")
+    IDEMPOTENCY_PATH: str = getenv("IDEMPOTENCY_PATH",
+                                   "/tmp/iso3166-idempotency")
+    IDEMPOTENCY_TABLE: str = getenv("IDEMPOTENCY_TABLE")
+    DYNAMODB_ENDPOINT_URL: str = getenv("DYNAMODB_ENDPOINT_URL")
+    FUZZY_THRESHOLD: int = int(getenv("FUZZY_THRESHOLD", "70"))
+    # Values sampled from each column by the column auto-detection
+    DETECTION_SAMPLE_SIZE: int = int(getenv("DETECTION_SAMPLE_SIZE", "10"))
+    SCORER: str = getenv("SCORER", "levenshtein")
+    UPLOAD_WORKERS: int = int(getenv("UPLOAD_WORKERS", "8"))
+    # "rows" (row offset and raw value) or "values" (distinct value counts)
+    DETAILED_REPORT: str = getenv("DETAILED_REPORT")
+    # Profiles 1 in N invocations, 0 disables the profiling
+    PROFILE_SAMPLE_RATE: int = int(getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_FORMAT: str = getenv("PROFILE_FORMAT", "pstats")
+    FUZZY_SAMPLE: float = (float(getenv("FUZZY_SAMPLE"))
+                           if getenv("FUZZY_SAMPLE") else None)
+    # Queues the values without an exact match for the scheduled batch
+    # worker, which does nothing while this is off
+    DEFER_FUZZY: bool = getenv_bool("DEFER_FUZZY")
+    DEFERRED_SCHEDULE_MINUTES: int = int(getenv("DEFERRED_SCHEDULE_MINUTES",
+                                                "15"))
+    # Queued objects read and resolved together by the batch worker
+    DEFERRED_BATCH_SIZE: int = int(getenv("DEFERRED_BATCH_SIZE", "100"))
+    # Defaults to the memory size of the Lambda function
+    MEMORY_BUDGET_MB: int = int(getenv(
+        "MEMORY_BUDGET_MB", getenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", "1024")))
+
+    def client_config(self) -> Config:
+        """
+        ## **Function**
+        ----------
+
+        Builds the botocore configuration of the AWS clients: connection
+        pool size, TCP keepalive, retry mode and timeouts.
+
+        `return Config`:
+            Returns the client configuration.
+        """
+
+        return Config(max_pool_connections=self.MAX_POOL_CONNECTIONS,
+                      tcp_keepalive=self.TCP_KEEPALIVE,
+                      retries={"mode": self.RETRY_MODE,
+                               "max_attempts": self.MAX_ATTEMPTS},
+                      connect_timeout=self.CONNECT_TIMEOUT,
+                      read_timeout=self.READ_TIMEOUT)
+
+    def create_client(self, service: str = "s3",
+                      endpoint_url: Optional[str] = None) -> Any:
+        """
+        ## **Function**
+        ----------
+
+        Creates an AWS client with the application credentials and the
+        shared client configuration. The clients are created once per
+        container, so warm invocations reuse the pooled connections.
+
+        ## **Parameters**
+        ----------
+
+        `service`:
+            Name of the AWS service.
+
+        `endpoint_url`:
+            Endpoint of the service, defaults to `S3_ENDPOINT_URL` for s3.
+
+        `return Any`:
+            Returns the boto3 client.
+        """
+
+        if endpoint_url is None and service == "s3":
+            endpoint_url = self.S3_ENDPOINT_URL
+
+        return boto3.client(service,
+                            endpoint_url=endpoint_url,
+                            aws_access_key_id=self.ACCESS_KEY,
+                            aws_secret_access_key=self.SECRET_KEY,
+                            aws_session_token=self.SESSION_TOKEN,
+                            config=self.client_config())
 
 
 settings = ApplicationSettings()
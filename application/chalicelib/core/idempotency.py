@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+from botocore.exceptions import ClientError
+
+# Seconds after which the claim of an invocation that neither finished nor
+# failed (e.g. a timeout) can be taken over, the maximum Lambda timeout
+CLAIM_TIMEOUT = 900
+
+PROCESSING = "processing"
+PROCESSED = "processed"
+
+
+def idempotency_key(bucket: str, key: str, etag: str, size: int) -> str:
+    """
+    ## **Function**
+    ----------
+
+    Creates the key of an uploaded object. Duplicate notifications and
+    re-uploads of identical content to the same key share the same ETag and
+    size and therefore the same idempotency key.
+
+    ## **Parameters**
+    ----------
+
+    `bucket`:
+        Name of the bucket.
+
+    `key`:
+        Key of the object.
+
+    `etag`:
+        ETag of the object.
+
+    `size`:
+        Size of the object in bytes.
+
+    `return str`:
+        Returns the idempotency key.
+    """
+
+    # The ETag is quoted in head_object responses but not in notifications
+    etag = etag.strip('"')
+
+    return f"{bucket}/{key}:{etag}:{size}"
+
+
+class IdempotencyStore(ABC):
+
+    """
+    Base class of the stores that remember which objects were processed.
+    An object is claimed before it is processed, so concurrent duplicate
+    notifications can't both process it. The claim is marked as processed
+    after a successful run and released after a failed one, so the retries
+    can claim it again. Claims older than `claim_timeout` seconds (e.g. of a
+    timed out invocation) can be taken over.
+    """
+
+    def __init__(self, claim_timeout: float = CLAIM_TIMEOUT):
+        self.claim_timeout = claim_timeout
+
+    @abstractmethod
+    def claim(self, key: str) -> bool:
+        """
+        Atomically claims a key, returns False if it was already processed
+        or is claimed by a running invocation.
+        """
+
+    @abstractmethod
+    def mark(self, key: str) -> None:
+        """
+        Marks a claimed key as processed.
+        """
+
+    @abstractmethod
+    def release(self, key: str) -> None:
+        """
+        Releases the claim of a key whose processing failed.
+        """
+
+    @abstractmethod
+    def seen(self, key: str) -> bool:
+        """
+        Checks if a key was processed.
+        """
+
+
+class LocalFileIdempotencyStore(IdempotencyStore):
+
+    """
+    Store that keeps one marker file per key in a folder. The claims are
+    created with O_EXCL, so they are atomic between the threads and the
+    processes of one machine. Suited for tests and for a single warm
+    container (e.g. under /tmp).
+    """
+
+    def __init__(self, path: str, claim_timeout: float = CLAIM_TIMEOUT):
+        super().__init__(claim_timeout)
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _marker(self, key: str) -> str:
+        return os.path.join(self.path,
+                            hashlib.sha1(key.encode()).hexdigest())
+
+    def _read(self, key: str) -> Optional[dict]:
+        try:
+            with open(self._marker(key)) as fh:
+                return json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def claim(self, key: str) -> bool:
+        marker = self._marker(key)
+        record = json.dumps({"key": key, "status": PROCESSING,
+                             "claimed_at": time.time()})
+
+        for _ in range(2):
+            try:
+                fd = os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                current = self._read(key)
+                if (current is None or current["status"] != PROCESSING
+                        or current["claimed_at"]
+                        > time.time() - self.claim_timeout):
+                    return False
+
+                # Only one of the invocations taking over an expired claim
+                # can move the marker away
+                try:
+                    os.rename(marker, f"{marker}.{uuid.uuid4().hex}.expired")
+                except FileNotFoundError:
+                    return False
+                continue
+
+            with os.fdopen(fd, "w") as fh:
+                fh.write(record)
+            return True
+
+        return False
+
+    def mark(self, key: str) -> None:
+        marker = self._marker(key)
+        temporary = f"{marker}.{uuid.uuid4().hex}.tmp"
+
+        with open(temporary, "w") as fh:
+            json.dump({"key": key, "status": PROCESSED,
+                       "processed_at": time.time()}, fh)
+        os.replace(temporary, marker)
+
+    def release(self, key: str) -> None:
+        try:
+            os.remove(self._marker(key))
+        except FileNotFoundError:
+            pass
+
+    def seen(self, key: str) -> bool:
+        record = self._read(key)
+        return record is not None and record["status"] == PROCESSED
+
+
+class DynamoDBIdempotencyStore(IdempotencyStore):
+
+    """
+    Store that keeps the processed keys in a DynamoDB table with a string
+    partition key named `id`. The claims are conditional writes. Works with
+    DynamoDB Local by passing a client with a local endpoint.
+    """
+
+    def __init__(self, client: Any, table_name: str,
+                 claim_timeout: float = CLAIM_TIMEOUT):
+        super().__init__(claim_timeout)
+        self.client = client
+        self.table_name = table_name
+
+    def claim(self, key: str) -> bool:
+        now = time.time()
+
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={"id": {"S": key},
+                      "status": {"S": PROCESSING},
+                      "claimed_at": {"N": str(now)}},
+                ConditionExpression="attribute_not_exists(id) OR "
+                                    "(#status = :processing AND "
+                                    "claimed_at < :expired)",
+                ExpressionAttributeNames={"#status": "status"},
+                ExpressionAttributeValues={
+                    ":processing": {"S": PROCESSING},
+                    ":expired": {"N": str(now - self.claim_timeout)}})
+
+        except ClientError as err:
+            if err.response["Error"]["Code"] == \
+                    "ConditionalCheckFailedException":
+                return False
+            raise
+
+        return True
+
+    def mark(self, key: str) -> None:
+        self.client.put_item(TableName=self.table_name,
+                             Item={"id": {"S": key},
+                                   "status": {"S": PROCESSED},
+                                   "processed_at": {"N": str(time.time())}})
+
+    def release(self, key: str) -> None:
+        self.client.delete_item(TableName=self.table_name,
+                                Key={"id": {"S": key}})
+
+    def seen(self, key: str) -> bool:
+        response = self.client.get_item(TableName=self.table_name,
+                                        Key={"id": {"S": key}},
+                                        ConsistentRead=True)
+
+        # Items written before the claims were introduced have no status
+        status = response.get("Item", {}).get("status", {"S": PROCESSED})
+        return "Item" in response and status["S"] == PROCESSED
+
+
+def create_idempotency_store(settings: Any) -> Optional[IdempotencyStore]:
+    """
+    ## **Function**
+    ----------
+
+    Creates the idempotency store configured in the application settings.
+
+    ## **Parameters**
+    ----------
+
+    `settings`:
+        The application settings.
+
+    `return IdempotencyStore | None`:
+        Returns the store or None if deduplication is disabled.
+    """
+
+    if settings.IDEMPOTENCY_STORE == "local":
+        return LocalFileIdempotencyStore(settings.IDEMPOTENCY_PATH)
+
+    if settings.IDEMPOTENCY_STORE == "dynamodb":
+        client = settings.create_client("dynamodb",
+                                        settings.DYNAMODB_ENDPOINT_URL)
+        return DynamoDBIdempotencyStore(client, settings.IDEMPOTENCY_TABLE)
+
+    return None
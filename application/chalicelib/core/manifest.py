@@ -0,0 +1,125 @@
+import os
+import json
+import hashlib
+from typing import Dict, Optional
+
+
+class ProcessedFileManifest(object):
+
+    """
+    Class keeps track of the input files that were already processed by a
+    batch run. Each entry is keyed by the input path and stores the size,
+    modification time and content hash of the file, so reruns can skip
+    unchanged files and interrupted runs resume where they stopped. The
+    manifest is a json file that is rewritten after every processed file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Dict[str, dict] = {}
+
+        if os.path.exists(path):
+            with open(path) as fh:
+                self._entries = json.load(fh)
+
+    def is_processed(self, file_path: str) -> bool:
+        """
+        ## **Function**
+        ----------
+
+        Checks if a file was processed before and has not changed since.
+        The content hash is only calculated when the size matches but the
+        modification time does not (e.g. the file was copied again).
+
+        ## **Parameters**
+        ----------
+
+        `file_path`:
+            Path of the input file.
+
+        `return bool`:
+            Returns True if the file can be skipped.
+        """
+
+        entry = self._entries.get(os.path.abspath(file_path))
+        if entry is None:
+            return False
+
+        stat = os.stat(file_path)
+        if stat.st_size != entry["size"]:
+            return False
+
+        if stat.st_mtime_ns == entry["mtime_ns"]:
+            return True
+
+        return file_hash(file_path) == entry["sha256"]
+
+    def record(self, file_path: str,
+               output_path: Optional[str] = None) -> None:
+        """
+        ## **Function**
+        ----------
+
+        Records a processed file and saves the manifest.
+
+        ## **Parameters**
+        ----------
+
+        `file_path`:
+            Path of the input file.
+
+        `output_path`:
+            Path of the file the output was written to.
+
+        `return None`:
+            Returns nothing.
+        """
+
+        stat = os.stat(file_path)
+        self._entries[os.path.abspath(file_path)] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_hash(file_path),
+            "output": output_path}
+
+        self.save()
+
+    def save(self) -> None:
+        """
+        Writes the manifest to a temporary file and swaps it in, so an
+        interrupted run never leaves a truncated manifest behind.
+        """
+
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as fh:
+            json.dump(self._entries, fh, indent=2)
+
+        os.replace(temp_path, self.path)
+
+
+def file_hash(file_path: str, block_size: int = 1 << 20) -> str:
+    """
+    ## **Function**
+    ----------
+
+    Calculates the sha256 hash of a file without loading it into memory.
+
+    ## **Parameters**
+    ----------
+
+    `file_path`:
+        Path of the file.
+
+    `block_size`:
+        Number of bytes read at once.
+
+    `return str`:
+        Returns the hex digest of the file content.
+    """
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as fh:
+        for block in iter(lambda: fh.read(block_size), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
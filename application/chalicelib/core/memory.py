@@ -0,0 +1,118 @@
+from typing import Optional
+
+from ..iso3166.readers import split_extension, CHUNKED_FILE_TYPES
+
+# resource is only available on unix systems
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Rough ratio of the in-memory size of a parsed file (including the parsing
+# and conversion buffers) to its size on disk
+FOOTPRINT_FACTORS = {".csv": 6,
+                     ".json": 10,
+                     ".jsonl": 8,
+                     ".ndjson": 8,
+                     ".parquet": 12,
+                     ".arrow": 3,
+                     ".feather": 3,
+                     ".txt": 5}
+
+# Rough ratio of the decompressed to the compressed size
+COMPRESSION_RATIOS = {"gzip": 5, "bz2": 6, "xz": 7, "zstd": 5}
+
+# Assumed size of one row on disk, used to turn bytes into rows
+AVERAGE_ROW_BYTES = 100
+
+# Share of the budget given to a single chunk, the converted chunks are
+# kept until the output is written
+CHUNK_BUDGET_SHARE = 0.25
+
+MIN_CHUNKSIZE = 1_000
+
+
+def estimate_footprint(file_name: str, size: int) -> int:
+    """
+    ## **Function**
+    ----------
+
+    Estimates the memory needed to read and convert a file in one piece.
+
+    ## **Parameters**
+    ----------
+
+    `file_name`:
+        Name of the file, to determine the file type and compression.
+
+    `size`:
+        Size of the object in bytes (the S3 ContentLength).
+
+    `return int`:
+        Returns the estimated footprint in bytes.
+    """
+
+    file_type, compression = split_extension(file_name)
+
+    if compression is not None:
+        size *= COMPRESSION_RATIOS.get(compression, 5)
+
+    return int(size * FOOTPRINT_FACTORS.get(file_type, 10))
+
+
+def plan_chunksize(file_name: str, size: int,
+                   budget: int) -> Optional[int]:
+    """
+    ## **Function**
+    ----------
+
+    Chooses between the in-memory path and the chunked path. Files whose
+    estimated footprint fits the budget are read at once, larger files are
+    read in chunks sized so that one chunk takes a share of the budget.
+
+    ## **Parameters**
+    ----------
+
+    `file_name`:
+        Name of the file, to determine the file type and compression.
+
+    `size`:
+        Size of the object in bytes (the S3 ContentLength).
+
+    `budget`:
+        The memory budget in bytes.
+
+    `return int | None`:
+        Returns the number of rows per chunk, or None for the in-memory path
+        (also for file types that cannot be read in chunks).
+    """
+
+    file_type, _ = split_extension(file_name)
+    footprint = estimate_footprint(file_name, size)
+
+    if footprint <= budget or file_type not in CHUNKED_FILE_TYPES:
+        return None
+
+    row_footprint = footprint / size * AVERAGE_ROW_BYTES
+
+    return max(MIN_CHUNKSIZE, int(budget * CHUNK_BUDGET_SHARE
+                                  / row_footprint))
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    ## **Function**
+    ----------
+
+    Reads the peak resident set size of the process.
+
+    `return float | None`:
+        Returns the peak RSS in megabytes, or None where the resource module
+        is not available.
+    """
+
+    if resource is None:
+        return None
+
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -0,0 +1,173 @@
+import os
+import sys
+import time
+import random
+import marshal
+import cProfile
+import threading
+from collections import Counter
+from functools import wraps
+from typing import Callable, Optional
+
+from ..error.logger import logging
+
+# Formats of the written profiles
+PROFILE_FORMATS = ("pstats", "collapsed")
+
+
+class Profiler(object):
+
+    """
+    Class profiles the code run inside of a with block. The "pstats" format
+    uses cProfile and can be loaded with `pstats.Stats` or snakeviz. The
+    "collapsed" format samples the stack of the profiled thread from a
+    background thread and counts each stack in the collapsed format of
+    py-spy and flamegraph.pl ("outer (file);inner (file) count").
+    """
+
+    def __init__(self, profile_format: str = "pstats",
+                 interval: float = 0.005):
+        if profile_format not in PROFILE_FORMATS:
+            raise ValueError(f"Unknown profile format: {profile_format}")
+
+        self.profile_format = profile_format
+        self.interval = interval
+        self._profile: Optional[cProfile.Profile] = None
+        self._stacks = Counter()
+        self._target = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        if self.profile_format == "pstats":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+        else:
+            self._target = threading.get_ident()
+            self._sampler = threading.Thread(target=self._sample, daemon=True)
+            self._sampler.start()
+
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._profile is not None:
+            self._profile.disable()
+
+        else:
+            self._stop.set()
+            self._sampler.join()
+
+        return False
+
+    def _sample(self) -> None:
+        """
+        Records the stack of the profiled thread every interval.
+        """
+
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is not None:
+                self._stacks[_collapse(frame)] += 1
+
+    def dump(self) -> bytes:
+        """
+        ## **Function**
+        ----------
+
+        Serializes the profile.
+
+        `return bytes`:
+            Returns the content of a pstats file or the collapsed stacks.
+        """
+
+        if self._profile is not None:
+            self._profile.create_stats()
+            return marshal.dumps(self._profile.stats)
+
+        return "".join(f"{stack} {count}\n"
+                       for stack, count in self._stacks.items()).encode()
+
+
+def _collapse(frame) -> str:
+    """
+    Joins the functions of a stack from the outermost to the innermost.
+    """
+
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+        frame = frame.f_back
+
+    return ";".join(reversed(names))
+
+
+def profiled(sample_rate: int,
+             sink: Callable[[str, bytes], None],
+             profile_format: str = "pstats",
+             interval: float = 0.005) -> Callable:
+    """
+    ## **Function**
+    ----------
+
+    Decorator that profiles 1 in `sample_rate` calls of a function (e.g. the
+    Lambda handler) and passes the profile to the sink. With a sample rate
+    of 0 the function is returned as it is, so there is no overhead when
+    profiling is off. Errors of the sink are logged, they never replace the
+    result or the exception of the function.
+
+    ## **Parameters**
+    ----------
+
+    `sample_rate`:
+        Profiles 1 in N calls, 0 disables the profiling.
+
+    `sink`:
+        Called with the name and the content of each profile, e.g. an
+        upload to the diagnostics prefix of the output bucket.
+
+    `profile_format`:
+        "pstats" (cProfile) or "collapsed" (sampled stacks).
+
+    `interval`:
+        Seconds between two samples of the collapsed format.
+
+    `return Callable`:
+        Returns the decorator.
+    """
+
+    # A misconfigured format fails when the handler is decorated, not in
+    # the sampled invocations
+    if profile_format not in PROFILE_FORMATS:
+        raise ValueError(f"Unknown profile format: {profile_format}")
+
+    def decorator(function):
+        if not sample_rate:
+            return function
+
+        extension = ".prof" if profile_format == "pstats" else ".folded"
+
+        @wraps(function)
+        def wrapper(event, *args, **kwargs):
+            if random.randrange(sample_rate):
+                return function(event, *args, **kwargs)
+
+            profiler = Profiler(profile_format, interval)
+            try:
+                with profiler:
+                    return function(event, *args, **kwargs)
+
+            finally:
+                name = getattr(event, "key", function.__name__)
+                try:
+                    sink(f"{name}-{time.strftime('%Y%m%d-%H%M%S')}"
+                         f"{extension}", profiler.dump())
+
+                except Exception as e:
+                    logging.error(f"Error writing the profile of {name} : "
+                                  f"{e}")
+
+        return wrapper
+
+    return decorator
@@ -3,5 +3,8 @@ import logging
 
 BASE_PATH = os.path.split(os.path.dirname(os.path.abspath(__file__)))[0]
 LOG_PATH = f"{BASE_PATH}/log/base_loger.log"
+
+# The log folder isn't part of the repository
+os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
 logging.basicConfig(level=logging.INFO, filename=LOG_PATH,
                     format="%(asctime)s :: %(levelname)s :: %(message)s")
@@ -1,10 +1,14 @@
 import io
 import os
+import json
 
 import pandas as pd
+from collections import Counter
 
 from . import iso3166
-from typing import Optional, Tuple
+from .core.manifest import ProcessedFileManifest
+from .error.exceptions import FileLoadingError
+from typing import Iterable, Optional, Tuple, Union
 
 
 def name_standardization_factory(input_file_location: str,
@@ -13,7 +17,11 @@ def name_standardization_factory(input_file_location: str,
                                  sample_size: Optional[int] = 10,
                                  auto_find_retry: Optional[int] = 3,
                                  fast_mode: Optional[bool] = False,
-                                 detailed_report: Optional[bool] = False
+                                 detailed_report: Optional[bool] = False,
+                                 manifest_path: Optional[str] = None,
+                                 exact_coverage: Optional[float] = 1.0,
+                                 scorer: Optional[str] = "levenshtein",
+                                 fuzzy_sample: Optional[float] = None
                                  ) -> None:
     """
     ## **Function**
@@ -48,12 +56,35 @@ def name_standardization_factory(input_file_location: str,
         Boolean value that determines if the report will contain the summary
         or all the issue data.
 
+    `manifest_path`:
+        Path of a json manifest of the processed files. Files that did not
+        change since they were recorded in the manifest are skipped, which
+        makes reruns and interrupted runs resumable.
+
+    `exact_coverage`:
+        Share of the distinct values of a column that need to match exactly
+        for the fuzzy matching of the column to be skipped.
+
+    `scorer`:
+        Name of the fuzzy matching scorer, e.g. "jaro_winkler" as a cheaper
+        alternative to "levenshtein" on high-volume feeds.
+
+    `fuzzy_sample`:
+        Share of the distinct unmatched values that are fuzzy matched, the
+        rest is marked as deferred and the report contains the estimated
+        missing rate. None fuzzy matches every value.
+
     `return None`:
         Returns nothing.
     """
 
-    # Read the path data
-    data_generator = iso3166.utils.read_data(path=input_file_location)
+    if not os.path.exists(input_file_location):
+        raise FileLoadingError(message="Error - file does not exist for "
+                                       f"path {input_file_location}")
+
+    manifest = None
+    if manifest_path is not None:
+        manifest = ProcessedFileManifest(manifest_path)
 
     # Create empty report template dataframe
     # Summarization or detailed
@@ -61,61 +92,266 @@ def name_standardization_factory(input_file_location: str,
 
     # Check if the location is a file or folder
     try:
-        file_list = os.listdir(input_file_location)
+        file_list = [(os.path.join(input_file_location, f), f)
+                     for f in os.listdir(input_file_location)]
 
     except NotADirectoryError:
-        file_list = input_file_location,
+        file_list = (input_file_location, input_file_location),
+
+    for file_path, filename in file_list:
+        if manifest is not None and manifest.is_processed(file_path):
+            continue
 
-    for dataset, filename in zip(data_generator, file_list):
-        # Process the data
-        dataframe = iso3166.converter.country_name_conversion(
-            df=dataset,
+        report_template, output_path, _ = standardize_file(
+            file_path,
+            filename,
+            output_location,
+            report_template,
+            detailed_report=detailed_report,
             fuzzy_threshold=fuzzy_threshold,
             sample_size=sample_size,
             auto_find_retry=auto_find_retry,
-            fast_mode=fast_mode)
-
-        report_template = iso3166.utils.update_reporting(
-            dataframe,
-            report_template,
-            filename,
-            detailed_report)
+            fast_mode=fast_mode,
+            exact_coverage=exact_coverage,
+            scorer=scorer,
+            fuzzy_sample=fuzzy_sample)
 
-        # Write the data
-        iso3166.utils.export_to_parquet(output_location, dataframe)
+        if manifest is not None:
+            manifest.record(file_path, output_path)
 
     # Write report
     iso3166.utils.finalize_report(report_template)
 
 
+def standardize_file(file_path: str,
+                     file_name: str,
+                     output_location: str,
+                     report_template: pd.DataFrame,
+                     detailed_report: Optional[bool] = False,
+                     chunksize: Optional[int] = None,
+                     output_format: Optional[str] = "parquet",
+                     timer: Optional[iso3166.utils.StageTimer] = None,
+                     output_mode: Optional[str] = "frame",
+                     row_index: Optional[bool] = False,
+                     output_name: Optional[str] = None,
+                     **conversion_kwargs
+                     ) -> Tuple[pd.DataFrame, str, int]:
+    """
+    ## **Function**
+    ----------
+
+    Function reads, standardizes and writes a single local file and adds
+    it to the report.
+
+    ## **Parameters**
+    ----------
+
+    `file_path`:
+        The path of the file.
+
+    `file_name`:
+        The name of the file in the report.
+
+    `output_location`:
+        The output location where the file will be stored.
+
+    `report_template`:
+        The report the file is added to.
+
+    `detailed_report`:
+        Boolean value that determines if the report will contain the summary
+        or all the issue data.
+
+    `chunksize`:
+        Number of rows per chunk for the file types that can be read in
+        chunks, None reads the whole file at once. The converted chunks are
+        spooled to a temporary file and written from there.
+
+    `output_format`:
+        The format of the output file, "parquet" or "csv".
+
+    `timer`:
+        Collects the time spent in the read, convert, report and write
+        stages.
+
+    `output_mode`:
+        "frame" writes the converted file, "mapping" only writes the mapping
+        table of the distinct values (`{name}.mapping.{format}`).
+
+    `row_index`:
+        Boolean value that determines if the position of each row in the
+        mapping table is written as well (`{name}.rows.{format}`).
+
+    `output_name`:
+        Name of the output relative to the output location, e.g. the path
+        of the file relative to the input root so that files with the same
+        name in different folders don't overwrite each other. Defaults to
+        the base name of the file.
+
+    `conversion_kwargs`:
+        Keyword arguments passed to the country name conversion.
+
+    `return tuple[pd.DataFrame, str, int]`:
+        Returns the report, the path of the output file and the number of
+        rows.
+    """
+
+    if timer is None:
+        timer = iso3166.utils.StageTimer()
+
+    with timer.stage("read"):
+        dataset = next(iso3166.utils.read_data(path=file_path,
+                                               chunksize=chunksize))
+
+    # Chunks are read while they are converted
+    if not isinstance(dataset, pd.DataFrame):
+        dataset = timer.timed_iter("read", dataset)
+
+    # Chunks are spooled to a temporary file instead of being concatenated,
+    # so the memory doesn't grow with the file
+    output, counts, chunk_sinks = None, None, None
+    if chunksize is not None:
+        if output_mode == "mapping":
+            output = iso3166.utils.MappingSpool(row_index)
+        else:
+            output = iso3166.utils.ParquetSpool()
+
+        counts = iso3166.utils.ReportCounts(detailed_report)
+        chunk_sinks = [output, counts]
+
+    try:
+        with timer.stage("convert"):
+            dataframe = _convert_frames(dataset, chunk_sinks=chunk_sinks,
+                                        **conversion_kwargs)
+
+        with timer.stage("report"):
+            if counts is None:
+                report_template = iso3166.utils.update_reporting(
+                    dataframe,
+                    report_template,
+                    file_name,
+                    detailed_report)
+                rows = len(dataframe)
+
+            else:
+                report_template = counts.report(
+                    report_template, file_name,
+                    dataframe.attrs.get("fuzzy_sample"))
+                rows = counts.rows
+
+        # Write the data, reruns overwrite the output of the same file
+        with timer.stage("write"):
+            output_path = _export_outputs(
+                dataframe, output_location,
+                output_name or os.path.basename(file_path),
+                output_format, output_mode, row_index, output)
+
+    finally:
+        if output is not None:
+            output.discard()
+
+    return report_template, output_path, rows
+
+
+def _export_outputs(dataframe: pd.DataFrame, output_location: str,
+                    base_name: str, output_format: str, output_mode: str,
+                    row_index: bool,
+                    output: Union[iso3166.utils.ParquetSpool,
+                                  iso3166.utils.MappingSpool, None] = None
+                    ) -> str:
+    """
+    Writes the outputs of a converted file (see `standardize_file`), from
+    the spool of a file read in chunks, otherwise from the dataframe.
+    """
+
+    if output_mode == "mapping":
+        table, rows = (iso3166.utils.mapping_table(dataframe, row_index)
+                       if output is None else output.close(dataframe.attrs))
+        output_path = iso3166.utils.export_data(
+            output_location, table,
+            name=f"{base_name}.mapping.{output_format}",
+            output_format=output_format)
+
+        if isinstance(rows, pd.DataFrame):
+            iso3166.utils.export_data(
+                output_location, rows,
+                name=f"{base_name}.rows.{output_format}",
+                output_format=output_format)
+
+        elif rows is not None:
+            iso3166.utils.export_spooled(
+                output_location, rows,
+                name=f"{base_name}.rows.{output_format}",
+                output_format=output_format)
+
+        return output_path
+
+    name = f"{base_name}.{output_format}"
+    if output is None:
+        return iso3166.utils.export_data(output_location, dataframe,
+                                         name=name,
+                                         output_format=output_format)
+
+    return iso3166.utils.export_spooled(output_location,
+                                        output.close(dataframe.attrs),
+                                        name=name,
+                                        output_format=output_format)
+
+
 def lambda_name_standardization_factory(data: io.BytesIO,
                                         file_name: str,
                                         fuzzy_threshold: Optional[int] = 70,
                                         sample_size: Optional[int] = 10,
                                         auto_find_retry: Optional[int] = 3,
                                         fast_mode: Optional[bool] = False,
-                                        detailed_report: Optional[bool] = False
+                                        detailed_report: Optional[bool] = False,
+                                        exact_coverage: Optional[float] = 1.0,
+                                        scorer: Optional[str] = "levenshtein",
+                                        fuzzy_sample: Optional[float] = None,
+                                        chunksize: Optional[int] = None,
+                                        report_writer: Optional[
+                                            iso3166.utils.DetailedReportWriter
+                                        ] = None,
+                                        chunk_sinks: Optional[list] = None
                                         ) -> Tuple[pd.DataFrame, pd.DataFrame]:
     # Read data and create generator
     data_generator = iso3166.utils.read_s3_data(file_name=file_name,
-                                                data=data)
+                                                data=data,
+                                                chunksize=chunksize)
 
     # Create empty report template dataframe
     # Summarization or detailed
     report_template = iso3166.utils.generate_report_template()
 
-    dataframe = iso3166.converter.country_name_conversion(
-            df=data_generator,
+    # With sinks (e.g. a ParquetSpool) the converted chunks are handed over
+    # one by one and the report is counted per chunk, the returned frame is
+    # empty and only carries the columns and attrs of the file
+    counts = None
+    if chunk_sinks is not None:
+        counts = iso3166.utils.ReportCounts(detailed_report)
+        chunk_sinks = list(chunk_sinks) + [counts]
+
+    dataframe = _convert_frames(
+            data_generator,
             fuzzy_threshold=fuzzy_threshold,
             sample_size=sample_size,
             auto_find_retry=auto_find_retry,
-            fast_mode=fast_mode)
+            fast_mode=fast_mode,
+            exact_coverage=exact_coverage,
+            scorer=scorer,
+            fuzzy_sample=fuzzy_sample,
+            report_writer=report_writer,
+            chunk_sinks=chunk_sinks)
 
-    report_template = iso3166.utils.update_reporting(
-            dataframe,
-            report_template,
-            file_name,
-            detailed_report)
+    if counts is not None:
+        report_template = counts.report(report_template, file_name,
+                                        dataframe.attrs.get("fuzzy_sample"))
+    else:
+        report_template = iso3166.utils.update_reporting(
+                dataframe,
+                report_template,
+                file_name,
+                detailed_report)
 
     return dataframe, report_template
 
@@ -124,3 +360,102 @@ def lambda_name_standardization_factory(data: io.BytesIO,
     #
     # # Write report
     # iso3166.finalize_report(report_template)
+
+
+def _convert_frames(data: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+                    report_writer: Optional[
+                        iso3166.utils.DetailedReportWriter] = None,
+                    chunk_sinks: Optional[list] = None,
+                    **conversion_kwargs) -> pd.DataFrame:
+    """
+    ## **Function**
+    ----------
+
+    Converts a dataframe, or the chunks yielded by a chunked reader, through
+    the country name conversion. The detection of the first chunk is reused
+    for the following ones so that all chunks share the same columns, and
+    each distinct value is matched once per file.
+
+    ## **Parameters**
+    ----------
+
+    `data`:
+        A dataframe or an iterable of dataframes.
+
+    `report_writer`:
+        Writer of the detailed report, each chunk is added as soon as it is
+        converted.
+
+    `chunk_sinks`:
+        Objects whose `add` receives each converted chunk. When given, the
+        chunks aren't kept, so the memory doesn't grow with the file.
+
+    `conversion_kwargs`:
+        Keyword arguments passed to the country name conversion.
+
+    `return pd.DataFrame`:
+        Returns the converted data as one dataframe, or an empty dataframe
+        with the columns and attrs of the file if the chunks went to sinks.
+    """
+
+    if isinstance(data, pd.DataFrame):
+        if chunk_sinks is not None:
+            data = data,
+
+        else:
+            data = iso3166.converter.country_name_conversion(
+                df=data, **conversion_kwargs)
+
+            if report_writer is not None:
+                report_writer.add(data)
+
+            return data
+
+    frames = []
+    detection = None
+    sample_stats = Counter()
+    mapping = {}
+    words = {}
+    # Values resolved in a chunk aren't matched again in the later chunks
+    cache = {}
+    for chunk in data:
+        chunk = iso3166.converter.country_name_conversion(
+            df=chunk, detection=detection, cache=cache, **conversion_kwargs)
+        detection = chunk.attrs["detection"]
+        # The cache decides each value once, so the counts of the chunks
+        # add up to the distinct values of the file
+        sample_stats.update(chunk.attrs.get("fuzzy_sample", {}))
+        for kind, values in json.loads(
+                chunk.attrs["reference"]["mapping"]).items():
+            mapping.setdefault(kind, {}).update(values)
+        words.update(json.loads(chunk.attrs["reference"].get("words", "{}")))
+
+        if report_writer is not None:
+            report_writer.add(chunk)
+
+        if chunk_sinks is None:
+            frames.append(chunk)
+            continue
+
+        for sink in chunk_sinks:
+            sink.add(chunk)
+
+        # Only the columns of the last chunk are kept
+        frames = [chunk.iloc[:0]]
+
+    if not frames:
+        raise FileLoadingError(message="No data found in file")
+
+    reference = frames[-1].attrs["reference"]
+
+    dataframe = pd.concat(frames, ignore_index=True)
+    dataframe.attrs["detection"] = detection
+    dataframe.attrs["reference"] = {**reference,
+                                    "mapping": json.dumps(mapping)}
+    if "words" in reference:
+        dataframe.attrs["reference"]["words"] = json.dumps(words)
+
+    if conversion_kwargs.get("fuzzy_sample") is not None:
+        dataframe.attrs["fuzzy_sample"] = dict(sample_stats)
+
+    return dataframe
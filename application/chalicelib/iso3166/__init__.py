@@ -1,2 +1,4 @@
 from . import utils
 from . import converter
+from . import deferred
+from . import restandardize
@@ -0,0 +1,177 @@
+import os
+import json
+from collections import Counter
+from typing import Dict, Iterable, Mapping, Tuple
+
+from .normalize import normalize_name
+
+# Versioned dictionary of recurring name variants on top of country_name.csv
+ALIAS_PATH = os.path.join(os.path.split(os.path.abspath(__file__))[0],
+                          "country_alias.json")
+
+
+def load_aliases(path: str = ALIAS_PATH) -> Tuple[int, Dict[str, str]]:
+    """
+    ## **Function**
+    ----------
+
+    Loads the alias dictionary.
+
+    ## **Parameters**
+    ----------
+
+    `path`:
+        Path of the alias json file.
+
+    `return tuple[int, dict[str, str]]`:
+        Returns the version of the dictionary and the mapping of the
+        normalized alias to the alpha-2 code.
+    """
+
+    with open(path, encoding="utf-8") as fh:
+        content = json.load(fh)
+
+    aliases = {normalize_name(alias): code
+               for alias, code in content["aliases"].items()}
+
+    return content["version"], aliases
+
+
+def save_match_counts(match_counts: Mapping[Tuple[str, str], int],
+                      path: str) -> None:
+    """
+    ## **Function**
+    ----------
+
+    Merges the fuzzy match counts of a run into a json file, so they can be
+    promoted offline after many runs.
+
+    ## **Parameters**
+    ----------
+
+    `match_counts`:
+        Counts of (normalized value, alpha-2 code) pairs that were resolved
+        by fuzzy matching, e.g. `converter.FUZZY_MATCH_COUNTS`.
+
+    `path`:
+        Path of the json file with the collected counts.
+
+    `return None`:
+        Returns nothing.
+    """
+
+    counts = Counter(_read_match_counts(path))
+    counts.update(match_counts)
+
+    with open(path, "wb") as fh:
+        fh.write(encode_match_counts(counts))
+
+
+def encode_match_counts(match_counts: Mapping[Tuple[str, str], int]
+                        ) -> bytes:
+    """
+    ## **Function**
+    ----------
+
+    Encodes match counts in the json format of `save_match_counts`, e.g. to
+    upload the counts of an invocation to the output bucket.
+
+    `return bytes`:
+        Returns the encoded counts.
+    """
+
+    return json.dumps([[value, code, count]
+                       for (value, code), count in match_counts.items()],
+                      ensure_ascii=False).encode("utf-8")
+
+
+def merge_match_counts(paths: Iterable[str]) -> Counter:
+    """
+    ## **Function**
+    ----------
+
+    Merges the counts of many files written by `save_match_counts` or
+    uploaded by the handler (`match_counts/` in the output bucket).
+
+    `return Counter`:
+        Returns the summed counts of each (value, alpha-2 code) pair.
+    """
+
+    counts = Counter()
+    for path in paths:
+        counts.update(_read_match_counts(path))
+
+    return counts
+
+
+def promote_matches(match_counts: Mapping[Tuple[str, str], int],
+                    min_count: int = 10,
+                    path: str = ALIAS_PATH) -> int:
+    """
+    ## **Function**
+    ----------
+
+    Promotes fuzzy matches that occur often into the alias dictionary, so
+    recurring misspellings are resolved on the exact-match path. A value
+    that was resolved to different codes is never promoted. The version of
+    the dictionary is increased when new aliases are added.
+
+    ## **Parameters**
+    ----------
+
+    `match_counts`:
+        Counts of (normalized value, alpha-2 code) pairs, or the path of a
+        file written by `save_match_counts`.
+
+    `min_count`:
+        The minimum number of occurrences for a match to be promoted.
+
+    `path`:
+        Path of the alias json file.
+
+    `return int`:
+        Returns the number of promoted aliases.
+    """
+
+    if isinstance(match_counts, str):
+        match_counts = _read_match_counts(match_counts)
+
+    with open(path, encoding="utf-8") as fh:
+        content = json.load(fh)
+
+    known = {normalize_name(alias) for alias in content["aliases"]}
+
+    codes_per_value: Dict[str, set] = {}
+    for value, code in match_counts:
+        codes_per_value.setdefault(value, set()).add(code)
+
+    promoted = 0
+    for (value, code), count in sorted(match_counts.items()):
+        if count < min_count or value in known:
+            continue
+        if len(codes_per_value[value]) > 1:
+            continue
+
+        content["aliases"][value] = code
+        known.add(value)
+        promoted += 1
+
+    if promoted:
+        content["version"] += 1
+
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(content, fh, indent=2, ensure_ascii=False)
+
+    return promoted
+
+
+def _read_match_counts(path: str) -> Dict[Tuple[str, str], int]:
+    """
+    Reads the counts written by `save_match_counts`.
+    """
+
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, encoding="utf-8") as fh:
+        return {(value, code): count for value, code, count in json.load(fh)}
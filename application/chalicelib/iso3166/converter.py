@@ -1,10 +1,17 @@
 import os
+import json
+import hashlib
+from collections import Counter
 
 import pandas as pd
 import numpy as np
 from pandas import DataFrame
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
 
-from .utils import calculate_levenshtein_ratio
+from .aliases import load_aliases
+from .normalize import normalize_names, normalize_words
+from .scorers import scorers
 from ..error.exceptions import DistanceCalculationError, AutoDetectionError
 
 # Loads the csv file containing possible naming options and
@@ -13,13 +20,55 @@ DATA_PATH = os.path.join(os.path.split(os.path.abspath(__file__))[0],
                          "country_name.csv")
 DATA = pd.read_csv(DATA_PATH, dtype=str, keep_default_na=False)
 
+# Normalized reference columns, computed once instead of on every call
+REFERENCE = {field: normalize_names(DATA[field]).to_numpy()
+             for field in ("name", "official", "alpha-2", "alpha-3")}
+
+# Word forms of the normalized reference names, compared by the token scorers
+REFERENCE_WORDS = {value: words
+                   for field in ("name", "official")
+                   for value, words in zip(REFERENCE[field],
+                                           normalize_words(DATA[field]))}
+
+# Maps known aliases (e.g. "USA", "Korea, South") to the index of their row
+ALIAS_VERSION, _aliases = load_aliases()
+_code_index = {code: i for i, code in enumerate(DATA["alpha-2"])}
+ALIAS_INDEX = {alias: _code_index[code] for alias, code in _aliases.items()}
+
+# Hashed membership of the normalized forms, used by the column detection so
+# that large samples cost one lookup per value instead of a scan. The aliases
+# count as names, so columns of e.g. "USA" and "UK" are detected as well
+REFERENCE_SETS = {field: frozenset(values)
+                  for field, values in REFERENCE.items()}
+REFERENCE_SETS["name"] |= frozenset(ALIAS_INDEX)
+
+# Version of the reference data (country_name.csv and the aliases), recorded
+# in the outputs so they can be restandardized when it changes
+with open(DATA_PATH, "rb") as _fh:
+    REFERENCE_VERSION = (f"{hashlib.sha1(_fh.read()).hexdigest()[:12]}"
+                         f"-a{ALIAS_VERSION}")
+
+# Counts of (value, alpha-2) pairs resolved by fuzzy matching, these can be
+# promoted into the alias dictionary with aliases.promote_matches. Drained
+# by `take_match_counts` after each file or invocation
+FUZZY_MATCH_COUNTS = Counter()
+
+# Marks values left out of the fuzzy matching sample (see `fuzzy_sample`)
+DEFERRED = "Deferred"
+DEFERRED_INDEX = -1
+
 
 def country_name_conversion(df: pd.DataFrame,
                             *,
                             fuzzy_threshold: int = 70,
                             sample_size: int = 10,
                             auto_find_retry: int = 3,
-                            fast_mode: bool = True
+                            fast_mode: bool = True,
+                            detection: Optional[dict] = None,
+                            exact_coverage: Optional[float] = 1.0,
+                            scorer: str = "levenshtein",
+                            fuzzy_sample: Optional[float] = None,
+                            cache: Optional[dict] = None
                             ) -> DataFrame:
     """
     ## **Function**
@@ -58,52 +107,86 @@ def country_name_conversion(df: pd.DataFrame,
                     before returning results.</li>
             </ol>
 
+    `detection:`
+        The detection result of a previous call (found in
+        `df.attrs["detection"]`). Used to convert the chunks of one file
+        with the same columns without running the auto-detection again.
+
+    `exact_coverage:`
+        Share of the distinct values of a column that need to match the
+        reference data exactly for the fuzzy matching to be skipped. The
+        column is then converted with a direct map and the remaining values
+        are left unmatched. None always runs the fuzzy matching.
+
+    `scorer:`
+        Name of the fuzzy matching scorer registered in `scorers`
+        ("levenshtein", "jaro_winkler", "token_set", "bigram_dice" or
+        "prefix").
+
+    `fuzzy_sample:`
+        Share (0.0 - 1.0) of the distinct values without an exact match that
+        are fuzzy matched, drawn as a sample stratified by first letter. The
+        other values are marked as "Deferred" and the sample statistics are
+        kept in `df.attrs["fuzzy_sample"]` to estimate the unmatched rate.
+        0.0 only runs the exact matching and defers every other value to
+        `deferred.resolve_deferred`. None fuzzy matches every value.
+
+    `cache:`
+        Dictionary shared by the chunks of one file, it keeps the resolved
+        values of each column ("name" and "code") so that every distinct
+        value is matched, and sampled, once per file.
+
     `return tuple[pd.Dataframe, pd.Dataframe]:`
         Returns a cleaned dataframe with iso3166 columns for the country code
         and the country name. Plus a reporting dataframe.
 
     """
 
-    # Column auto-detection
-    target_column = None
-    secondary_column = None
-    ini_num_col = len(df.columns)
+    if scorer not in scorers.registry:
+        raise DistanceCalculationError(message=f"Unknown scorer: {scorer}")
 
-    # Temp fix
-    option = None
+    ini_num_col = len(df.columns)
 
-    # Number of retries
-    for i in range(auto_find_retry):
+    # Column auto-detection
+    if detection is None:
+        option, target_column = _detect_name_column(df, sample_size,
+                                                    auto_find_retry)
+    else:
+        option = detection["option"]
+        target_column = detection["name_column"]
 
-        # First tries to match on the normal column, then the official
-        for option in ("official", "name"):
-            target_column = _auto_find_column(df, option, sample_size)
-            if target_column is not None:
-                # if the column in found the loop breaks
-                break
+    secondary_column = None
+    sample_stats = Counter()
+    recorded = {}
+    words = {}
 
     # Starts the creation of the helper columns
     try:
 
-        data_column = (DATA[option].str.lower().str.replace(" ", "").values,)
+        data_column = (REFERENCE[option],)
 
         if not fast_mode:
             # Get columns not chosen
-            other = DATA[[x for x in ("official", "name") if x != option][0]] \
-                .str.lower().str.replace(" ", "").values
+            other = REFERENCE[[x for x in ("official", "name")
+                               if x != option][0]]
             # Pack both of the Series up
             data_column = (data_column[0],
                            other)
 
-        df["country_name"] = df[target_column].apply(
-            _format_country_name,
-            args=(data_column,
-                  fuzzy_threshold, "official", fast_mode))
-
-        df["country_code"] = df[target_column].apply(
-            _format_country_name,
-            args=(data_column,
-                  fuzzy_threshold, "alpha-2", fast_mode))
+        # Each value is matched once, the outputs are projected from the
+        # index of the matched reference row
+        country_index = resolve_country_index(df[target_column], data_column,
+                                              fuzzy_threshold, fast_mode,
+                                              exact_coverage, scorer,
+                                              fuzzy_sample,
+                                              cache=_column_cache(cache,
+                                                                  "name"))
+        sample_stats.update(country_index.attrs.get("fuzzy_sample", {}))
+        recorded["name"] = recorded_fields(country_index.attrs["mapping"])
+        words.update(country_index.attrs.get("words", {}))
+
+        df["country_name"], df["country_code"] = project_fields(
+            country_index, ("official", "alpha-2"))
 
     # Catch in case the auto-column finder returns nothing
     except KeyError as err:
@@ -112,22 +195,27 @@ def country_name_conversion(df: pd.DataFrame,
 
     # Starts the secondary (country code) auto-column search
     try:
-        for i in range(auto_find_retry):
-            secondary_column = _auto_find_column(df, "alpha-2", sample_size)
-            if secondary_column is not None:
-                break
-
-        sec_data_col = DATA["alpha-2"].str.lower().str.replace(" ", "").values,
-
-        df["country_code_helper"] = df[secondary_column].apply(
-            _format_country_name,
-            args=(sec_data_col,
-                  fuzzy_threshold, "alpha-2", fast_mode))
-
-        df["country_name_helper"] = df[secondary_column].apply(
-            _format_country_name,
-            args=(sec_data_col,
-                  fuzzy_threshold, "official", fast_mode))
+        if detection is None:
+            secondary_column = _detect_code_column(df, sample_size,
+                                                   auto_find_retry)
+        else:
+            secondary_column = detection["code_column"]
+
+        sec_data_col = REFERENCE["alpha-2"],
+
+        country_index = resolve_country_index(df[secondary_column],
+                                              sec_data_col,
+                                              fuzzy_threshold, fast_mode,
+                                              exact_coverage, scorer,
+                                              fuzzy_sample,
+                                              cache=_column_cache(cache,
+                                                                  "code"))
+        sample_stats.update(country_index.attrs.get("fuzzy_sample", {}))
+        recorded["code"] = recorded_fields(country_index.attrs["mapping"])
+        words.update(country_index.attrs.get("words", {}))
+
+        df["country_code_helper"], df["country_name_helper"] = \
+            project_fields(country_index, ("alpha-2", "official"))
 
     # Catch in case the auto-column finder returns nothing
     except KeyError as err:
@@ -142,10 +230,10 @@ def country_name_conversion(df: pd.DataFrame,
         # improves accuracy with a small amount of overhead
         # if both primary and secondary columns where found and used
         # this segment combines the columns to minimize NaN values
-        df["country_name_final"] = df["country_name"].combine_first(
-            df.country_name_helper)
-        df["country_code_final"] = df["country_code"].combine_first(
-            df.country_code_helper)
+        df["country_name_final"] = _combine_columns(
+            df["country_name"], df["country_name_helper"])
+        df["country_code_final"] = _combine_columns(
+            df["country_code"], df["country_code_helper"])
 
     # Dynamic column drop
     # We always want to keep the last two
@@ -160,9 +248,187 @@ def country_name_conversion(df: pd.DataFrame,
 
     df[conversion_list] = df[conversion_list].astype(str)
 
+    df.attrs["detection"] = {"option": option,
+                             "name_column": target_column,
+                             "code_column": secondary_column}
+
+    if fuzzy_sample is not None:
+        df.attrs["fuzzy_sample"] = {"sampled": sample_stats["sampled"],
+                                    "unmatched": sample_stats["unmatched"]}
+
+    # The mapping is kept as a json string since pandas deep copies the
+    # attrs on every operation
+    df.attrs["reference"] = {"version": REFERENCE_VERSION,
+                             "fuzzy_threshold": fuzzy_threshold,
+                             "fast_mode": fast_mode,
+                             "exact_coverage": exact_coverage,
+                             "scorer": scorer,
+                             "outputs": {
+                                 "name" if "name" in column else "code": column
+                                 for column in conversion_list[-2:]},
+                             "mapping": json.dumps(recorded)}
+
+    # The word forms are recorded so that the fuzzy matches of a token
+    # scorer can be repeated from the mapping alone
+    if scorers.uses_words(scorer):
+        df.attrs["reference"]["words"] = json.dumps(words)
+
     return df
 
 
+def _column_cache(cache: Optional[dict], kind: str) -> Optional[dict]:
+    """
+    Returns the cache of one column of a file, None without a cache.
+    """
+
+    return None if cache is None else cache.setdefault(kind, {})
+
+
+def recorded_fields(mapping: dict) -> dict:
+    """
+    ## **Function**
+    ----------
+
+    Turns a mapping of normalized values to reference row indexes into the
+    iso3166 fields the values were converted to. The fields are recorded
+    instead of the row index, so they can still be compared after rows are
+    added to or removed from the reference data.
+
+    ## **Parameters**
+    ----------
+
+    `mapping`:
+        The mapping of `resolve_country_index` (`attrs["mapping"]`).
+
+    `return dict`:
+        Returns the official name and alpha-2 code of each value, or None
+        where it couldn't be matched.
+    """
+
+    official, alpha_2 = DATA["official"].to_numpy(), DATA["alpha-2"].to_numpy()
+
+    return {value: None if index is None
+            else [official[index], alpha_2[index]]
+            for value, index in mapping.items()}
+
+
+def take_match_counts() -> Counter:
+    """
+    ## **Function**
+    ----------
+
+    Takes the fuzzy match counts collected since the last call and resets
+    them, so the counter of a warm container doesn't grow without bound.
+
+    `return Counter`:
+        Returns the counts of (normalized value, alpha-2 code) pairs.
+    """
+
+    counts = Counter(FUZZY_MATCH_COUNTS)
+    FUZZY_MATCH_COUNTS.clear()
+
+    return counts
+
+
+def _combine_columns(first: pd.Series, helper: pd.Series) -> pd.Series:
+    """
+    Fills the missing values of the first column from the helper column.
+    Deferred values are filled as well and only stay deferred when neither
+    column has a match.
+    """
+
+    deferred = (first == DEFERRED) | (helper == DEFERRED)
+    combined = first.mask(first == DEFERRED).combine_first(
+        helper.mask(helper == DEFERRED))
+
+    return combined.mask(combined.isna() & deferred, DEFERRED)
+
+
+def detect_columns(df: pd.DataFrame,
+                   sample_size: int = 10,
+                   auto_find_retry: int = 3
+                   ) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    ## **Function**
+    ----------
+
+    Function auto-detects the country name column and the country code
+    column of a dataframe. It can be run on a small sample of a file before
+    the whole file is parsed.
+
+    ## **Parameters**
+    ----------
+
+    `df`:
+        A pandas dataframe that contains the data.
+
+    `sample_size`:
+        Integer that defines the sample size used for the auto-detection of
+        the columns.
+
+    `auto_find_retry`:
+        The number of reties that the function will do for the auto-detection
+        of columns
+
+    `return tuple[str, str | None, str | None]`:
+        Returns the naming option that matched ("official" or "name"), the
+        country name column and the country code column.
+    """
+
+    option, target_column = _detect_name_column(df, sample_size,
+                                                auto_find_retry)
+    secondary_column = _detect_code_column(df, sample_size, auto_find_retry)
+
+    return option, target_column, secondary_column
+
+
+def _detect_name_column(df: pd.DataFrame,
+                        sample_size: int,
+                        auto_find_retry: int
+                        ) -> Tuple[str, Optional[str]]:
+    """
+    ## **Function**
+    ----------
+
+    Private function that searches for the country name column, first with
+    the official naming and then with the normal naming.
+
+    `return tuple[str, str | None]`:
+        Returns the naming option and the column name, if one was found.
+    """
+
+    target_column = None
+    option = "official"
+
+    for i in range(auto_find_retry):
+
+        for option in ("official", "name"):
+            target_column = _auto_find_column(df, option, sample_size)
+            if target_column is not None:
+                return option, target_column
+
+    return option, target_column
+
+
+def _detect_code_column(df: pd.DataFrame,
+                        sample_size: int,
+                        auto_find_retry: int) -> Optional[str]:
+    """
+    ## **Function**
+    ----------
+
+    Private function that searches for the alpha-2 country code column.
+
+    `return str | None`:
+        Returns the column name, if one was found.
+    """
+
+    for i in range(auto_find_retry):
+        secondary_column = _auto_find_column(df, "alpha-2", sample_size)
+        if secondary_column is not None:
+            return secondary_column
+
+
 def _auto_find_column(df: pd.DataFrame,
                       input_format: str,
                       sample_size: int):
@@ -199,8 +465,7 @@ def _auto_find_column(df: pd.DataFrame,
     """
 
     # Data preparation
-    target_column = DATA[input_format].str.lower()
-    target_column = target_column.str.replace(" ", "").values
+    target_column = REFERENCE_SETS[input_format]
 
     # Overwrite sample size if it's larger than the dataset
     if len(df) < sample_size:
@@ -210,28 +475,327 @@ def _auto_find_column(df: pd.DataFrame,
     """ TODO Possible update depending on examples given
     1. Add a distance calculation """
     for col in df.columns:
-        for sample in df[col].sample(sample_size):
-            if str(sample).lower().replace(" ", "") in target_column:
+        for sample in normalize_names(df[col].sample(sample_size)):
+            if sample in target_column:
                 return col
 
 
-def _format_country_name(val: str,
-                         target_column: tuple[pd.Series],
-                         fuzzy_threshold: int,
-                         wanted_output: str,
-                         fast_mode: bool = True):
+def resolve_country_index(values: pd.Series,
+                          target_column: Tuple[np.ndarray, ...],
+                          fuzzy_threshold: int,
+                          fast_mode: bool = True,
+                          exact_coverage: Optional[float] = None,
+                          scorer: str = "levenshtein",
+                          fuzzy_sample: Optional[float] = None,
+                          random_state: int = 0,
+                          cache: Optional[dict] = None,
+                          record_matches: bool = True,
+                          words: Optional[dict] = None
+                          ) -> pd.Series:
     """
     ## **Function**
     ----------
 
+    Function maps every value of a column to the index of its row in the
+    iso3166 reference data. Each distinct value is matched only once and
+    any number of output fields can then be projected from the index with
+    `project_fields`.
+
+    ## **Parameters**
+    ----------
+
+    `values`:
+        The column that contains the values that need to be standardized.
+
+    `target_column`:
+        The normalized reference columns that are matched against.
+
+    `fuzzy_threshold`:
+        The fuzzy ratio that decides if a value is replaced or not.
+
+    `fast_mode`:
+        Boolean value that determines if only the first reference column is
+        used for the fuzzy matching.
+
+    `exact_coverage`:
+        Share of distinct values that need to match exactly for the fuzzy
+        matching to be skipped, None always runs the fuzzy matching.
+
+    `scorer`:
+        Name of the fuzzy matching scorer.
+
+    `fuzzy_sample`:
+        Share of the distinct values without an exact match that are fuzzy
+        matched, None fuzzy matches all of them.
+
+    `random_state`:
+        Seed of the sample, so reruns defer the same values.
+
+    `cache`:
+        The index of values resolved before, e.g. in the earlier chunks of
+        the same file. Cached values aren't matched or sampled again and
+        the new values are added to the cache, so the sample statistics
+        count each distinct value once.
+
+    `record_matches`:
+        Boolean value that determines if the fuzzy matches are counted in
+        `FUZZY_MATCH_COUNTS`.
+
+    `words`:
+        The word forms of the normalized values for the token scorers (e.g.
+        the recorded `attrs["reference"]["words"]`), computed from `values`
+        if not given.
+
+    `return pd.Series`:
+        Returns a nullable integer series with the reference row index of
+        each value, or NA where the value couldn't be matched. Values left
+        out of the sample get `DEFERRED_INDEX` and the sample statistics are
+        kept in the `attrs` of the series. The index of each distinct value
+        (without the deferred ones) is kept in `attrs["mapping"]`, the word
+        forms of the values fuzzy matched by a token scorer in
+        `attrs["words"]`.
+    """
+
+    # The column is normalized once and each distinct normalized value is
+    # matched once
+    normalized = normalize_names(values)
+    uniques = pd.Series(normalized.dropna().unique(), dtype=object)
+
+    cached = {}
+    if cache:
+        is_cached = uniques.isin(cache.keys())
+        cached = {value: cache[value] for value in uniques[is_cached]}
+        uniques = uniques[~is_cached].reset_index(drop=True)
+
+    if exact_coverage is not None:
+        # Already clean columns are converted with one vectorized lookup
+        lookup = _exact_lookup(target_column)
+        is_known = uniques.isin(lookup.keys())
+
+        if len(uniques) and is_known.mean() >= exact_coverage:
+            mapping = _index_mapping(zip(uniques, uniques.map(lookup)))
+
+            return _map_index(normalized, mapping, cached, cache)
+
+    # Token scorers compare the words, which the normalization removes
+    if words is None and scorers.uses_words(scorer):
+        words = _word_forms(values, normalized)
+    words = words or {}
+
+    if fuzzy_sample is None:
+        mapping = {value: _find_country_index(value, target_column,
+                                              fuzzy_threshold, fast_mode,
+                                              scorer, record_matches,
+                                              words.get(value))
+                   for value in uniques}
+
+        country_index = _map_index(normalized, mapping, cached, cache)
+        country_index.attrs["words"] = _fuzzy_words(words, uniques,
+                                                    target_column)
+
+        return country_index
+
+    # Every value gets the exact matching, only a sample of the remaining
+    # values is fuzzy matched which bounds the time spent on dirty columns
+    lookup = _exact_lookup(target_column)
+    mapping = {value: lookup.get(value, DEFERRED_INDEX) for value in uniques}
+    sample = _stratified_sample([value for value in uniques
+                                 if value not in lookup],
+                                fuzzy_sample, random_state)
+
+    for value in sample:
+        mapping[value] = _find_country_index(value, target_column,
+                                             fuzzy_threshold, fast_mode,
+                                             scorer, record_matches,
+                                             words.get(value))
+
+    country_index = _map_index(normalized, mapping, cached, cache)
+    country_index.attrs["words"] = _fuzzy_words(words, sample, target_column)
+    country_index.attrs["fuzzy_sample"] = {
+        "sampled": len(sample),
+        "unmatched": sum(mapping[value] is None for value in sample)}
+
+    return country_index
+
+
+def _word_forms(values: pd.Series, normalized: pd.Series) -> dict:
+    """
+    Returns the word form of each distinct normalized value that has more
+    than one word.
+    """
+
+    first = (normalized.notna() & ~normalized.duplicated()).to_numpy()
+
+    return {value: words
+            for value, words in zip(normalized[first],
+                                    normalize_words(values[first]))
+            if " " in words}
+
+
+def _fuzzy_words(words: dict, values: Iterable[str],
+                 target_column: Tuple[np.ndarray, ...]) -> dict:
+    """
+    Returns the word forms of the values that were fuzzy matched, the
+    exact matches and aliases don't depend on them.
+    """
+
+    lookup = _exact_lookup(target_column)
+
+    return {value: words[value] for value in values
+            if value in words and value not in lookup}
+
+
+def _map_index(normalized: pd.Series, mapping: dict, cached: dict,
+               cache: Optional[dict]) -> pd.Series:
+    """
+    Maps the normalized values to their reference row index. The resolved
+    values (without the deferred ones) are kept in `attrs["mapping"]`. All
+    the values are added to the cache, so a value deferred in one chunk
+    stays deferred in the later chunks and is only sampled once per file.
+    """
+
+    mapping = {**cached, **mapping}
+    country_index = normalized.map(pd.Series(mapping, dtype="Int64"))
+    country_index.attrs["mapping"] = _index_mapping(
+        (value, index) for value, index in mapping.items()
+        if index != DEFERRED_INDEX)
+
+    if cache is not None:
+        cache.update(_index_mapping(mapping.items()))
+
+    return country_index
+
+
+def _index_mapping(items) -> dict:
+    """
+    Converts (value, index) pairs into a plain dictionary, with None for
+    the values that couldn't be matched.
+    """
+
+    return {value: None if index is None or pd.isna(index) else int(index)
+            for value, index in items}
+
 
-    Function re-formats/standardizes the country name.
+def _stratified_sample(values: List[str], fraction: float,
+                       random_state: int = 0) -> List[str]:
+    """
+    ## **Function**
+    ----------
+
+    Draws a sample of the values stratified by their first letter, so every
+    group of names is represented. Each stratum contributes at least one
+    value, unless the fraction is 0 which defers every value.
 
     ## **Parameters**
     ----------
 
-    `val`:
-        The target value (country) that needs to be replaced/standardized.
+    `values`:
+        The normalized values that are sampled.
+
+    `fraction`:
+        The share of the values of each stratum that is drawn.
+
+    `random_state`:
+        Seed of the random generator.
+
+    `return list[str]`:
+        Returns the sampled values.
+    """
+
+    rng = np.random.default_rng(random_state)
+
+    strata = {}
+    for value in values:
+        strata.setdefault(value[:1], []).append(value)
+
+    sample = []
+    for key in sorted(strata):
+        members = strata[key]
+        size = min(len(members), max(int(fraction > 0),
+                                     round(len(members) * fraction)))
+        sample.extend(members[i] for i in rng.choice(len(members), size=size,
+                                                     replace=False))
+
+    return sample
+
+
+def _exact_lookup(target_column: Tuple[np.ndarray, ...]) -> dict:
+    """
+    ## **Function**
+    ----------
+
+    Builds a dictionary of the normalized reference values (and aliases) to
+    their row index. The first reference column takes precedence, the same
+    as in the exact-match path of `_find_country_index`.
+    """
+
+    lookup = {}
+    for data in target_column:
+        for i, value in enumerate(data):
+            lookup.setdefault(value, i)
+
+    lookup.update(ALIAS_INDEX)
+
+    return lookup
+
+
+def project_fields(country_index: pd.Series,
+                   fields: Tuple[str, ...]) -> List[pd.Series]:
+    """
+    ## **Function**
+    ----------
+
+    Function projects reference fields (name, official, alpha-2, alpha-3)
+    from the row index returned by `resolve_country_index`.
+
+    ## **Parameters**
+    ----------
+
+    `country_index`:
+        The reference row index of each value.
+
+    `fields`:
+        The reference columns that are projected.
+
+    `return list[pd.Series]`:
+        Returns one series per field, with None where there is no match and
+        `DEFERRED` where the value was left out of the fuzzy matching.
+    """
+
+    deferred = country_index.eq(DEFERRED_INDEX).fillna(False).to_numpy(
+        dtype=bool)
+    matched = country_index.notna().to_numpy() & ~deferred
+    positions = country_index[matched].to_numpy(dtype=int)
+
+    projected = []
+    for field in fields:
+        values = np.full(len(country_index), None, dtype=object)
+        values[matched] = DATA[field].to_numpy()[positions]
+        values[deferred] = DEFERRED
+        projected.append(pd.Series(values, index=country_index.index))
+
+    return projected
+
+
+def _find_country_index(country: str,
+                        target_column: Tuple[np.ndarray, ...],
+                        fuzzy_threshold: int,
+                        fast_mode: bool = True,
+                        scorer: str = "levenshtein",
+                        record_matches: bool = True,
+                        words: Optional[str] = None) -> Optional[int]:
+    """
+    ## **Function**
+    ----------
+
+
+    Function finds the reference row of a country name.
+
+    ## **Parameters**
+    ----------
+
+    `country`:
+        The normalized value (country) that needs to be standardized.
 
     `target_column`:
         The column that contains the desired formatting.
@@ -239,22 +803,29 @@ def _format_country_name(val: str,
     `fuzzy_threshold`:
         The fuzzy ratio that decides if a value is replaced or not.
 
-    `wanted_output`:
-        The desired output of the formatting.
+    `record_matches`:
+        Boolean value that determines if a fuzzy match is counted in
+        `FUZZY_MATCH_COUNTS`.
 
-    `return str | None`:
-        Returns the formatted string or a None value if the string couldn't be
-        matched against any anything.
+    `words`:
+        The word form of the value for the token scorers, defaults to the
+        value.
+
+    `return int | None`:
+        Returns the index of the reference row or a None value if the string
+        couldn't be matched against any anything.
     """
 
-    # Data preparation
-    country = str(val).replace(" ", "").lower()
+    # Known aliases and promoted corrections resolve without matching
+    alias_index = ALIAS_INDEX.get(country)
+    if alias_index is not None:
+        return alias_index
 
     # Quick return, if the countries name matches completely
     for data in target_column:
-        if country in data[0]:
-            value_index = np.where(data[0] == country)[0]
-            return DATA[wanted_output][value_index]
+        value_index = np.flatnonzero(data == country)
+        if len(value_index):
+            return int(value_index[0])
 
     # Calculates the levenshtein ratio and returns index of best value
     if not fast_mode:
@@ -263,7 +834,9 @@ def _format_country_name(val: str,
         for data in target_column:
             country_ratio = _find_best_distance(country, data,
                                                 fuzzy_threshold,
-                                                ratio=True)
+                                                ratio=True,
+                                                scorer=scorer,
+                                                words=words)
             results.append(country_ratio)
 
         # Finds the maximum value within a tuple
@@ -279,29 +852,36 @@ def _format_country_name(val: str,
     else:
         country_index = _find_best_distance(country,
                                             target_column[0],
-                                            fuzzy_threshold)
+                                            fuzzy_threshold,
+                                            scorer=scorer,
+                                            words=words)
 
     if country_index is None:
         return None
 
-    return DATA[wanted_output][country_index]
+    if record_matches:
+        FUZZY_MATCH_COUNTS[(country, DATA["alpha-2"][country_index])] += 1
 
+    return country_index
 
-def _find_best_distance(country: str, target_column: pd.Series,
+
+def _find_best_distance(country: str, target_column: np.ndarray,
                         fuzzy_threshold: int,
-                        ratio: bool = False):
+                        ratio: bool = False,
+                        scorer: str = "levenshtein",
+                        words: Optional[str] = None):
     """
     ## **Function**
     ----------
 
-    Function finds the maximum levenshtein ratio and returns the index of that
+    Function finds the maximum matching ratio and returns the index of that
     value.
 
     ## **Parameters**
     ----------
 
     `country`:
-        The value whose levenshtein ratio is being calculated.
+        The value whose ratio is being calculated.
 
     `target_column`:
         The column which is being calculated against
@@ -309,30 +889,50 @@ def _find_best_distance(country: str, target_column: pd.Series,
     `fuzzy_threshold`:
         The minimum threshold for a value to be considered in the results
 
+    `scorer`:
+        Name of the scorer that calculates the ratio against the whole
+        column at once.
+
+    `words`:
+        The word form of the value for the token scorers, defaults to the
+        value.
+
     `return int | None`:
         Returns either the index of the best value or None if a value for the
         given criteria could not be found.
     """
-    results = []
-
-    # Calculates the ratio for each value in a given column
-    for i, val in enumerate(target_column):
 
-        try:
-            match_ratio = calculate_levenshtein_ratio(country, val)
-            # If the ratio is higher than the threshold it gets considered
-            if match_ratio >= fuzzy_threshold / 100:
-                results.append((match_ratio, i))
-
-        except Exception as err:
-            DistanceCalculationError(err=err,
-                                     message="Error calculating distance"
-                                             f"for:{val} on index {i}")
+    try:
+        if scorers.uses_words(scorer):
+            match_ratio = scorers.get(scorer)(
+                words or country, _reference_words(tuple(target_column)))
+        else:
+            match_ratio = scorers.get(scorer)(country, target_column)
+
+    except Exception as err:
+        DistanceCalculationError(err=err,
+                                 message="Error calculating distance"
+                                         f"for:{country}")
+        return None
 
-    if not results:
+    # Only ratios above the threshold are considered, on ties the last
+    # index wins
+    candidates = np.flatnonzero(match_ratio >= fuzzy_threshold / 100)
+    if not len(candidates):
         return None
 
+    best = candidates[::-1][np.argmax(match_ratio[candidates][::-1])]
+
     if ratio:
-        return max(results)
+        return float(match_ratio[best]), int(best)
+
+    return int(best)
+
+
+@lru_cache(maxsize=16)
+def _reference_words(target_column: Tuple[str, ...]) -> Tuple[str, ...]:
+    """
+    Returns the word forms of a normalized reference column.
+    """
 
-    return max(results)[1]
+    return tuple(REFERENCE_WORDS.get(value, value) for value in target_column)
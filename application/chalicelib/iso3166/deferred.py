@@ -0,0 +1,161 @@
+import pandas as pd
+
+from .converter import DEFERRED, REFERENCE, resolve_country_index, \
+    project_fields
+
+# Output fields of the corrections, the same as the converted columns
+CORRECTION_FIELDS = ("official", "alpha-2")
+
+
+def collect_deferred(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    ## **Function**
+    ----------
+
+    Collects the distinct raw values that were deferred by the exact-only
+    pass (`fuzzy_sample=0.0`), so they can be fuzzy matched in bulk by
+    `resolve_deferred`.
+
+    ## **Parameters**
+    ----------
+
+    `df`:
+        A converted dataframe with the detection in `df.attrs["detection"]`.
+
+    `return pd.DataFrame`:
+        Returns the deferred values and the reference columns they are
+        matched against ("official", "name" or "alpha-2").
+    """
+
+    detection = df.attrs["detection"]
+    deferred = df.iloc[:, -1] == DEFERRED
+
+    if detection["name_column"] is not None:
+        column, option = detection["name_column"], detection["option"]
+    else:
+        column, option = detection["code_column"], "alpha-2"
+
+    values = df.loc[deferred, column].dropna().astype(str).drop_duplicates()
+
+    return pd.DataFrame({"value": values.to_numpy(), "option": option})
+
+
+class DeferredCollector(object):
+
+    """
+    Class collects the deferred values of the chunks of a file (see
+    `collect_deferred`) while they are converted. Values deferred in more
+    than one chunk are kept once.
+    """
+
+    def __init__(self):
+        self.values = None
+
+    def add(self, df: pd.DataFrame) -> None:
+        """
+        Adds the deferred values of a converted chunk.
+        """
+
+        values = collect_deferred(df)
+        if self.values is not None:
+            values = pd.concat([self.values, values]).drop_duplicates(
+                ignore_index=True)
+
+        self.values = values
+
+
+def resolve_deferred(deferred: pd.DataFrame,
+                     fuzzy_threshold: int = 70,
+                     scorer: str = "levenshtein") -> pd.DataFrame:
+    """
+    ## **Function**
+    ----------
+
+    Fuzzy matches deferred values in bulk. The deferred values of many files
+    can be concatenated, each distinct value is matched once. Names are
+    matched against both naming columns since the batch is not latency
+    critical.
+
+    ## **Parameters**
+    ----------
+
+    `deferred`:
+        Deferred values as returned by `collect_deferred`.
+
+    `fuzzy_threshold`:
+        The fuzzy ratio that decides if a value is replaced or not.
+
+    `scorer`:
+        Name of the fuzzy matching scorer.
+
+    `return pd.DataFrame`:
+        Returns the corrections, with the country name and code of each
+        value or None where it still couldn't be matched.
+    """
+
+    corrections = []
+    for option, group in deferred.groupby("option", sort=False):
+        values = group["value"].drop_duplicates().reset_index(drop=True)
+
+        if option == "alpha-2":
+            target_column = (REFERENCE["alpha-2"],)
+        else:
+            other = [x for x in ("official", "name") if x != option][0]
+            target_column = (REFERENCE[option], REFERENCE[other])
+
+        country_index = resolve_country_index(values, target_column,
+                                              fuzzy_threshold,
+                                              fast_mode=False,
+                                              scorer=scorer)
+        country_name, country_code = project_fields(country_index,
+                                                    CORRECTION_FIELDS)
+
+        corrections.append(pd.DataFrame({"value": values,
+                                         "country_name": country_name,
+                                         "country_code": country_code}))
+
+    if not corrections:
+        return pd.DataFrame({"value": [], "country_name": [],
+                             "country_code": []}, dtype=object)
+
+    return pd.concat(corrections, ignore_index=True).drop_duplicates(
+        "value")
+
+
+def apply_corrections(df: pd.DataFrame,
+                      corrections: pd.DataFrame) -> pd.DataFrame:
+    """
+    ## **Function**
+    ----------
+
+    Patches the deferred rows of a converted dataframe with the corrections
+    of `resolve_deferred`. Values without a correction stay deferred.
+
+    ## **Parameters**
+    ----------
+
+    `df`:
+        A converted dataframe with the detection in `df.attrs["detection"]`.
+
+    `corrections`:
+        The corrections of the deferred values.
+
+    `return pd.DataFrame`:
+        Returns the patched dataframe.
+    """
+
+    detection = df.attrs["detection"]
+    column = detection["name_column"] or detection["code_column"]
+    name_column, code_column = df.columns[-2:]
+
+    deferred = (df[code_column] == DEFERRED).to_numpy()
+    raw = df.loc[deferred, column].astype(str)
+    lookup = corrections.set_index("value")
+
+    for output, field in ((name_column, "country_name"),
+                          (code_column, "country_code")):
+        patched = raw.map(lookup[field]).astype(str)
+        df.loc[deferred, output] = patched.where(raw.isin(lookup.index),
+                                                 DEFERRED)
+
+    return df
@@ -1,6 +1,13 @@
 import pandas as pd
+from functools import partial
 from typing import Callable
 
+from . import readers
+from ..core.config import settings
+
+# Colspecs of fixed-width layouts, shared by all reads in this process
+COLSPEC_CACHE = readers.ColspecCache(settings.COLSPEC_CACHE_PATH)
+
 
 class DynamicFileReadingDispatcher(object):
 
@@ -60,16 +67,31 @@ class DynamicFileMachine(object):
 
     @dispatcher.register(".csv")
     def _custom_read_csv(self) -> Callable:
-        return pd.read_csv
+        return partial(readers.read_csv,
+                       sample_rows=settings.CSV_SAMPLE_ROWS,
+                       engine=settings.CSV_ENGINE)
 
     @dispatcher.register(".json")
     def _custom_read_json(self) -> Callable:
         return pd.read_json
 
+    @dispatcher.register(".jsonl")
+    @dispatcher.register(".ndjson")
+    def _custom_read_json_lines(self) -> Callable:
+        return partial(readers.read_json_lines,
+                       chunksize=settings.JSON_CHUNK_SIZE)
+
     @dispatcher.register(".parquet")
     def _custom_read_parquet(self) -> Callable:
-        return pd.read_parquet
+        return readers.read_parquet
+
+    @dispatcher.register(".arrow")
+    @dispatcher.register(".feather")
+    def _custom_read_arrow(self) -> Callable:
+        return readers.read_arrow
 
     @dispatcher.register(".txt")
     def _custom_read_text(self) -> Callable:
-        return pd.read_fwf
+        return partial(readers.read_fixed_width,
+                       cache=COLSPEC_CACHE,
+                       chunksize=settings.FWF_CHUNK_SIZE)
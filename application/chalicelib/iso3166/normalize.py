@@ -0,0 +1,101 @@
+import unicodedata
+
+import pandas as pd
+
+# Combining diacritical marks left over after the NFKD decomposition
+COMBINING_MARKS = ("[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff"
+                   "\u20d0-\u20ff\ufe20-\ufe2f]")
+
+# Arrow-backed strings run the string kernels outside of the interpreter
+STRING_DTYPE = pd.StringDtype("pyarrow")
+
+
+def normalize_name(value: str) -> str:
+    """
+    ## **Function**
+    ----------
+
+    Normalizes a single country name: Unicode casefold, accent stripping
+    (so "Åland" and "Aland" meet) and removal of whitespace.
+
+    ## **Parameters**
+    ----------
+
+    `value`:
+        The value that gets normalized.
+
+    `return str`:
+        Returns the normalized string.
+    """
+
+    decomposed = unicodedata.normalize("NFKD", str(value).casefold())
+    stripped = "".join(char for char in decomposed
+                       if not unicodedata.combining(char))
+
+    return "".join(stripped.split())
+
+
+def normalize_names(values: pd.Series) -> pd.Series:
+    """
+    ## **Function**
+    ----------
+
+    Vectorized version of `normalize_name` that runs once per column. The
+    result is reused by the column detection, the exact matching and the
+    fuzzy matching.
+
+    ## **Parameters**
+    ----------
+
+    `values`:
+        The column that gets normalized.
+
+    `return pd.Series`:
+        Returns an object series of normalized strings, missing values stay
+        missing.
+    """
+
+    missing = values.isna()
+    normalized = _fold(values).str.replace(r"\s+", "", regex=True)
+
+    return normalized.astype(object).mask(missing)
+
+
+def normalize_words(values: pd.Series) -> pd.Series:
+    """
+    ## **Function**
+    ----------
+
+    Same as `normalize_names`, but the words are kept apart by single
+    spaces (e.g. "Korea,  South" becomes "korea, south"). Removing the
+    spaces gives the normalized name. The word forms are used by the token
+    scorers.
+
+    ## **Parameters**
+    ----------
+
+    `values`:
+        The column that gets normalized.
+
+    `return pd.Series`:
+        Returns an object series of normalized strings, missing values stay
+        missing.
+    """
+
+    missing = values.isna()
+    words = (_fold(values).str.replace(r"\s+", " ", regex=True)
+             .str.strip())
+
+    return words.astype(object).mask(missing)
+
+
+def _fold(values: pd.Series) -> pd.Series:
+    """
+    Casefolds a column and strips its accents.
+    """
+
+    strings = values.astype(str).astype(STRING_DTYPE)
+
+    return (strings.str.casefold()
+            .str.normalize("NFKD")
+            .str.replace(COMBINING_MARKS, "", regex=True))
@@ -0,0 +1,570 @@
+import io
+import os
+import bz2
+import gzip
+import json
+import lzma
+import hashlib
+import threading
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, \
+    Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet as pq
+
+from ..error.exceptions import FileLoadingError
+
+# Optional fast json parsers, pandas is used when neither is installed
+try:
+    import orjson as fast_json
+except ImportError:
+    try:
+        import simdjson as fast_json
+    except ImportError:
+        fast_json = None
+
+# Maps the compression suffix of a file to its compression
+COMPRESSION_EXTENSIONS = {".gz": "gzip",
+                          ".bz2": "bz2",
+                          ".xz": "xz",
+                          ".zst": "zstd"}
+
+# File types whose readers accept a chunksize
+CHUNKED_FILE_TYPES = {".csv", ".jsonl", ".ndjson", ".parquet", ".arrow",
+                      ".feather", ".txt"}
+
+
+def split_extension(file_name: str) -> Tuple[str, Optional[str]]:
+    """
+    ## **Function**
+    ----------
+
+    Splits compound extensions like `.csv.gz` into the file type used by the
+    dispatcher and the compression of the file.
+
+    ## **Parameters**
+    ----------
+
+    `file_name`:
+        Name or path of the file.
+
+    `return tuple[str, str | None]`:
+        Returns the file type (e.g. ".csv") and the compression
+        (e.g. "gzip") or None for uncompressed files.
+    """
+
+    root, file_type = os.path.splitext(file_name)
+    compression = COMPRESSION_EXTENSIONS.get(file_type.lower())
+
+    if compression is not None:
+        _, file_type = os.path.splitext(root)
+
+    return file_type, compression
+
+
+def open_decompressed(stream: BinaryIO, compression: str) -> BinaryIO:
+    """
+    ## **Function**
+    ----------
+
+    Wraps a binary stream with a streaming decompressor. The data is
+    decompressed while it is being read, so the decompressed file is never
+    held in memory as a whole.
+
+    ## **Parameters**
+    ----------
+
+    `stream`:
+        Binary stream of compressed data, e.g. a S3 response body.
+
+    `compression`:
+        One of the values of `COMPRESSION_EXTENSIONS`.
+
+    `return BinaryIO`:
+        Returns a readable stream of decompressed data.
+    """
+
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+
+    if compression == "bz2":
+        return bz2.BZ2File(stream, mode="rb")
+
+    if compression == "xz":
+        return lzma.LZMAFile(stream, mode="rb")
+
+    if compression == "zstd":
+        # Arrow streams don't support readline, the reader adds it
+        return io.BufferedReader(pa.CompressedInputStream(stream, "zstd"))
+
+    raise FileLoadingError(message=f"Unknown compression: {compression}")
+
+
+def read_body(stream: BinaryIO, size: int,
+              block_size: int = 1 << 20) -> pa.Buffer:
+    """
+    ## **Function**
+    ----------
+
+    The function reads a response body of a known size into one
+    preallocated buffer. Streams that support `readinto` are read straight
+    into the buffer, so the object is held in memory once, and the result
+    wraps the same memory as an Arrow buffer for the decoders.
+
+    ## **Parameters**
+    ----------
+
+    `stream`:
+        The binary stream, e.g. the body of a S3 response.
+
+    `size`:
+        Size of the object in bytes (the S3 ContentLength).
+
+    `block_size`:
+        Number of bytes read per call.
+
+    `return pa.Buffer`:
+        Returns the content of the stream, open it with `pa.BufferReader`.
+    """
+
+    view = memoryview(bytearray(size))
+    readinto = getattr(stream, "readinto", None)
+
+    offset = 0
+    while offset < size:
+        end = min(offset + block_size, size)
+
+        if readinto is not None:
+            read = readinto(view[offset:end])
+        else:
+            block = stream.read(end - offset)
+            read = len(block)
+            view[offset:offset + read] = block
+
+        if not read:
+            break
+        offset += read
+
+    return pa.py_buffer(view[:offset])
+
+
+def read_csv(source: Any,
+             sample_rows: int = 100,
+             engine: Optional[str] = None,
+             categorical: bool = False,
+             chunksize: Optional[int] = None
+             ) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """
+    ## **Function**
+    ----------
+
+    The function reads a header-plus-sample block of a csv file, runs the
+    column auto-detection on it and then parses the whole file with dtype
+    hints for the detected columns. The detected columns are read as strings
+    (or categories) so pandas does not run type inference on them, while the
+    rest of the columns are passed through.
+
+    ## **Parameters**
+    ----------
+
+    `source`:
+        Path or binary buffer of the csv file.
+
+    `sample_rows`:
+        Number of rows read for the column detection.
+
+    `engine`:
+        The pandas csv engine. "pyarrow" enables multi-threaded parsing.
+
+    `categorical`:
+        Boolean value that determines if the detected columns are read as
+        categories instead of strings.
+
+    `chunksize`:
+        Number of rows in each chunk, None reads the whole file at once.
+
+    `return pd.DataFrame | Iterator[pd.DataFrame]`:
+        Returns a pd.DataFrame object that contains data from the file, or
+        an iterator of chunks when a chunksize is given.
+    """
+
+    # Imported here, the converter depends on the dispatcher module
+    from .converter import detect_columns
+
+    if hasattr(source, "read"):
+        # Buffers are peeked, decompressed streams cannot be rewound
+        head, source = _peek_lines(source, sample_rows + 1)
+        sample = pd.read_csv(io.BytesIO(head), nrows=sample_rows, dtype=str)
+    else:
+        sample = pd.read_csv(source, nrows=sample_rows, dtype=str)
+
+    _, target_column, secondary_column = detect_columns(
+        sample, sample_size=sample_rows)
+
+    detected = [col for col in (target_column, secondary_column)
+                if col is not None]
+    dtype = {col: "category" if categorical else str for col in detected}
+
+    if chunksize is not None:
+        # The pyarrow engine does not support chunked reads
+        return pd.read_csv(source, dtype=dtype or None, chunksize=chunksize)
+
+    return pd.read_csv(source, dtype=dtype or None, engine=engine)
+
+
+def read_json_lines(source: Any,
+                    chunksize: int = 10_000) -> Iterator[pd.DataFrame]:
+    """
+    ## **Function**
+    ----------
+
+    The function reads a JSON Lines (NDJSON) file incrementally and yields
+    one dataframe per chunk of records, so a large export never has to be
+    loaded as a single object. Lines are parsed with orjson or simdjson when
+    one of them is installed.
+
+    ## **Parameters**
+    ----------
+
+    `source`:
+        Path or binary buffer of the JSON Lines file.
+
+    `chunksize`:
+        Number of records in each yielded dataframe.
+
+    `return Iterator[pd.DataFrame]`:
+        Returns a generator of dataframes.
+    """
+
+    if fast_json is None:
+        with pd.read_json(source, lines=True, chunksize=chunksize) as reader:
+            yield from reader
+        return
+
+    stream = open(source, "rb") if isinstance(source, str) else source
+
+    # Unbuffered streams, e.g. a botocore StreamingBody, iterate in blocks
+    # of 1 KiB instead of lines
+    lines = (stream if isinstance(stream, io.BufferedIOBase)
+             else io.BufferedReader(stream))
+
+    try:
+        records = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+
+            records.append(fast_json.loads(line))
+            if len(records) >= chunksize:
+                yield pd.DataFrame.from_records(records)
+                records = []
+
+        if records:
+            yield pd.DataFrame.from_records(records)
+
+    finally:
+        # The buffer is detached so it doesn't close the stream of the caller
+        if lines is not stream:
+            lines.detach()
+
+        if stream is not source:
+            stream.close()
+
+
+def read_parquet(source: Any, chunksize: Optional[int] = None
+                 ) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """
+    ## **Function**
+    ----------
+
+    The function reads a parquet file. Local files are memory-mapped instead
+    of being read into the heap, buffers (e.g. a `pa.BufferReader` over the
+    result of `read_body`) are decoded without copying them first.
+
+    ## **Parameters**
+    ----------
+
+    `source`:
+        Path or binary buffer of the parquet file.
+
+    `chunksize`:
+        Number of rows in each chunk, None reads the whole file at once.
+
+    `return pd.DataFrame | Iterator[pd.DataFrame]`:
+        Returns a pd.DataFrame object that contains data from the file, or
+        an iterator of chunks when a chunksize is given.
+    """
+
+    if chunksize is not None:
+        return _iter_parquet(source, chunksize)
+
+    if isinstance(source, str):
+        return pd.read_parquet(source, memory_map=True)
+
+    return pq.read_table(source).to_pandas(split_blocks=True,
+                                           self_destruct=True)
+
+
+def read_arrow(source: Any, chunksize: Optional[int] = None
+               ) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """
+    ## **Function**
+    ----------
+
+    The function reads an Arrow IPC (Feather v2) file. Local files are
+    memory-mapped, so the record batches reference the mapped pages and the
+    conversion to pandas releases each column once it was converted.
+
+    ## **Parameters**
+    ----------
+
+    `source`:
+        Path or binary buffer of the Arrow IPC file.
+
+    `chunksize`:
+        Number of rows in each chunk, None reads the whole file at once.
+
+    `return pd.DataFrame | Iterator[pd.DataFrame]`:
+        Returns a pd.DataFrame object that contains data from the file, or
+        an iterator of chunks when a chunksize is given.
+    """
+
+    if chunksize is not None:
+        return _iter_arrow(source, chunksize)
+
+    if isinstance(source, str):
+        with pa.memory_map(source, "r") as mapped:
+            table = pa.ipc.open_file(mapped).read_all()
+
+    else:
+        table = pa.ipc.open_file(source).read_all()
+
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _iter_parquet(source: Any, chunksize: int) -> Iterator[pd.DataFrame]:
+    """
+    Yields a parquet file in batches of rows, only the row groups of the
+    current batch are decoded.
+    """
+
+    parquet_file = pq.ParquetFile(source, memory_map=isinstance(source, str))
+
+    try:
+        for batch in parquet_file.iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+
+    finally:
+        # Unmaps a local file when the iteration is abandoned
+        if isinstance(source, str):
+            parquet_file.close()
+
+
+def _iter_arrow(source: Any, chunksize: int) -> Iterator[pd.DataFrame]:
+    """
+    Yields an Arrow IPC file in slices of its record batches.
+    """
+
+    mapped = pa.memory_map(source, "r") if isinstance(source, str) else None
+
+    try:
+        reader = pa.ipc.open_file(mapped or source)
+
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+
+            for offset in range(0, batch.num_rows, chunksize):
+                yield batch.slice(offset, chunksize).to_pandas()
+
+    finally:
+        if mapped is not None:
+            mapped.close()
+
+
+def read_fixed_width(source: Any,
+                     cache: Optional["ColspecCache"] = None,
+                     cache_key: Optional[str] = None,
+                     sample_rows: int = 100,
+                     chunksize: int = 50_000) -> Iterator[pd.DataFrame]:
+    """
+    ## **Function**
+    ----------
+
+    The function reads a fixed-width file in chunks with explicit column
+    specifications. The colspecs are inferred once from a sample of the file
+    and cached by the `cache_key` (e.g. the producer prefix) or by a
+    fingerprint of the header line, so files with a known layout skip the
+    inference.
+
+    ## **Parameters**
+    ----------
+
+    `source`:
+        Path or binary buffer of the fixed-width file.
+
+    `cache`:
+        Cache that stores the colspecs of known layouts.
+
+    `cache_key`:
+        Key of the layout in the cache, defaults to the header fingerprint.
+
+    `sample_rows`:
+        Number of lines used to infer the colspecs.
+
+    `chunksize`:
+        Number of rows in each yielded dataframe.
+
+    `return Iterator[pd.DataFrame]`:
+        Returns a generator of dataframes.
+    """
+
+    opened = open(source, "rb") if isinstance(source, str) else None
+
+    try:
+        head, stream = _peek_lines(opened or source, sample_rows)
+        lines = head.decode("utf-8", errors="replace").splitlines()
+
+        if cache_key is None:
+            cache_key = schema_fingerprint(lines[0] if lines else "")
+
+        colspecs = cache.get(cache_key) if cache is not None else None
+
+        if colspecs is None:
+            colspecs = infer_colspecs(lines)
+
+            if cache is not None:
+                cache.set(cache_key, colspecs)
+
+        with pd.read_fwf(stream, colspecs=colspecs,
+                         chunksize=chunksize) as reader:
+            yield from reader
+
+    finally:
+        if opened is not None:
+            opened.close()
+
+
+def infer_colspecs(lines: List[str],
+                   delimiters: str = " \t") -> List[Tuple[int, int]]:
+    """
+    ## **Function**
+    ----------
+
+    Infers the column specifications of fixed-width lines. A column is a run
+    of character positions that contain a non-blank character in at least
+    one of the lines.
+
+    ## **Parameters**
+    ----------
+
+    `lines`:
+        Sample lines of the file, without line endings.
+
+    `delimiters`:
+        Characters that are treated as blanks.
+
+    `return list[tuple[int, int]]`:
+        Returns the half-open [start, end) intervals of the columns.
+    """
+
+    width = max((len(line) for line in lines), default=0)
+    mask = np.zeros(width + 2, dtype=bool)
+
+    for line in lines:
+        mask[1:len(line) + 1] |= np.fromiter(
+            (char not in delimiters for char in line), dtype=bool,
+            count=len(line))
+
+    edges = np.diff(mask.astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    return [(int(start), int(end)) for start, end in zip(starts, ends)]
+
+
+def schema_fingerprint(header: str) -> str:
+    """
+    ## **Function**
+    ----------
+
+    Creates a fingerprint of a header line, files with the same header
+    share the same layout.
+    """
+
+    return hashlib.sha1(header.rstrip().encode("utf-8")).hexdigest()
+
+
+class ColspecCache(object):
+
+    """
+    Class stores inferred colspecs by layout key. The cache lives in memory
+    for the lifetime of the process (e.g. a warm Lambda container) and is
+    optionally persisted to a json file.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Tuple[int, int]]] = {}
+
+        if path is not None and os.path.exists(path):
+            with open(path) as fh:
+                self._entries = {key: [tuple(spec) for spec in value]
+                                 for key, value in json.load(fh).items()}
+
+    def get(self, key: str) -> Optional[List[Tuple[int, int]]]:
+        return self._entries.get(key)
+
+    def set(self, key: str, colspecs: List[Tuple[int, int]]) -> None:
+        with self._lock:
+            self._entries[key] = list(colspecs)
+
+            if self.path is not None:
+                with open(self.path, "w") as fh:
+                    json.dump(self._entries, fh)
+
+
+def _peek_lines(stream: BinaryIO, num_lines: int) -> Tuple[bytes, BinaryIO]:
+    """
+    ## **Function**
+    ----------
+
+    Reads the first lines of a stream that cannot be rewound.
+
+    `return tuple[bytes, BinaryIO]`:
+        Returns the lines that were read and a stream that yields them
+        again, followed by the rest of the original stream.
+    """
+
+    head = b"".join(stream.readline() for _ in range(num_lines))
+
+    return head, io.BufferedReader(_PrefixedStream(head, stream))
+
+
+class _PrefixedStream(io.RawIOBase):
+
+    """
+    Raw stream that returns a prefix before the data of another stream.
+    """
+
+    def __init__(self, prefix: bytes, stream: BinaryIO):
+        self._prefix = memoryview(prefix)
+        self._stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._prefix:
+            size = min(len(buffer), len(self._prefix))
+            buffer[:size] = self._prefix[:size]
+            self._prefix = self._prefix[size:]
+            return size
+
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
@@ -0,0 +1,233 @@
+import json
+from typing import Dict, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from . import converter
+from .converter import REFERENCE, resolve_country_index, recorded_fields, \
+    project_fields
+from .normalize import normalize_names
+from .utils import PANDAS_ATTRS_KEY
+from ..error.exceptions import FileSavingError
+
+# Output fields of the recorded output columns
+OUTPUT_FIELDS = {"name": "official", "code": "alpha-2"}
+
+
+def diff_mappings(attrs: dict
+                  ) -> Tuple[Dict[str, pd.Series], Dict[str, Set[str]],
+                             Dict[str, Set[str]]]:
+    """
+    ## **Function**
+    ----------
+
+    Matches the distinct values recorded in `attrs["reference"]` against the
+    current reference data, with the settings of the original conversion.
+    Only the recorded values are matched, the data itself isn't needed. The
+    matches aren't counted in the fuzzy match counts, since they were
+    counted when the file was converted.
+
+    ## **Parameters**
+    ----------
+
+    `attrs`:
+        The attrs of a converted dataframe, with the detection and the
+        reference mapping.
+
+    `return tuple[dict[str, pd.Series], dict[str, set[str]],
+    dict[str, set[str]]]`:
+        Returns the new reference row index of each recorded value, the
+        values whose iso3166 fields changed and the values whose country
+        code changed, per column ("name" or "code").
+    """
+
+    reference = attrs["reference"]
+    option = attrs["detection"]["option"]
+    words = json.loads(reference.get("words", "{}"))
+
+    resolved, changed, recoded = {}, {}, {}
+    for kind, recorded in json.loads(reference["mapping"]).items():
+        if kind == "code":
+            target_column = (REFERENCE["alpha-2"],)
+        elif reference["fast_mode"]:
+            target_column = (REFERENCE[option],)
+        else:
+            other = [x for x in ("official", "name") if x != option][0]
+            target_column = (REFERENCE[option], REFERENCE[other])
+
+        values = pd.Series(list(recorded), dtype=object)
+        country_index = resolve_country_index(values, target_column,
+                                              reference["fuzzy_threshold"],
+                                              reference["fast_mode"],
+                                              reference["exact_coverage"],
+                                              reference["scorer"],
+                                              record_matches=False,
+                                              words=words)
+        current = recorded_fields(country_index.attrs["mapping"])
+
+        resolved[kind] = pd.Series(country_index.to_numpy(), index=values,
+                                   dtype="Int64")
+        changed[kind] = {value for value, fields in recorded.items()
+                         if current.get(value) != fields}
+        recoded[kind] = {value for value in changed[kind]
+                         if _code(recorded[value])
+                         != _code(current.get(value))}
+
+    return resolved, changed, recoded
+
+
+def _code(fields: Optional[list]) -> Optional[str]:
+    """
+    Returns the country code of recorded iso3166 fields.
+    """
+
+    return None if fields is None else fields[1]
+
+
+def restandardize(df: pd.DataFrame,
+                  diff: Optional[tuple] = None) -> Tuple[pd.DataFrame, int]:
+    """
+    ## **Function**
+    ----------
+
+    Updates a converted dataframe to the current reference data. Only the
+    rows whose values map to different iso3166 fields are rewritten, the
+    detection and the matching of the other values aren't run again. The
+    output columns are taken from `attrs["reference"]["outputs"]`, so the
+    input columns are never written. The code column is dropped from the
+    files of a partitioned dataset, if a code changes their rows would need
+    to move to another partition and a FileSavingError is raised.
+
+    ## **Parameters**
+    ----------
+
+    `df`:
+        A converted dataframe with `df.attrs["reference"]`.
+
+    `diff`:
+        The result of `diff_mappings` if it was already computed.
+
+    `return tuple[pd.DataFrame, int]`:
+        Returns the updated dataframe and the number of rewritten rows.
+    """
+
+    reference = df.attrs["reference"]
+    if reference["version"] == converter.REFERENCE_VERSION:
+        return df, 0
+
+    resolved, changed, recoded = diff or diff_mappings(df.attrs)
+    columns = {"name": df.attrs["detection"]["name_column"],
+               "code": df.attrs["detection"]["code_column"]}
+    outputs = {kind: column
+               for kind, column in reference["outputs"].items()
+               if column in df.columns}
+
+    affected = np.zeros(len(df), dtype=bool)
+    moved = np.zeros(len(df), dtype=bool)
+    country_index = None
+    for kind in ("name", "code"):
+        # The code column can be one of the dropped output columns
+        if kind not in resolved or columns[kind] not in df.columns:
+            continue
+
+        normalized = normalize_names(df[columns[kind]])
+        affected |= normalized.isin(changed[kind]).to_numpy()
+        moved |= normalized.isin(recoded[kind]).to_numpy()
+
+        index = normalized.map(resolved[kind])
+        country_index = (index if country_index is None
+                         else country_index.combine_first(index))
+
+    if "code" not in outputs and moved.any():
+        raise FileSavingError(message="Error - the country code of "
+                                      f"{int(moved.sum())} rows changed, "
+                                      "the partitioned output needs to be "
+                                      "converted again")
+
+    if affected.any():
+        for kind, column in outputs.items():
+            values, = project_fields(country_index[affected],
+                                     (OUTPUT_FIELDS[kind],))
+            df.loc[affected, column] = values.astype(str).to_numpy()
+
+    df.attrs["reference"] = current_reference(reference, resolved)
+
+    return df, int(affected.sum())
+
+
+def current_reference(reference: dict,
+                      resolved: Dict[str, pd.Series]) -> dict:
+    """
+    Returns the recorded reference of a file updated to the current
+    reference data, from the index resolved by `diff_mappings`.
+    """
+
+    mapping = {kind: recorded_fields(
+        {value: None if pd.isna(index) else int(index)
+         for value, index in index_mapping.items()})
+        for kind, index_mapping in resolved.items()}
+
+    return {**reference,
+            "version": converter.REFERENCE_VERSION,
+            "mapping": json.dumps(mapping)}
+
+
+def read_attrs(path: str) -> dict:
+    """
+    ## **Function**
+    ----------
+
+    Reads the dataframe attrs of a parquet file from its footer, without
+    loading the data.
+
+    `return dict`:
+        Returns the attrs, empty for files written without them.
+    """
+
+    metadata = pq.read_schema(path).metadata or {}
+
+    return json.loads(metadata.get(PANDAS_ATTRS_KEY, b"{}"))
+
+
+def restandardize_file(path: str) -> int:
+    """
+    ## **Function**
+    ----------
+
+    Restandardizes a converted parquet file in place. Files converted with
+    the current reference data, or without a recorded mapping, are only
+    opened to read the footer. Files where no recorded value changed are
+    rewritten without converting the data, only the reference version in
+    their footer is updated so they are skipped by the next run.
+
+    ## **Parameters**
+    ----------
+
+    `path`:
+        Path of the converted parquet file.
+
+    `return int`:
+        Returns the number of rewritten rows.
+    """
+
+    attrs = read_attrs(path)
+    reference = attrs.get("reference")
+
+    if not reference or reference["version"] == converter.REFERENCE_VERSION:
+        return 0
+
+    diff = diff_mappings(attrs)
+    if not any(diff[1].values()):
+        attrs["reference"] = current_reference(reference, diff[0])
+        table = pq.read_table(path)
+        pq.write_table(table.replace_schema_metadata(
+            {**table.schema.metadata,
+             PANDAS_ATTRS_KEY: json.dumps(attrs)}), path)
+        return 0
+
+    df, rows = restandardize(pd.read_parquet(path), diff)
+    df.to_parquet(path)
+
+    return rows
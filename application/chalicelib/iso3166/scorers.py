@@ -0,0 +1,435 @@
+import numpy as np
+from functools import lru_cache
+from typing import Callable, Sequence, Tuple
+
+
+class ScorerRegistry(object):
+
+    """
+    Class keeps the fuzzy matching scorers. A scorer takes one value and an
+    array of candidates and returns the similarity of the value to every
+    candidate as a float array between 0.0 and 1.0. Other scorers can be
+    added with the @scorers.register decorator.
+    """
+
+    def __init__(self):
+        self.registry = {}
+        self.word_scorers = set()
+
+    def register(self, name: str, words: bool = False):
+
+        """
+        ## **Function**
+        ----------
+
+        The function registers a scorer and adds it to a dictionary based on
+        the name. For example: dict[name] = function.
+
+        ## **Parameters**
+        ----------
+        `name`:
+            The string used to identify the scorer.
+
+        `words`:
+            Boolean value that determines if the scorer compares the word
+            forms of the values (see `normalize.normalize_words`) instead of
+            the normalized values without whitespace.
+
+        `return None`
+        """
+
+        def decorator(function):
+            self.registry[name] = function
+            if words:
+                self.word_scorers.add(name)
+            return function
+
+        return decorator
+
+    def get(self, name: str) -> Callable[[str, np.ndarray], np.ndarray]:
+        return self.registry[name]
+
+    def uses_words(self, name: str) -> bool:
+        return name in self.word_scorers
+
+
+scorers = ScorerRegistry()
+
+
+@scorers.register("levenshtein")
+def levenshtein_scores(value: str, candidates: Sequence[str]) -> np.ndarray:
+    """
+    ## **Function**
+    ----------
+
+    Levenshtein ratio of a value against all candidates at once, with the
+    same costs as `utils.calculate_levenshtein_ratio` (substitutions count
+    as two edits). The dynamic programming table is filled for every
+    candidate simultaneously.
+
+    ## **Parameters**
+    ----------
+
+    `value`:
+        The value whose ratio is being calculated.
+
+    `candidates`:
+        The values that are calculated against.
+
+    `return np.ndarray`:
+        Returns the ratio for each candidate.
+    """
+
+    codes, lengths = _encode(tuple(candidates))
+    query = _codes(value)
+    rows = np.arange(len(codes))
+
+    # Distances from the empty query prefix to every candidate prefix
+    previous = np.tile(np.arange(codes.shape[1] + 1), (len(codes), 1))
+
+    for i, char in enumerate(query, start=1):
+        cost = np.where(codes == char, 0, 2)
+        current = np.empty_like(previous)
+        current[:, 0] = i
+
+        for j in range(1, codes.shape[1] + 1):
+            current[:, j] = np.minimum(
+                np.minimum(previous[:, j], current[:, j - 1]) + 1,
+                previous[:, j - 1] + cost[:, j - 1])
+
+        previous = current
+
+    total = len(query) + lengths
+    distance = previous[rows, lengths]
+
+    return np.divide(total - distance, total, out=np.zeros(len(codes)),
+                     where=total > 0)
+
+
+@scorers.register("jaro_winkler")
+def jaro_winkler_scores(value: str, candidates: Sequence[str],
+                        prefix_weight: float = 0.1) -> np.ndarray:
+    """
+    ## **Function**
+    ----------
+
+    Jaro-Winkler similarity of a value against all candidates at once.
+    Matching characters are searched for every candidate simultaneously,
+    one query character at a time, and common prefixes of up to four
+    characters are rewarded.
+
+    ## **Parameters**
+    ----------
+
+    `value`:
+        The value whose similarity is being calculated.
+
+    `candidates`:
+        The values that are calculated against.
+
+    `prefix_weight`:
+        The Winkler scaling factor of the common prefix.
+
+    `return np.ndarray`:
+        Returns the similarity for each candidate.
+    """
+
+    codes, lengths = _encode(tuple(candidates))
+    query = _codes(value)
+    num, width = codes.shape
+    rows = np.arange(num)
+    positions = np.arange(width)
+
+    if not len(query):
+        return np.zeros(num)
+
+    window = np.maximum(np.maximum(lengths, len(query)) // 2 - 1, 0)
+    candidate_matched = np.zeros((num, width), dtype=bool)
+    query_matched = np.zeros((num, len(query)), dtype=bool)
+
+    for i, char in enumerate(query):
+        available = ((codes == char) & ~candidate_matched
+                     & (np.abs(positions - i) <= window[:, None]))
+        found = available.any(axis=1)
+        first = available.argmax(axis=1)
+
+        candidate_matched[rows[found], first[found]] = True
+        query_matched[found, i] = True
+
+    matches = query_matched.sum(axis=1)
+
+    # Matched characters in their order, to count the transpositions
+    query_order = np.where(query_matched, query, -1)
+    query_order = np.take_along_axis(
+        query_order, np.argsort(~query_matched, axis=1, kind="stable"),
+        axis=1)
+    candidate_order = np.where(candidate_matched, codes, -1)
+    candidate_order = np.take_along_axis(
+        candidate_order, np.argsort(~candidate_matched, axis=1,
+                                    kind="stable"), axis=1)
+
+    size = min(len(query), width)
+    transpositions = (query_order[:, :size]
+                      != candidate_order[:, :size]).sum(axis=1) / 2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        jaro = (matches / len(query) + matches / lengths
+                + (matches - transpositions) / matches) / 3
+
+    jaro = np.where(matches > 0, jaro, 0.0)
+
+    prefix = _common_prefix(codes, query, lengths, limit=4)
+
+    return jaro + prefix * prefix_weight * (1 - jaro)
+
+
+@scorers.register("bigram_dice")
+def bigram_dice_scores(value: str, candidates: Sequence[str]) -> np.ndarray:
+    """
+    ## **Function**
+    ----------
+
+    Sørensen-Dice similarity of the sets of character bigrams of a value and
+    of each candidate. The normalized values contain no whitespace, so this
+    is not a word-level token set ratio: reordered words (e.g.
+    "croatiarepublicof") only score through their shared bigrams, which is
+    still tolerant to word order and to added or dropped words.
+
+    ## **Parameters**
+    ----------
+
+    `value`:
+        The value whose similarity is being calculated.
+
+    `candidates`:
+        The values that are calculated against.
+
+    `return np.ndarray`:
+        Returns the similarity for each candidate.
+    """
+
+    bigrams, counts = _encode_bigrams(tuple(candidates))
+    query = _codes(value)
+    query_bigrams = np.unique((query[:-1] << 21) | query[1:])
+
+    shared = np.zeros(len(bigrams), dtype=int)
+    for bigram in query_bigrams:
+        shared += (bigrams == bigram).any(axis=1)
+
+    total = len(query_bigrams) + counts
+
+    return np.divide(2 * shared, total, out=np.zeros(len(bigrams)),
+                     where=total > 0)
+
+
+@scorers.register("token_set", words=True)
+def token_set_scores(value: str, candidates: Sequence[str]) -> np.ndarray:
+    """
+    ## **Function**
+    ----------
+
+    Token set ratio of a value against all candidates. The sorted words
+    shared by both sides are compared with the shared words followed by the
+    remaining words of either side, and the best Levenshtein ratio of the
+    three pairs counts. Word order and words only one side has (e.g.
+    "Republic of") don't lower the score. The value and the candidates are
+    word forms, the ratios of all pairs are computed at once.
+
+    ## **Parameters**
+    ----------
+
+    `value`:
+        The word form of the value whose ratio is being calculated.
+
+    `candidates`:
+        The word forms of the values that are calculated against.
+
+    `return np.ndarray`:
+        Returns the ratio for each candidate.
+    """
+
+    query = frozenset(value.split())
+
+    shared, left, right = [], [], []
+    for words in _word_sets(tuple(candidates)):
+        common = " ".join(sorted(query & words))
+        shared.append(common)
+        left.append(" ".join(filter(None, [common,
+                                           *sorted(query - words)])))
+        right.append(" ".join(filter(None, [common,
+                                            *sorted(words - query)])))
+
+    return np.maximum.reduce([_pairwise_ratios(shared, left),
+                              _pairwise_ratios(shared, right),
+                              _pairwise_ratios(left, right)])
+
+
+@scorers.register("prefix")
+def prefix_scores(value: str, candidates: Sequence[str]) -> np.ndarray:
+    """
+    ## **Function**
+    ----------
+
+    Prefix-aware similarity, suited for truncated values (e.g. from fixed
+    width extracts). The score is the mean of the shares of the value and of
+    the candidate that are covered by their common prefix, so truncations
+    score high and shorter completions are preferred.
+
+    ## **Parameters**
+    ----------
+
+    `value`:
+        The value whose similarity is being calculated.
+
+    `candidates`:
+        The values that are calculated against.
+
+    `return np.ndarray`:
+        Returns the similarity for each candidate.
+    """
+
+    codes, lengths = _encode(tuple(candidates))
+    query = _codes(value)
+
+    if not len(query):
+        return np.zeros(len(codes))
+
+    prefix = _common_prefix(codes, query, lengths)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = (prefix / len(query) + prefix / lengths) / 2
+
+    return np.where(lengths > 0, scores, 0.0)
+
+
+def _codes(value: str) -> np.ndarray:
+    """
+    Returns the code points of a string.
+    """
+
+    return np.fromiter(map(ord, value), dtype=np.int64, count=len(value))
+
+
+@lru_cache(maxsize=16)
+def _encode(candidates: Tuple[str, ...]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ## **Function**
+    ----------
+
+    Encodes the candidates as a matrix of code points padded with -1. The
+    reference columns are the same on every call, so the result is cached.
+
+    `return tuple[np.ndarray, np.ndarray]`:
+        Returns the code point matrix and the length of each candidate.
+    """
+
+    return _code_matrix(candidates)
+
+
+@lru_cache(maxsize=16)
+def _word_sets(candidates: Tuple[str, ...]) -> Tuple[frozenset, ...]:
+    """
+    Returns the set of words of each candidate.
+    """
+
+    return tuple(frozenset(candidate.split()) for candidate in candidates)
+
+
+def _pairwise_ratios(left: Sequence[str],
+                     right: Sequence[str]) -> np.ndarray:
+    """
+    ## **Function**
+    ----------
+
+    Levenshtein ratio of each pair of strings, with the costs of
+    `levenshtein_scores`. The dynamic programming tables of all pairs are
+    filled at once, the table of a pair stops changing after the last
+    character of its left string.
+
+    `return np.ndarray`:
+        Returns the ratio of each pair, 0.0 for two empty strings.
+    """
+
+    left_codes, left_lengths = _code_matrix(tuple(left))
+    right_codes, right_lengths = _code_matrix(tuple(right))
+    rows = np.arange(len(left_codes))
+
+    previous = np.tile(np.arange(right_codes.shape[1] + 1),
+                       (len(left_codes), 1))
+
+    for i in range(1, left_codes.shape[1] + 1):
+        cost = np.where(right_codes == left_codes[:, i - 1:i], 0, 2)
+        current = np.empty_like(previous)
+        current[:, 0] = i
+
+        for j in range(1, right_codes.shape[1] + 1):
+            current[:, j] = np.minimum(
+                np.minimum(previous[:, j], current[:, j - 1]) + 1,
+                previous[:, j - 1] + cost[:, j - 1])
+
+        previous = np.where((i <= left_lengths)[:, None], current, previous)
+
+    total = left_lengths + right_lengths
+    distance = previous[rows, right_lengths]
+
+    return np.divide(total - distance, total, out=np.zeros(len(rows)),
+                     where=total > 0)
+
+
+def _code_matrix(candidates: Tuple[str, ...]
+                 ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encodes strings as a matrix of code points padded with -1, see
+    `_encode`.
+    """
+
+    lengths = np.fromiter(map(len, candidates), dtype=np.int64,
+                          count=len(candidates))
+    codes = np.full((len(candidates), max(lengths.max(initial=0), 1)), -1,
+                    dtype=np.int64)
+
+    for row, candidate in enumerate(candidates):
+        codes[row, :len(candidate)] = _codes(candidate)
+
+    return codes, lengths
+
+
+@lru_cache(maxsize=16)
+def _encode_bigrams(candidates: Tuple[str, ...]
+                    ) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ## **Function**
+    ----------
+
+    Encodes the character bigrams of the candidates as a padded matrix of
+    integers.
+
+    `return tuple[np.ndarray, np.ndarray]`:
+        Returns the bigram matrix and the number of distinct bigrams of each
+        candidate.
+    """
+
+    codes, lengths = _encode(candidates)
+    bigrams = (codes[:, :-1] << 21) | codes[:, 1:]
+    bigrams[codes[:, 1:] < 0] = -1
+
+    counts = np.fromiter(
+        (len(np.unique(row[row >= 0])) for row in bigrams), dtype=np.int64,
+        count=len(bigrams))
+
+    return bigrams, counts
+
+
+def _common_prefix(codes: np.ndarray, query: np.ndarray,
+                   lengths: np.ndarray, limit: int = None) -> np.ndarray:
+    """
+    Returns the length of the common prefix of the query and each candidate.
+    """
+
+    size = min(len(query), codes.shape[1])
+    if limit is not None:
+        size = min(size, limit)
+
+    equal = codes[:, :size] == query[:size]
+
+    return np.minimum(np.cumprod(equal, axis=1).sum(axis=1), lengths)
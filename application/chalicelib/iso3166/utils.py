@@ -1,18 +1,63 @@
 import os
 import time
+import json
 import random
 import io
+import shutil
+import tempfile
 
 import pandas as pd
 import numpy as np
-from functools import lru_cache
-from typing import Generator, Callable, Dict, Any
+import pyarrow as pa
+import pyarrow.parquet as pq
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from typing import Generator, Callable, Dict, Any, Optional, BinaryIO, \
+    Tuple, Iterable, Iterator
 
 from ..error.exceptions import FileLoadingError, FileSavingError
+from ..iso3166.converter import DEFERRED
 from ..iso3166.dispatcher import DynamicFileMachine
+from ..iso3166.readers import split_extension, open_decompressed, \
+    CHUNKED_FILE_TYPES
 
+# File types whose readers need a seekable buffer
+RANDOM_ACCESS_FILE_TYPES = {".parquet", ".arrow", ".feather"}
 
-def read_s3_data(file_name: str, data: io.BytesIO) -> pd.DataFrame:
+# Partition value used by Hive for missing values
+HIVE_DEFAULT_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+# Name of the partition in the keys of the partitioned outputs, the same for
+# every detected code column so one table covers all the outputs
+PARTITION_NAME = "country_code"
+
+# Writers of the output formats supported by `export_data`
+EXPORT_FORMATS = {
+    "parquet": lambda dataframe, path: dataframe.to_parquet(path),
+    "csv": lambda dataframe, path: dataframe.to_csv(path, index=False)}
+
+# "frame" writes the input with the iso3166 columns, "mapping" only writes
+# the iso3166 fields of each distinct value (see `mapping_table`)
+OUTPUT_MODES = ("frame", "mapping")
+
+# Key of the dataframe attrs in the parquet metadata, as written by pandas
+PANDAS_ATTRS_KEY = b"PANDAS_ATTRS"
+
+# Folder of the reports written by `finalize_report`
+REPORT_PATH = r"application/chalicelib/reports"
+
+# Columns of the report template
+REPORT_COLUMNS = ["file_name", "column_name", "count_missing", "time"]
+
+# Report columns added when only a sample of the values was fuzzy matched
+ESTIMATE_COLUMNS = ["estimated_missing_rate", "missing_rate_low",
+                    "missing_rate_high"]
+
+
+def read_s3_data(file_name: str, data: BinaryIO,
+                 chunksize: Optional[int] = None) -> pd.DataFrame:
     """
         ## **Function**
         ----------
@@ -27,15 +72,32 @@ def read_s3_data(file_name: str, data: io.BytesIO) -> pd.DataFrame:
             Name of the file to determine the file type.
 
         `data`:
-            Byte data that gets loaded into a dataframe object.
+            Byte data that gets loaded into a dataframe object. Compressed
+            files (e.g. `.csv.gz`) can be passed as the raw response stream,
+            they are decompressed while being read.
+
+        `chunksize`:
+            Number of rows per chunk for the file types that can be read in
+            chunks (see `readers.CHUNKED_FILE_TYPES`), None keeps the
+            default of the reader.
 
         `return pd.DataFrame`:
             Returns a pd.DataFrame object that contains data from the s3 file.
         """
     try:
-        _, file_type = os.path.splitext(file_name)
+        file_type, compression = split_extension(file_name)
         read_function = DynamicFileMachine(file_type).dispatcher()
 
+        if chunksize is not None:
+            read_function = partial(read_function, chunksize=chunksize)
+
+        if compression is not None:
+            data = open_decompressed(data, compression)
+
+            # Parquet needs random access to the file footer
+            if file_type in RANDOM_ACCESS_FILE_TYPES:
+                data = io.BytesIO(data.read())
+
         return read_function(data)
 
     except Exception as err:
@@ -72,14 +134,531 @@ def load_to_s3(s3_client: Any, destination: str,
         Returns nothing.
     """
 
-    out_buffer = io.BytesIO()
-    dataframe.to_parquet(out_buffer, index=False)
     s3_client.put_object(Bucket=destination,
                          Key=name,
-                         Body=out_buffer.getvalue())
+                         Body=_parquet_body(dataframe))
+
+
+def load_partitioned_to_s3(s3_client: Any, destination: str,
+                           prefix: str, dataframe: pd.DataFrame,
+                           partition_column: Optional[str] = None,
+                           max_partitions: int = 64,
+                           row_group_size: int = 100_000,
+                           max_workers: int = 8) -> None:
+    """
+    ## **Function**
+    ----------
+
+    The function loads a dataframe into a Hive-partitioned dataset
+    (`{prefix}/country_code=XX/part-0.parquet`) so that query engines
+    can prune whole partitions when filtering on the country code. If the
+    number of partitions exceeds `max_partitions`, a single file sorted by
+    the partition column (`{prefix}/part-0.parquet`) is written instead,
+    which still allows row-group pruning through the column statistics
+    without hundreds of tiny objects. Objects left under the prefix by a
+    previous run (e.g. in the other layout) are deleted after the upload.
+
+    ## **Parameters**
+    ----------
+
+    `s3_client`:
+        Boto3 s3 client that is passed in the object handle function.
+
+    `destination`:
+        Name of the destination bucket.
+
+    `prefix`:
+        Key prefix under which the partitions are written.
+
+    `dataframe`:
+        Dataframe with the prepared data that gets loaded into the files.
+
+    `partition_column`:
+        Column used for the partitioning. Defaults to the generated
+        country code column.
+
+    `max_partitions`:
+        Maximum number of partition objects written for one dataframe.
+
+    `row_group_size`:
+        Maximum number of rows in a single parquet row group.
+
+    `max_workers`:
+        Number of uploads that are sent to the bucket concurrently.
+
+    `return None`:
+        Returns nothing.
+    """
+
+    if partition_column is None:
+        partition_column = find_code_column(dataframe)
+
+    partition_values = hive_partition_values(dataframe[partition_column])
+
+    if partition_values.nunique() > max_partitions:
+        key = f"{prefix}/part-0.parquet"
+        sorted_df = dataframe.iloc[np.argsort(partition_values.to_numpy(),
+                                              kind="stable")]
+        s3_client.put_object(Bucket=destination,
+                             Key=key,
+                             Body=_parquet_body(sorted_df,
+                                                row_group_size=row_group_size,
+                                                write_statistics=True))
+        delete_stale_objects(s3_client, destination, prefix, {key})
+        return
+
+    def _upload(item):
+        value, partition = item
+        key = partition_key(prefix, value)
+        s3_client.put_object(
+            Bucket=destination,
+            Key=key,
+            Body=_parquet_body(partition.drop(columns=partition_column),
+                               row_group_size=row_group_size,
+                               write_statistics=True))
+        return key
+
+    # Uploads are issued in batches so the request latency overlaps
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        written = set(executor.map(_upload, dataframe.groupby(
+            partition_values, sort=False)))
+
+    delete_stale_objects(s3_client, destination, prefix, written)
+
+
+def partition_key(prefix: str, value: str) -> str:
+    """
+    Returns the key of a partition file. The partition is always named
+    `country_code`, whichever code column was detected in the data.
+    """
 
+    return f"{prefix}/{PARTITION_NAME}={value}/part-0.parquet"
 
-def read_data(path: str) -> Generator:
+
+def hive_partition_values(column: pd.Series) -> pd.Series:
+    """
+    Replaces the missing codes with the default partition of Hive. Rows
+    whose fuzzy match is deferred keep their `Deferred` code and are written
+    to the `country_code=Deferred` partition, so readers can skip them or
+    patch them with the corrections of `resolve_deferred`.
+    """
+
+    return column.replace({"None": HIVE_DEFAULT_PARTITION,
+                           "nan": HIVE_DEFAULT_PARTITION}
+                          ).fillna(HIVE_DEFAULT_PARTITION)
+
+
+def delete_stale_objects(s3_client: Any, destination: str, prefix: str,
+                         written: Iterable[str]) -> None:
+    """
+    ## **Function**
+    ----------
+
+    Deletes the objects under a prefix that were not written by the current
+    run, e.g. the partitions of codes that no longer occur or the files of
+    the other partitioned layout.
+
+    ## **Parameters**
+    ----------
+
+    `s3_client`:
+        Boto3 s3 client that is passed in the object handle function.
+
+    `destination`:
+        Name of the destination bucket.
+
+    `prefix`:
+        Key prefix of the dataset.
+
+    `written`:
+        The keys written by the current run.
+
+    `return None`:
+        Returns nothing.
+    """
+
+    written = set(written)
+    paginator = s3_client.get_paginator("list_objects_v2")
+
+    for page in paginator.paginate(Bucket=destination, Prefix=f"{prefix}/"):
+        stale = [{"Key": item["Key"]} for item in page.get("Contents", [])
+                 if item["Key"] not in written]
+
+        # A page holds at most 1000 keys, the limit of delete_objects
+        if stale:
+            s3_client.delete_objects(Bucket=destination,
+                                     Delete={"Objects": stale})
+
+
+def _parquet_body(dataframe: pd.DataFrame, **kwargs) -> io.BytesIO:
+    """
+    Encodes a dataframe as parquet into a buffer that is handed to
+    put_object as it is, instead of copying it out with getvalue().
+    """
+
+    out_buffer = io.BytesIO()
+    dataframe.to_parquet(out_buffer, index=False, **kwargs)
+    out_buffer.seek(0)
+
+    return out_buffer
+
+
+class ParquetSpool(object):
+
+    """
+    Class writes the converted chunks of a file to temporary parquet files
+    as soon as they are converted, so a file read in chunks is never
+    concatenated in memory. With `partitioned` the rows are spooled per
+    Hive partition value of the country code, and uploaded as a partitioned
+    dataset by `upload_partitioned`. When the type of a column changes
+    between chunks (e.g. a number column with "N.A." in a later chunk) the
+    column is promoted, to float for mixed numbers and to string otherwise,
+    and the chunks written before are cast when the spool is copied.
+    Categorical columns are written as their values and columns that stay
+    empty as strings, like the concatenated frame.
+    """
+
+    def __init__(self, partitioned: bool = False,
+                 partition_column: Optional[str] = None,
+                 spool_factory: Callable[[], BinaryIO] =
+                 tempfile.TemporaryFile):
+        self.partitioned = partitioned
+        self.partition_column = partition_column
+        self.spool_factory = spool_factory
+        self.schema = None
+        self.rows = 0
+        self._spools = {}
+        self._writers = {}
+        self._outputs = []
+
+    def add(self, df: pd.DataFrame) -> None:
+        """
+        ## **Function**
+        ----------
+
+        Writes a converted chunk to the spool. The chunks need to be added
+        in the order of the file.
+
+        ## **Parameters**
+        ----------
+
+        `df`:
+            A converted chunk.
+
+        `return None`:
+            Returns nothing.
+        """
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        schema = pa.schema([pa.field(field.name, _spooled_type(field.type))
+                            for field in table.schema],
+                           metadata=table.schema.metadata)
+
+        if self.schema is None:
+            self.schema = schema
+
+        elif not schema.equals(self.schema):
+            promoted = _promote_schema(self.schema, schema)
+
+            # The following chunks go to new files with the promoted schema
+            if not promoted.equals(self.schema):
+                self._finish()
+                self.schema = promoted
+
+        try:
+            table = table.cast(self.schema)
+
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            raise FileSavingError(message="The column types of the chunks "
+                                          f"differ: {e}")
+
+        self.rows += len(df)
+
+        if not self.partitioned:
+            self._write(None, table)
+            return
+
+        if self.partition_column is None:
+            self.partition_column = find_code_column(df)
+
+        values = hive_partition_values(df[self.partition_column])
+        for value, positions in values.groupby(
+                values, sort=False).indices.items():
+            self._write(value, table.take(positions))
+
+    def _write(self, key: Optional[str], table: pa.Table) -> None:
+        """
+        Appends a table to the spooled file of a partition, a partition has
+        one file per schema.
+        """
+
+        if key not in self._writers:
+            spool = self.spool_factory()
+            self._spools.setdefault(key, []).append(spool)
+            self._writers[key] = pq.ParquetWriter(spool, self.schema)
+
+        self._writers[key].write_table(table)
+
+    def _finish(self) -> None:
+        """
+        Finishes the parquet files of the spool.
+        """
+
+        for writer in self._writers.values():
+            writer.close()
+
+        self._writers = {}
+
+    def close(self, attrs: Optional[dict] = None,
+              row_group_size: Optional[int] = None) -> BinaryIO:
+        """
+        ## **Function**
+        ----------
+
+        Finishes the spool and combines it into one parquet file, sorted by
+        the partition value if the spool is partitioned. The attrs are only
+        known once all chunks are converted, so the spooled row groups are
+        copied into a file with the attrs in its footer.
+
+        ## **Parameters**
+        ----------
+
+        `attrs`:
+            The dataframe attrs written to the file.
+
+        `row_group_size`:
+            Maximum number of rows in a single parquet row group, None keeps
+            the row groups of the chunks.
+
+        `return BinaryIO`:
+            Returns the parquet file, rewound to the start for the upload.
+        """
+
+        self._finish()
+
+        if self.schema is None:
+            raise FileSavingError(message="No data spooled for the output")
+
+        return self._copy(sorted(self._spools, key=str), attrs,
+                          row_group_size=row_group_size)
+
+    def upload_partitioned(self, s3_client: Any, destination: str,
+                           prefix: str, attrs: Optional[dict] = None,
+                           max_partitions: int = 64,
+                           row_group_size: int = 100_000,
+                           max_workers: int = 8) -> None:
+        """
+        ## **Function**
+        ----------
+
+        Uploads the spool as a Hive-partitioned dataset, with the layout of
+        `load_partitioned_to_s3`. Every partition is copied from its spooled
+        file, without the partition column, one row group at a time.
+
+        ## **Parameters**
+        ----------
+
+        `s3_client`:
+            Boto3 s3 client that is passed in the object handle function.
+
+        `destination`:
+            Name of the destination bucket.
+
+        `prefix`:
+            Key prefix under which the partitions are written.
+
+        `attrs`:
+            The dataframe attrs written to every file.
+
+        `max_partitions`:
+            Maximum number of partition objects written for one file.
+
+        `row_group_size`:
+            Maximum number of rows in a single parquet row group.
+
+        `max_workers`:
+            Number of uploads that are sent to the bucket concurrently.
+
+        `return None`:
+            Returns nothing.
+        """
+
+        if len(self._spools) > max_partitions:
+            key = f"{prefix}/part-0.parquet"
+            s3_client.put_object(Bucket=destination, Key=key,
+                                 Body=self.close(attrs, row_group_size))
+            delete_stale_objects(s3_client, destination, prefix, {key})
+            return
+
+        self._finish()
+
+        def _upload(value):
+            key = partition_key(prefix, value)
+            s3_client.put_object(Bucket=destination, Key=key,
+                                 Body=self._copy(
+                                     [value], attrs,
+                                     drop=self.partition_column,
+                                     row_group_size=row_group_size))
+            return key
+
+        # Uploads are issued in batches so the request latency overlaps
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            written = set(executor.map(_upload, list(self._spools)))
+
+        delete_stale_objects(s3_client, destination, prefix, written)
+
+    def _copy(self, keys: Iterable[Optional[str]], attrs: Optional[dict],
+              drop: Optional[str] = None,
+              row_group_size: Optional[int] = None) -> BinaryIO:
+        """
+        Copies spooled files into a new parquet file with the attrs. Batches
+        are cast to the final schema and buffered up to `row_group_size`
+        rows, so the small row groups of a partition are merged without
+        reading the whole partition.
+        """
+
+        schema = pa.schema([pa.field(field.name, _final_type(field.type))
+                            for field in self.schema],
+                           metadata=self.schema.metadata)
+        cast_schema = schema
+        if drop is not None:
+            schema = schema.remove(schema.get_field_index(drop))
+
+        metadata = dict(schema.metadata or {})
+        if attrs:
+            metadata[PANDAS_ATTRS_KEY] = json.dumps(attrs)
+
+        output = self.spool_factory()
+        self._outputs.append(output)
+        writer = pq.ParquetWriter(output, schema.with_metadata(metadata),
+                                  write_statistics=True)
+
+        tables, rows = [], 0
+        for spool in (spool for key in keys for spool in self._spools[key]):
+            spool.seek(0)
+
+            for batch in pq.ParquetFile(spool).iter_batches(
+                    batch_size=row_group_size or 65_536):
+                table = pa.Table.from_batches([batch]).cast(cast_schema)
+                if drop is not None:
+                    table = table.drop_columns([drop])
+
+                if row_group_size is None:
+                    writer.write_table(table)
+                    continue
+
+                tables.append(table)
+                rows += table.num_rows
+                if rows >= row_group_size:
+                    writer.write_table(pa.concat_tables(tables),
+                                       row_group_size=row_group_size)
+                    tables, rows = [], 0
+
+        if tables:
+            writer.write_table(pa.concat_tables(tables),
+                               row_group_size=row_group_size)
+
+        writer.close()
+        output.seek(0)
+
+        return output
+
+    def discard(self) -> None:
+        """
+        ## **Function**
+        ----------
+
+        Closes the spooled and combined files, e.g. after the upload or a
+        failed conversion.
+
+        `return None`:
+            Returns nothing.
+        """
+
+        self._finish()
+
+        for spool in [spool for spools in self._spools.values()
+                      for spool in spools] + self._outputs:
+            spool.close()
+
+        self._spools, self._outputs = {}, []
+
+
+def _spooled_type(data_type: pa.DataType) -> pa.DataType:
+    """
+    Returns the type a column of a chunk is spooled as.
+    """
+
+    if pa.types.is_dictionary(data_type):
+        return data_type.value_type
+
+    return data_type
+
+
+def _final_type(data_type: pa.DataType) -> pa.DataType:
+    """
+    Returns the type a spooled column is written as, empty columns are
+    written as strings.
+    """
+
+    return pa.string() if pa.types.is_null(data_type) else data_type
+
+
+def _promote_schema(schema: pa.Schema, other: pa.Schema) -> pa.Schema:
+    """
+    Promotes the types of the columns that differ between two chunks. Empty
+    columns take the type of the other chunk, mixed numbers become floats
+    and any other conflict becomes a string column.
+    """
+
+    if schema.names != other.names:
+        raise FileSavingError(message="The columns of the chunks differ: "
+                                      f"{schema.names} and {other.names}")
+
+    fields = []
+    for field, other_field in zip(schema, other):
+        data_type, other_type = field.type, other_field.type
+
+        if data_type.equals(other_type) or pa.types.is_null(other_type):
+            fields.append(field)
+        elif pa.types.is_null(data_type):
+            fields.append(other_field)
+        elif all(pa.types.is_integer(t) or pa.types.is_floating(t)
+                 for t in (data_type, other_type)):
+            fields.append(pa.field(field.name, pa.float64()))
+        else:
+            fields.append(pa.field(field.name, pa.string()))
+
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+def find_code_column(dataframe: pd.DataFrame) -> str:
+    """
+    ## **Function**
+    ----------
+
+    Finds the generated country code column among the last two columns
+    appended by the converter.
+
+    ## **Parameters**
+    ----------
+
+    `dataframe`:
+        Dataframe returned by the converter.
+
+    `return str`:
+        Returns the name of the country code column.
+    """
+
+    for col in dataframe.columns[-2:]:
+        if "code" in col:
+            return col
+
+    raise FileSavingError(message="No country code column found for "
+                                  "partitioning")
+
+
+def read_data(path: str, chunksize: Optional[int] = None) -> Generator:
     """
     ## **Function**
     ----------
@@ -93,6 +672,10 @@ def read_data(path: str) -> Generator:
     `path`:
         The path of the file or folder that needs to be standardized.
 
+    `chunksize`:
+        Number of rows per chunk for the file types that can be read in
+        chunks, None keeps the default of the reader.
+
     `return Generator`:
         Returns a generator function that loads the data.
     """
@@ -110,29 +693,94 @@ def read_data(path: str) -> Generator:
             for i, file in enumerate(os.listdir(path)):
 
                 file_path = os.path.join(path, file)
-                _, file_type = os.path.splitext(file_path)
-
-                if not file_type:
-                    raise FileLoadingError(err="No file type found")
 
                 # Finds the function that is used to read each file
-                read_function = DynamicFileMachine(file_type).dispatcher()
-
-                all_read_functions[file_path] = read_function
+                all_read_functions[file_path] = _find_read_function(
+                    file_path, chunksize)
 
             return _read_data(path, all_read_functions)
 
         # If a file path is given, only finds the function for that one file
-        _, file_type = os.path.splitext(path)
-        read_function = DynamicFileMachine(file_type).dispatcher()
-
-        return _read_data(path, {path: read_function})
+        return _read_data(path, {path: _find_read_function(path,
+                                                           chunksize)})
 
     except Exception as err:
         raise FileLoadingError(err,
                                message=f"Error loading following file: {path}")
 
 
+def _find_read_function(file_path: str,
+                        chunksize: Optional[int] = None) -> Callable:
+    """
+    ## **Function**
+    ----------
+
+    Finds the read function for a local file based on its extension.
+    Compressed files are opened and decompressed while being read.
+
+    ## **Parameters**
+    ----------
+
+    `file_path`:
+        The path of the file.
+
+    `chunksize`:
+        Number of rows per chunk, ignored for file types that cannot be
+        read in chunks.
+
+    `return Callable`:
+        Returns a function that takes the file path and reads the data.
+    """
+
+    file_type, compression = split_extension(file_path)
+
+    if not file_type:
+        raise FileLoadingError(err="No file type found")
+
+    read_function = DynamicFileMachine(file_type).dispatcher()
+
+    if chunksize is not None and file_type in CHUNKED_FILE_TYPES:
+        read_function = partial(read_function, chunksize=chunksize)
+
+    if compression is None:
+        return read_function
+
+    def read_compressed(local_path: str):
+        handle = open(local_path, "rb")
+
+        try:
+            stream = open_decompressed(handle, compression)
+
+            if file_type in RANDOM_ACCESS_FILE_TYPES:
+                stream = io.BytesIO(stream.read())
+
+            data = read_function(stream)
+
+        except BaseException:
+            handle.close()
+            raise
+
+        if isinstance(data, pd.DataFrame):
+            handle.close()
+            return data
+
+        # The chunks are decompressed while they are iterated
+        return _closing_chunks(data, handle)
+
+    return read_compressed
+
+
+def _closing_chunks(chunks: Iterable[pd.DataFrame],
+                    handle: BinaryIO) -> Iterator[pd.DataFrame]:
+    """
+    Yields the chunks of a reader and closes the file once the iteration is
+    finished or abandoned.
+    """
+
+    with handle:
+        yield from chunks
+
+
 def _read_data(path: str,
                format_function: Dict[str, Callable]
                ) -> Generator:
@@ -226,15 +874,17 @@ def calculate_levenshtein_ratio(base_str: str, target_str: str) -> float:
             - zero_matrix[row][col]) / (len(base_str) + len(target_str))
 
 
-def export_to_parquet(path: str, dataframe: pd.DataFrame) -> None:
+def export_to_parquet(path: str, dataframe: pd.DataFrame,
+                      name: Optional[str] = None) -> str:
     """
     ## **Function**
     ----------
 
 
     Function writes out a pandas dataframe to parquet format based on the path
-    given. If it is a folder, the function creates a new name for the file.
-    Otherwise, the file path is used to generate the name.
+    given. If it is a folder, the function uses the given name or creates a
+    new name for the file. Otherwise, the file path is used to generate the
+    name.
 
     ## **Parameters**
     ----------
@@ -246,23 +896,330 @@ def export_to_parquet(path: str, dataframe: pd.DataFrame) -> None:
     `dataframe`:
         Cleaned dataframe that will be writen in file.
 
-    `return None`:
-        Returns nothing
+    `name`:
+        File name used inside a folder. A deterministic name makes reruns
+        overwrite the previous output instead of creating duplicates.
+
+    `return str`:
+        Returns the path of the written file.
     """
 
-    # Create current timestamp and name
-    time_string = time.strftime("%Y%m%d-%H%M%S")
-    new_name = "file_export"
-    random_id = random.randint(1000, 9999)
+    return export_data(path, dataframe, name=name, output_format="parquet")
+
+
+def export_data(path: str, dataframe: pd.DataFrame,
+                name: Optional[str] = None,
+                output_format: str = "parquet") -> str:
+    """
+    ## **Function**
+    ----------
+
+    Same as `export_to_parquet` for any of the `EXPORT_FORMATS`.
+
+    ## **Parameters**
+    ----------
+
+    `path`:
+        Path that is used to create the file. It can be either a folder or
+        file path.
+
+    `dataframe`:
+        Cleaned dataframe that will be writen in file.
+
+    `name`:
+        File name used inside a folder, missing subfolders of the name are
+        created.
+
+    `output_format`:
+        The format of the written file, "parquet" or "csv".
+
+    `return str`:
+        Returns the path of the written file.
+    """
+
+    full_path = _export_path(path, name, output_format)
+    EXPORT_FORMATS[output_format](dataframe, full_path)
+
+    return full_path
+
+
+def export_spooled(path: str, spooled: BinaryIO,
+                   name: Optional[str] = None,
+                   output_format: str = "parquet") -> str:
+    """
+    ## **Function**
+    ----------
+
+    Same as `export_data` for the parquet file of a `ParquetSpool` or a
+    `MappingSpool`. The file is copied, or converted one row group at a time
+    for csv, so the data is never loaded at once.
+
+    ## **Parameters**
+    ----------
+
+    `path`:
+        Path that is used to create the file. It can be either a folder or
+        file path.
+
+    `spooled`:
+        The parquet file returned by the spool.
+
+    `name`:
+        File name used inside a folder, missing subfolders of the name are
+        created.
+
+    `output_format`:
+        The format of the written file, "parquet" or "csv".
+
+    `return str`:
+        Returns the path of the written file.
+    """
+
+    full_path = _export_path(path, name, output_format)
+    spooled.seek(0)
+
+    if output_format == "parquet":
+        with open(full_path, "wb") as out:
+            shutil.copyfileobj(spooled, out)
+
+        return full_path
+
+    with open(full_path, "w", newline="") as out:
+        for i, batch in enumerate(pq.ParquetFile(spooled).iter_batches()):
+            batch.to_pandas().to_csv(out, index=False, header=i == 0)
+
+    return full_path
+
+
+def _export_path(path: str, name: Optional[str],
+                 output_format: str) -> str:
+    """
+    Returns the path of an exported file, see `export_data`.
+    """
+
+    if output_format not in EXPORT_FORMATS:
+        raise FileSavingError(message=f"Unknown output format: "
+                                      f"{output_format}")
 
     # Check if folder
     if os.path.isdir(path):
-        full_path = os.path.join(path, f"{new_name}-{time_string}-{random_id}")
+        if name is None:
+            # Create current timestamp and name
+            time_string = time.strftime("%Y%m%d-%H%M%S")
+            random_id = random.randint(1000, 9999)
+            name = f"file_export-{time_string}-{random_id}"
 
-        dataframe.to_parquet(full_path)
+        full_path = os.path.join(path, name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
 
-    else:
-        dataframe.to_parquet(path)
+        return full_path
+
+    return path
+
+
+def mapping_table(dataframe: pd.DataFrame,
+                  row_index: bool = False
+                  ) -> Tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+    """
+    ## **Function**
+    ----------
+
+    Reduces a converted dataframe to a mapping table with one row per
+    distinct combination of the detected input columns and the iso3166
+    columns it was converted to. The other input columns aren't copied, so
+    the output of wide files shrinks to the size of the distinct values. The
+    table keeps the attrs of the dataframe and can be restandardized.
+
+    ## **Parameters**
+    ----------
+
+    `dataframe`:
+        A converted dataframe with the detection in `attrs["detection"]`.
+
+    `row_index`:
+        Boolean value that determines if the row index is returned as well.
+
+    `return tuple[pd.DataFrame, pd.DataFrame | None]`:
+        Returns the mapping table and, if requested, the position of each
+        input row in the mapping table (column "mapping_row").
+    """
+
+    detection = dataframe.attrs["detection"]
+    outputs = list(dataframe.columns[-2:])
+
+    # The code column can be one of the dropped output columns
+    keys = [column for column in dict.fromkeys((detection["name_column"],
+                                                detection["code_column"]))
+            if column is not None and column in dataframe.columns[:-2]]
+
+    # Groups are numbered in the order of their first row, so the first row
+    # of each group is the row of the group in the table
+    groups = dataframe.groupby(keys, sort=False, dropna=False).ngroup()
+    _, first = np.unique(groups.to_numpy(), return_index=True)
+
+    table = dataframe[keys + outputs].iloc[first].reset_index(drop=True)
+
+    if not row_index:
+        return table, None
+
+    return table, pd.DataFrame({"mapping_row": groups.to_numpy(
+        dtype=np.int32)})
+
+
+class MappingSpool(object):
+
+    """
+    Class builds the mapping table (see `mapping_table`) of a file read in
+    chunks. Only the distinct values are kept in memory, the row index is
+    spooled with a `ParquetSpool` as it is computed.
+    """
+
+    def __init__(self, row_index: bool = False,
+                 spool_factory: Callable[[], BinaryIO] =
+                 tempfile.TemporaryFile):
+        self.table = None
+        self.rows = ParquetSpool(spool_factory=spool_factory) \
+            if row_index else None
+
+    def add(self, df: pd.DataFrame) -> None:
+        """
+        ## **Function**
+        ----------
+
+        Adds the distinct values of a converted chunk to the table. The
+        chunks need to be added in the order of the file.
+
+        ## **Parameters**
+        ----------
+
+        `df`:
+            A converted chunk with the detection in `df.attrs["detection"]`.
+
+        `return None`:
+            Returns nothing.
+        """
+
+        table, rows = mapping_table(df, self.rows is not None)
+
+        # Values of the earlier chunks keep their row, new ones are appended
+        if self.table is not None:
+            table = pd.concat([self.table, table], ignore_index=True)
+
+        keys = list(table.columns[:-2])
+        groups = table.groupby(keys, sort=False, dropna=False).ngroup()
+        _, first = np.unique(groups.to_numpy(), return_index=True)
+        known = 0 if self.table is None else len(self.table)
+
+        if self.rows is not None:
+            chunk_groups = groups.to_numpy(dtype=np.int32)[known:]
+            self.rows.add(pd.DataFrame({"mapping_row": chunk_groups[
+                rows["mapping_row"].to_numpy()]}))
+
+        self.table = table.iloc[first].reset_index(drop=True)
+
+    def close(self, attrs: Optional[dict] = None
+              ) -> Tuple[pd.DataFrame, Optional[BinaryIO]]:
+        """
+        ## **Function**
+        ----------
+
+        Finishes the mapping table.
+
+        ## **Parameters**
+        ----------
+
+        `attrs`:
+            The dataframe attrs of the converted file.
+
+        `return tuple[pd.DataFrame, BinaryIO | None]`:
+            Returns the mapping table and, if requested, the parquet file of
+            the row index.
+        """
+
+        if self.table is None:
+            raise FileSavingError(message="No data spooled for the output")
+
+        if attrs is not None:
+            self.table.attrs = attrs
+
+        if self.rows is None:
+            return self.table, None
+
+        return self.table, self.rows.close()
+
+    def discard(self) -> None:
+        """
+        ## **Function**
+        ----------
+
+        Closes the spooled row index.
+
+        `return None`:
+            Returns nothing.
+        """
+
+        if self.rows is not None:
+            self.rows.discard()
+
+
+class StageTimer(object):
+
+    """
+    Class accumulates the wall-clock time spent in each processing stage
+    (read, convert, report, write) over many files, for the --profile
+    option of the command line interface. Stages can be nested, the time of
+    an inner stage is not counted for the outer one.
+    """
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self._nested: list = []
+
+    @contextmanager
+    def stage(self, name: str):
+        start_time = time.perf_counter()
+        self._nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self.add(name, elapsed - self._nested.pop())
+
+            if self._nested:
+                self._nested[-1] += elapsed
+
+    def add(self, name: str, seconds: float) -> None:
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def merge(self, timings: Dict[str, float]) -> None:
+        for name, seconds in timings.items():
+            self.add(name, seconds)
+
+    def timed_iter(self, name: str, iterable: Iterable) -> Iterator:
+        """
+        ## **Function**
+        ----------
+
+        Wraps an iterable so the time spent producing each item is counted
+        as its own stage, e.g. the reading of chunks that are converted
+        while the file is read.
+        """
+
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def summary(self) -> str:
+        total = sum(self.timings.values()) or 1.0
+
+        return "\n".join(f"{name:<10}{seconds:>10.2f}s "
+                         f"{seconds / total:>7.1%}"
+                         for name, seconds in self.timings.items())
 
 
 def timeit(func):
@@ -290,8 +1247,7 @@ def generate_report_template() -> pd.DataFrame:
         Returns empty dataframe
     """
 
-    report_template = pd.DataFrame({"file_name": [], "column_name": [],
-                                    "count_missing": [], "time": []})
+    report_template = pd.DataFrame({column: [] for column in REPORT_COLUMNS})
 
     return report_template
 
@@ -327,39 +1283,304 @@ def update_reporting(df: pd.DataFrame,
         summary.
 
     `return` pd.DataFrame:
-        Returns DataFrame containing the report.
+        Returns DataFrame containing the report. When the dataframe was
+        converted with a fuzzy matching sample, the summary also contains
+        the estimated missing rate with a 95% confidence interval.
+    """
+    counts = ReportCounts(detailed)
+    counts.add(df)
+
+    return counts.report(report_template, file_name,
+                         df.attrs.get("fuzzy_sample"))
+
+
+class ReportCounts(object):
+
+    """
+    Class counts the missing values of the output columns chunk by chunk, so
+    the report of a file read in chunks doesn't need the converted chunks.
+    With `detailed` the unmatched rows are kept for the detailed report.
+    """
+
+    def __init__(self, detailed: bool = False):
+        self.detailed = detailed
+        self.rows = 0
+        self.missing = {}
+        self.deferred = Counter()
+        self._unmatched = []
+
+    def add(self, df: pd.DataFrame) -> None:
+        """
+        ## **Function**
+        ----------
+
+        Adds the counts of a converted chunk. The chunks need to be added in
+        the order of the file.
+
+        ## **Parameters**
+        ----------
+
+        `df`:
+            A converted chunk.
+
+        `return None`:
+            Returns nothing.
+        """
+
+        # Get last two columns
+        column_list = df.columns[-2:]
+        df = df[column_list]
+
+        # Count missing values and get all None rows
+        missing = ((df[column_list[0]] == "None")
+                   | (df[column_list[1]] == "None")).to_numpy()
+        none_df = df[missing]
+
+        for name, count in none_df.count().items():
+            self.missing[name] = self.missing.get(name, 0) + int(count)
+            self.deferred[name] += int((df[name] == DEFERRED).sum())
+
+        if self.detailed:
+            none_df.index = self.rows + np.flatnonzero(missing)
+            self._unmatched.append(none_df)
+
+        self.rows += len(df)
+
+    def report(self, report_template: pd.DataFrame, file_name: str,
+               sample_stats: Optional[Dict[str, int]] = None
+               ) -> pd.DataFrame:
+        """
+        ## **Function**
+        ----------
+
+        Populates the reporting template with the counts, see
+        `update_reporting`.
+
+        ## **Parameters**
+        ----------
+
+        `report_template`:
+            The report the file is added to.
+
+        `file_name`:
+            Name of the file from which the data is coming from.
+
+        `sample_stats`:
+            The merged fuzzy matching sample of the file, if only a sample
+            of the values was fuzzy matched.
+
+        `return pd.DataFrame`:
+            Returns DataFrame containing the report, or the unmatched rows
+            if the counts are detailed.
+        """
+
+        if self.detailed:
+            return pd.concat(self._unmatched)
+
+        if sample_stats is not None:
+            report_template = report_template.reindex(
+                columns=report_template.columns.union(ESTIMATE_COLUMNS,
+                                                      sort=False))
+
+        # Add new row to summarization
+        for name, data in self.missing.items():
+            row = {"file_name": file_name,
+                   "column_name": name,
+                   "count_missing": data,
+                   "time": time.strftime("%Y-%m-%d-%H-%M-%S")}
+
+            if sample_stats is not None:
+                row.update(_extrapolate_missing_rate(
+                    self.rows, self.deferred[name], data, sample_stats))
+
+            report_template.loc[-1] = row
+
+            report_template.index = report_template.index + 1
+            report_template = report_template.sort_index()
+
+        return report_template.dropna(axis=0, subset=REPORT_COLUMNS)
+
+
+class DetailedReportWriter(object):
+
+    """
+    Class writes the detailed error report incrementally while the chunks
+    of a file are converted. Instead of whole rows, only the row offset and
+    the raw value of each unmatched row are kept and written as parquet row
+    groups to the sink (e.g. a temporary file). With `aggregate` the report
+    contains each distinct unmatched value with its count instead.
+    """
+
+    ROW_SCHEMA = pa.schema([("row", pa.int64()), ("value", pa.string())])
+    VALUE_SCHEMA = pa.schema([("value", pa.string()), ("count", pa.int64())])
+
+    def __init__(self, sink: BinaryIO, aggregate: bool = False):
+        self.sink = sink
+        self.aggregate = aggregate
+        self.offset = 0
+        self._counts = Counter()
+        self._writer = None
+
+    def add(self, df: pd.DataFrame) -> None:
+        """
+        ## **Function**
+        ----------
+
+        Adds the unmatched rows of a converted chunk to the report. The
+        chunks need to be added in the order of the file.
+
+        ## **Parameters**
+        ----------
+
+        `df`:
+            A converted chunk with the detection in `df.attrs["detection"]`.
+
+        `return None`:
+            Returns nothing.
+        """
+
+        column_list = df.columns[-2:]
+        missing = ((df[column_list[0]] == "None")
+                   | (df[column_list[1]] == "None")).to_numpy()
+
+        detection = df.attrs["detection"]
+        raw = df.loc[missing, detection["name_column"]
+                     or detection["code_column"]]
+        raw = raw.astype(str).where(raw.notna(), None)
+
+        if self.aggregate:
+            self._counts.update(raw.tolist())
+
+        else:
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.sink, self.ROW_SCHEMA)
+
+            self._writer.write_table(pa.table(
+                {"row": self.offset + np.flatnonzero(missing),
+                 "value": pa.array(raw.tolist(), pa.string())},
+                schema=self.ROW_SCHEMA))
+
+        self.offset += len(df)
+
+    def close(self) -> BinaryIO:
+        """
+        ## **Function**
+        ----------
+
+        Finishes the parquet file of the report.
+
+        `return BinaryIO`:
+            Returns the sink, rewound to the start for the upload.
+        """
+
+        if self.aggregate:
+            values, counts = (zip(*self._counts.most_common())
+                              if self._counts else ((), ()))
+            pq.write_table(pa.table({"value": pa.array(values, pa.string()),
+                                     "count": pa.array(counts, pa.int64())},
+                                    schema=self.VALUE_SCHEMA), self.sink)
+
+        elif self._writer is None:
+            pq.write_table(self.ROW_SCHEMA.empty_table(), self.sink)
+
+        else:
+            self._writer.close()
+
+        self.sink.seek(0)
+
+        return self.sink
+
+
+def estimate_missing_rate(column: pd.Series, count_missing: int,
+                          sample_stats: Dict[str, int]) -> Dict[str, float]:
     """
-    # Get last two columns
-    column_list = df.columns[-2:]
+    ## **Function**
+    ----------
 
-    # Slice dataframe with last two columns
-    df = df[column_list]
+    Extrapolates the missing rate of a column whose deferred values were
+    not fuzzy matched. The unmatched share of the fuzzy matching sample is
+    applied to the deferred rows.
 
-    # Count missing values and get all None rows
-    none_df = df[
-        (df[column_list[0]] == "None") | (df[column_list[1]] == "None")
-        ]
+    ## **Parameters**
+    ----------
 
-    if detailed:
-        return none_df
+    `column`:
+        The converted output column.
 
-    summarization_df = none_df.count()
+    `count_missing`:
+        The number of rows that are known to be missing.
 
-    # Add new row to summarization
-    for name, data in summarization_df.items():
-        report_template.loc[-1] = {
-            "file_name": file_name,
-            "column_name": name,
-            "count_missing": data,
-            "time": time.strftime("%Y-%m-%d-%H-%M-%S")}
+    `sample_stats`:
+        The number of sampled and unmatched values, as kept in
+        `df.attrs["fuzzy_sample"]`.
 
-        report_template.index = report_template.index + 1
-        report_template = report_template.sort_index()
+    `return dict[str, float]`:
+        Returns the estimated missing rate and its confidence interval.
+    """
+
+    return _extrapolate_missing_rate(len(column),
+                                     int((column == DEFERRED).sum()),
+                                     count_missing, sample_stats)
+
+
+def _extrapolate_missing_rate(rows: int, deferred: int, count_missing: int,
+                              sample_stats: Dict[str, int]
+                              ) -> Dict[str, float]:
+    """
+    Extrapolates the missing rate from the counts of a column, see
+    `estimate_missing_rate`.
+    """
+
+    if not rows:
+        return dict.fromkeys(ESTIMATE_COLUMNS, 0.0)
+
+    sampled, unmatched = sample_stats["sampled"], sample_stats["unmatched"]
+
+    share = unmatched / sampled if sampled else 0.0
+    low, high = wilson_interval(unmatched, sampled)
+
+    return {name: (count_missing + rate * deferred) / rows
+            for name, rate in zip(ESTIMATE_COLUMNS, (share, low, high))}
+
+
+def wilson_interval(successes: int, trials: int,
+                    z: float = 1.96) -> Tuple[float, float]:
+    """
+    ## **Function**
+    ----------
 
-    return report_template.dropna(axis=0)
+    Wilson score interval of a proportion, which stays within [0, 1] and
+    behaves well for small samples and proportions close to 0 or 1.
 
+    ## **Parameters**
+    ----------
+
+    `successes`:
+        The number of successes.
+
+    `trials`:
+        The number of trials.
 
-def finalize_report(df: pd.DataFrame):
+    `z`:
+        The quantile of the normal distribution, 1.96 for 95% confidence.
+
+    `return tuple[float, float]`:
+        Returns the lower and upper bound of the interval.
+    """
+
+    if not trials:
+        return 0.0, 1.0
+
+    share = successes / trials
+    denominator = 1 + z ** 2 / trials
+    centre = (share + z ** 2 / (2 * trials)) / denominator
+    margin = z * np.sqrt(share * (1 - share) / trials
+                         + z ** 2 / (4 * trials ** 2)) / denominator
+
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+def finalize_report(df: pd.DataFrame, path: str = REPORT_PATH):
     """
     ## **Function**
     ----------
@@ -371,6 +1592,10 @@ def finalize_report(df: pd.DataFrame):
 
     `df`:
         Dataframe that contains the report data
+
+    `path`:
+        Folder in which the report is saved.
+
     `return`:
         Returns nothing
     """
@@ -378,11 +1603,10 @@ def finalize_report(df: pd.DataFrame):
     if df.empty:
         print("No issues found")
 
-    path = r"application/chalicelib/reports"
-
     time_string = time.strftime("%Y%m%d-%H%M%S")
     new_name = "error_report"
     random_id = random.randint(1000, 9999)
+    os.makedirs(path, exist_ok=True)
     full_path = os.path.join(path, f"{new_name}-{time_string}-{random_id}")
 
     try:
@@ -1,4 +1,6 @@
+import io
 import os
+import threading
 import pytest
 import pandas as pd
 
@@ -75,3 +77,44 @@ def generate_example_file_path():
     """
     return os.path.join(os.path.split(os.path.abspath(__file__))[0],
                         "test_data/population_by_country_2020.csv")
+
+
+class FakeS3Client(object):
+
+    """
+    Class is a minimal in-memory stand-in for the boto3 S3 client of the
+    handler, the batch worker and the partitioned uploads. The objects are
+    kept as bytes by key, the downloaded keys and the threads that uploaded
+    objects are recorded.
+    """
+
+    def __init__(self, objects: dict = None):
+        self.objects = dict(objects or {})
+        self.downloads = []
+        self.threads = set()
+
+    def get_object(self, Bucket, Key):
+        self.downloads.append(Key)
+        return {"Body": io.BytesIO(self.objects[Key]),
+                "ContentLength": len(self.objects[Key])}
+
+    def put_object(self, Bucket, Key, Body):
+        self.threads.add(threading.get_ident())
+        self.objects[Key] = Body.read() if hasattr(Body, "read") else Body
+
+    def delete_object(self, Bucket, Key):
+        del self.objects[Key]
+
+    def delete_objects(self, Bucket, Delete):
+        for item in Delete["Objects"]:
+            del self.objects[item["Key"]]
+
+    def get_paginator(self, name):
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                yield {"Contents": [{"Key": key} for key in client.objects
+                                    if key.startswith(Prefix)]}
+
+        return Paginator()
@@ -0,0 +1,67 @@
+import io
+import json
+import threading
+
+import pandas as pd
+
+from application.chalicelib.iso3166 import converter
+from application.chalicelib.test.fixtures import FakeS3Client
+
+EVENT = {"Records": [{"s3": {"bucket": {"name": "input"},
+                             "object": {"key": "file.csv"}}}]}
+
+
+def _handle(monkeypatch, data):
+    from application import app
+
+    client = FakeS3Client({"file.csv": data})
+    monkeypatch.setattr(app, "s3_client", client)
+    monkeypatch.setattr(app, "idempotency_store", None)
+
+    app.handle_object_creation(EVENT, None)
+
+    return client
+
+
+def test_handler_uploads_data_and_report(monkeypatch):
+    client = _handle(monkeypatch,
+                     b"country,code\nCanada,CA\nCroatia,HR\nGermany,DE\n")
+
+    assert sorted(key.split("/")[0] for key in client.objects
+                  if key != "file.csv") == ["error_report", "silver"]
+    assert threading.get_ident() not in client.threads
+
+
+def test_handler_uploads_fuzzy_match_counts(monkeypatch):
+    client = _handle(monkeypatch,
+                     b"country,code\nCanada,CA\nCanadaa,CA\nCroatia,HR\n")
+
+    keys = [key for key in client.objects if key.startswith("match_counts/")]
+    assert len(keys) == 1
+    assert ["canadaa", "CA", 1] in json.loads(client.objects[keys[0]])
+    assert not converter.FUZZY_MATCH_COUNTS
+
+
+def test_handler_spools_only_chunked_files(monkeypatch):
+    from application import app
+
+    spools = []
+
+    class RecordingSpool(app.ParquetSpool):
+        def add(self, df):
+            spools.append(len(df))
+            super().add(df)
+
+    monkeypatch.setattr(app, "ParquetSpool", RecordingSpool)
+
+    outputs = []
+    for chunksize in (None, 2):
+        monkeypatch.setattr(app, "plan_chunksize",
+                            lambda *args, size=chunksize: size)
+        client = _handle(monkeypatch,
+                         b"country,code\nCanada,CA\nCroatia,HR\nGermany,DE\n")
+        outputs.append(pd.read_parquet(io.BytesIO(
+            client.objects["silver/file.csv"])))
+
+    assert spools == [2, 1]
+    pd.testing.assert_frame_equal(outputs[0], outputs[1])
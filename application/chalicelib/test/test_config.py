@@ -0,0 +1,17 @@
+from application.chalicelib.core.config import ApplicationSettings
+
+
+def test_create_client_uses_shared_config():
+    settings = ApplicationSettings()
+    settings.MAX_POOL_CONNECTIONS = 48
+    settings.S3_ENDPOINT_URL = "http://localhost:4566"
+
+    client = settings.create_client("s3")
+    config = client.meta.config
+
+    assert client.meta.endpoint_url == "http://localhost:4566"
+    assert config.max_pool_connections == 48
+    assert config.tcp_keepalive is settings.TCP_KEEPALIVE
+    assert config.retries["mode"] == settings.RETRY_MODE
+    assert config.read_timeout == settings.READ_TIMEOUT
+
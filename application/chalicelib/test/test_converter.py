@@ -1,8 +1,16 @@
+import os
+import shutil
 import pytest
 import pandas as pd
 import numpy as np
 
-from application.chalicelib.iso3166.converter import country_name_conversion
+from application.chalicelib.iso3166 import converter
+from application.chalicelib.iso3166.aliases import ALIAS_PATH, \
+    load_aliases, promote_matches, save_match_counts
+from application.chalicelib.iso3166.normalize import normalize_name, \
+    normalize_names
+from application.chalicelib.iso3166.converter import country_name_conversion, \
+    resolve_country_index, project_fields
 from application.chalicelib.error.exceptions import AutoDetectionError
 
 
@@ -161,3 +169,147 @@ def test_country_name_conversion_wrong_data_type_slow_mode():
     df = country_name_conversion(test_df, fast_mode=False)
     assert isinstance(df, pd.DataFrame)
 
+
+def test_country_name_conversion_aliases():
+    test_df = pd.DataFrame(
+        {"messy_country": ["Korea, South", "USA", "Canada"]})
+
+    df = country_name_conversion(test_df)
+
+    assert list(df.iloc[:, -2]) == ["Republic of Korea",
+                                    "United States of America", "Canada"]
+    assert list(df.iloc[:, -1]) == ["KR", "US", "CA"]
+
+
+def test_fuzzy_matches_are_counted():
+    converter.FUZZY_MATCH_COUNTS.clear()
+    test_df = pd.DataFrame({"messy_country": ["Canada", "Canadaa"]})
+
+    country_name_conversion(test_df)
+
+    assert converter.FUZZY_MATCH_COUNTS[("canadaa", "CA")] > 0
+
+    counts = converter.take_match_counts()
+    assert counts[("canadaa", "CA")] > 0
+    assert not converter.FUZZY_MATCH_COUNTS
+
+
+def test_promote_matches(tmp_path):
+    alias_path = os.path.join(tmp_path, "country_alias.json")
+    counts_path = os.path.join(tmp_path, "match_counts.json")
+    shutil.copy(ALIAS_PATH, alias_path)
+    version, _ = load_aliases(alias_path)
+
+    save_match_counts({("canadaa", "CA"): 3, ("croatai", "HR"): 1},
+                      counts_path)
+    save_match_counts({("canadaa", "CA"): 2, ("bosna", "BA"): 5,
+                       ("bosna", "BW"): 5}, counts_path)
+
+    assert promote_matches(counts_path, min_count=5, path=alias_path) == 1
+
+    new_version, aliases = load_aliases(alias_path)
+    assert new_version == version + 1
+    assert aliases["canadaa"] == "CA"
+    assert "croatai" not in aliases
+    assert "bosna" not in aliases
+
+
+def test_resolve_country_index_matches_distinct_values_once(monkeypatch):
+    calls = []
+    find_country_index = converter._find_country_index
+
+    def counting_find(val, *args):
+        calls.append(val)
+        return find_country_index(val, *args)
+
+    monkeypatch.setattr(converter, "_find_country_index", counting_find)
+    reference = (converter.REFERENCE["name"],)
+
+    country_index = resolve_country_index(
+        pd.Series(["Canada", "Croatia", "Canada", np.nan]), reference, 70)
+    official, alpha_3 = project_fields(country_index,
+                                       ("official", "alpha-3"))
+
+    assert calls == ["canada", "croatia"]
+    assert list(official[:3]) == ["Canada", "Republic of Croatia", "Canada"]
+    assert list(alpha_3) == ["CAN", "HRV", "CAN", None]
+
+
+def test_country_name_conversion_clean_column_skips_fuzzy(monkeypatch):
+    def fail_fuzzy(*args, **kwargs):
+        raise AssertionError("Fuzzy matching was used")
+
+    monkeypatch.setattr(converter, "_find_best_distance", fail_fuzzy)
+    test_df = pd.DataFrame(
+        {"messy_country": ["Canada", "Croatia", "Germany", "Canadaa"]})
+
+    df = country_name_conversion(test_df, fast_mode=False,
+                                 exact_coverage=0.75)
+
+    assert list(df.iloc[:, -1]) == ["CA", "HR", "DE", "None"]
+
+
+def test_resolve_country_index_fuzzy_sample(monkeypatch):
+    calls = []
+    find_best_distance = converter._find_best_distance
+
+    def record_fuzzy(country, *args, **kwargs):
+        calls.append(country)
+        return find_best_distance(country, *args, **kwargs)
+
+    monkeypatch.setattr(converter, "_find_best_distance", record_fuzzy)
+    values = pd.Series(["Canada", "Canadaa", "Canadda", "Germanyy",
+                        "Canadaaa", "Canadaa"])
+    target_column = (converter.REFERENCE["name"],)
+
+    country_index = resolve_country_index(values, target_column, 70,
+                                          fuzzy_sample=0.5)
+    official, = project_fields(country_index, ("official",))
+
+    # Two of the three "c" values and the only "g" value are sampled
+    assert len(calls) == 3
+    assert official[0] == "Canada"
+    assert list(official).count("Deferred") in (1, 2)
+    assert country_index.attrs["fuzzy_sample"] == {"sampled": 3,
+                                                   "unmatched": 0}
+
+
+def test_normalize_names():
+    values = pd.Series(["Åland  Islands", "ALAND islands", np.nan, 1])
+
+    normalized = normalize_names(values)
+
+    assert list(normalized[:2]) == ["alandislands", "alandislands"]
+    assert pd.isna(normalized[2])
+    assert normalized[3] == "1"
+    assert normalize_name("Côte d'Ivoire") == "coted'ivoire"
+
+
+def test_detect_columns_large_sample():
+    rng = np.random.default_rng(0)
+    rows = 5_000
+    picks = rng.integers(len(converter.DATA), size=rows)
+
+    test_df = pd.DataFrame(
+        {"id": np.arange(rows).astype(str),
+         "note": rng.choice(["pending", "done", "n/a"], size=rows),
+         "country": converter.DATA["name"].to_numpy()[picks],
+         "code": converter.DATA["alpha-2"].to_numpy()[picks]})
+
+    _, name_column, code_column = converter.detect_columns(test_df,
+                                                           sample_size=500)
+
+    assert (name_column, code_column) == ("country", "code")
+    assert converter.REFERENCE_SETS["alpha-3"] == \
+        frozenset(converter.REFERENCE["alpha-3"])
+
+
+def test_detect_columns_alias_only_names():
+    test_df = pd.DataFrame({"id": ["1", "2", "3"],
+                            "country": ["USA", "UK", "U.S.A."]})
+
+    option, name_column, _ = converter.detect_columns(test_df)
+    df = converter.country_name_conversion(test_df)
+
+    assert (option, name_column) == ("name", "country")
+    assert list(df.iloc[:, -1]) == ["US", "GB", "US"]
@@ -0,0 +1,123 @@
+import io
+
+import pandas as pd
+
+from application.chalicelib.iso3166.converter import country_name_conversion
+from application.chalicelib.iso3166.deferred import collect_deferred, \
+    resolve_deferred, apply_corrections
+from application.chalicelib.test.fixtures import FakeS3Client
+
+
+def _exact_only(values):
+    test_df = pd.DataFrame({"messy_country": values})
+
+    return country_name_conversion(test_df, fast_mode=False,
+                                   fuzzy_sample=0.0)
+
+
+def test_exact_only_pass_defers_unmatched_values():
+    df = _exact_only(["Canada", "Canadaa", "Germanyy", "Canadaa"])
+
+    assert list(df.iloc[:, -1]) == ["CA", "Deferred", "Deferred", "Deferred"]
+    assert df.attrs["fuzzy_sample"] == {"sampled": 0, "unmatched": 0}
+
+    deferred = collect_deferred(df)
+
+    assert list(deferred["value"]) == ["Canadaa", "Germanyy"]
+
+
+def test_resolve_and_apply_corrections():
+    df = _exact_only(["Canada", "Canadaa", "Germanyy", "Xyzzy"])
+
+    corrections = resolve_deferred(collect_deferred(df))
+    df = apply_corrections(df, corrections)
+
+    assert list(df.iloc[:, -1]) == ["CA", "CA", "DE", "None"]
+    assert list(df.iloc[:, -2])[:3] == ["Canada", "Canada",
+                                        "Federal Republic of Germany"]
+
+
+SCHEDULED_EVENT = {"version": "0", "account": "123", "region": "eu-west-1",
+                   "detail": {}, "detail-type": "Scheduled Event",
+                   "source": "aws.events", "time": "2024-01-01T00:00:00Z",
+                   "id": "event", "resources": []}
+
+
+def _queue(entries):
+    queued = {}
+    for key, values in entries:
+        buffer = io.BytesIO()
+        collect_deferred(_exact_only(values)).to_parquet(buffer)
+        queued[key] = buffer.getvalue()
+
+    return queued
+
+
+def test_resolve_deferred_queue_writes_corrections(monkeypatch):
+    from application import app
+
+    client = FakeS3Client(_queue(
+        (("deferred/a.csv/20240101-000000-0000000a.parquet",
+          ["Canada", "Canadaa"]),
+         ("deferred/b.csv/20240101-000000-0000000b.parquet",
+          ["Canada", "Canadaa", "Germanyy"]))))
+    monkeypatch.setattr(app, "s3_client", client)
+    monkeypatch.setattr(app.settings, "DEFER_FUZZY", True)
+
+    app.resolve_deferred_queue(SCHEDULED_EVENT, None)
+
+    assert sorted(client.objects) == ["corrections/a.csv",
+                                      "corrections/b.csv"]
+    corrections = pd.read_parquet(io.BytesIO(client.objects[
+        "corrections/b.csv"]))
+    assert list(corrections["country_code"]) == ["CA", "DE"]
+
+
+def test_resolve_deferred_queue_batches_reuploads(monkeypatch):
+    from application import app
+
+    client = FakeS3Client(_queue(
+        (("deferred/dir/a.csv/20240101-000000-0000000a.parquet",
+          ["Canada", "Canadaa"]),
+         ("deferred/dir/a.csv/20240102-000000-0000000b.parquet",
+          ["Canada", "Germanyy"]))))
+    monkeypatch.setattr(app, "s3_client", client)
+    monkeypatch.setattr(app.settings, "DEFER_FUZZY", True)
+    monkeypatch.setattr(app.settings, "DEFERRED_BATCH_SIZE", 1)
+
+    app.resolve_deferred_queue(SCHEDULED_EVENT, None)
+
+    # The newest upload of the input is resolved last
+    assert list(client.objects) == ["corrections/dir/a.csv"]
+    corrections = pd.read_parquet(io.BytesIO(client.objects[
+        "corrections/dir/a.csv"]))
+    assert list(corrections["country_code"]) == ["DE"]
+
+
+def test_resolve_deferred_queue_without_defer_fuzzy(monkeypatch):
+    from application import app
+
+    class UnlistedS3Client(FakeS3Client):
+        def get_paginator(self, name):
+            raise AssertionError("the bucket was listed")
+
+    client = UnlistedS3Client(_queue(
+        (("deferred/a.csv/20240101-000000-0000000a.parquet",
+          ["Canada", "Canadaa"]),)))
+    monkeypatch.setattr(app, "s3_client", client)
+    monkeypatch.setattr(app.settings, "DEFER_FUZZY", False)
+
+    app.resolve_deferred_queue(SCHEDULED_EVENT, None)
+
+    assert list(client.objects) == [
+        "deferred/a.csv/20240101-000000-0000000a.parquet"]
+
+
+def test_deferred_keys_are_unique():
+    from application import app
+
+    first = app._deferred_key("dir/a.csv", "20240101-000000")
+    second = app._deferred_key("dir/a.csv", "20240101-000000")
+
+    assert first != second
+    assert app._deferred_input_key(first) == "dir/a.csv"
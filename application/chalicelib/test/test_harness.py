@@ -0,0 +1,20 @@
+import pytest
+
+pytest.importorskip("moto")
+
+from application import harness  # noqa: E402
+
+
+def test_replay_synthetic_corpus():
+    stats = harness.replay(harness.synthetic_corpus(objects=3, rows=50))
+
+    assert stats["objects"] == 3
+    assert 0 < stats["p50"] <= stats["p99"] <= stats["max"]
+    assert stats["objects_per_second"] > 0
+
+
+def test_synthetic_corpus_is_reproducible():
+    first = list(harness.synthetic_corpus(objects=2, rows=10, seed=1))
+    second = list(harness.synthetic_corpus(objects=2, rows=10, seed=1))
+
+    assert first == second
@@ -0,0 +1,145 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from botocore.exceptions import ClientError
+
+from application.chalicelib.core.idempotency import idempotency_key, \
+    IdempotencyStore, LocalFileIdempotencyStore, DynamoDBIdempotencyStore
+from application.chalicelib.test.fixtures import FakeS3Client
+
+KEY = "bucket/file.csv:abc:10"
+
+
+class FakeDynamoDBClient:
+    """Minimal stand-in for the boto3 DynamoDB client."""
+
+    def __init__(self):
+        self.items = {}
+
+    def get_item(self, TableName, Key, ConsistentRead):
+        item = self.items.get((TableName, Key["id"]["S"]))
+        return {"Item": item} if item else {}
+
+    def put_item(self, TableName, Item, ConditionExpression=None,
+                 ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None):
+        current = self.items.get((TableName, Item["id"]["S"]))
+
+        # Evaluates the claim condition of the store
+        if ConditionExpression is not None and current is not None:
+            values = ExpressionAttributeValues
+            if not (current.get("status") == values[":processing"]
+                    and float(current["claimed_at"]["N"])
+                    < float(values[":expired"]["N"])):
+                raise ClientError({"Error": {
+                    "Code": "ConditionalCheckFailedException"}}, "PutItem")
+
+        self.items[(TableName, Item["id"]["S"])] = Item
+
+    def delete_item(self, TableName, Key):
+        self.items.pop((TableName, Key["id"]["S"]), None)
+
+
+def test_idempotency_key_ignores_etag_quotes():
+    assert idempotency_key("bucket", "file.csv", '"abc"', 10) == \
+        idempotency_key("bucket", "file.csv", "abc", 10)
+
+
+def test_local_file_idempotency_store(tmp_path):
+    path = os.path.join(tmp_path, "store")
+    store = LocalFileIdempotencyStore(path)
+
+    assert store.claim(KEY)
+    assert not store.claim(KEY)
+    assert not store.seen(KEY)
+
+    store.release(KEY)
+    assert store.claim(KEY)
+    store.mark(KEY)
+
+    assert LocalFileIdempotencyStore(path).seen(KEY)
+    assert not LocalFileIdempotencyStore(path).claim(KEY)
+    assert not store.seen("bucket/file.csv:def:10")
+
+
+def test_local_file_idempotency_store_concurrent_claims(tmp_path):
+    store = LocalFileIdempotencyStore(os.path.join(tmp_path, "store"))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        claims = list(executor.map(store.claim, [KEY] * 32))
+
+    assert claims.count(True) == 1
+
+
+def test_local_file_idempotency_store_expired_claim(tmp_path):
+    store = LocalFileIdempotencyStore(os.path.join(tmp_path, "store"),
+                                      claim_timeout=-1)
+
+    assert store.claim(KEY)
+    assert store.claim(KEY)
+
+    store.mark(KEY)
+    assert not store.claim(KEY)
+
+
+def test_dynamodb_idempotency_store():
+    store = DynamoDBIdempotencyStore(FakeDynamoDBClient(), "table")
+
+    assert store.claim(KEY)
+    assert not store.claim(KEY)
+    assert not store.seen(KEY)
+
+    store.release(KEY)
+    assert store.claim(KEY)
+    store.mark(KEY)
+
+    assert store.seen(KEY)
+    assert not store.claim(KEY)
+
+
+def test_idempotency_store_is_abstract():
+    with pytest.raises(TypeError):
+        IdempotencyStore()
+
+
+def test_handle_object_creation_skips_duplicates(tmp_path, monkeypatch):
+    from application import app
+
+    client = FakeS3Client()
+    store = LocalFileIdempotencyStore(os.path.join(tmp_path, "store"))
+    store.mark(idempotency_key(app.settings.INPUT_BUCKET, "file.csv",
+                               "abc", 10))
+    monkeypatch.setattr(app, "idempotency_store", store)
+    monkeypatch.setattr(app, "s3_client", client)
+
+    event = {"Records": [{"s3": {"bucket": {"name": "input"},
+                                 "object": {"key": "file.csv",
+                                            "eTag": "abc",
+                                            "size": 10}}}]}
+
+    app.handle_object_creation(event, None)
+
+    assert client.downloads == []
+
+
+def test_handle_object_creation_releases_failed_claims(tmp_path,
+                                                      monkeypatch):
+    from application import app
+
+    # The object is missing from the bucket, so the download fails
+    store = LocalFileIdempotencyStore(os.path.join(tmp_path, "store"))
+    monkeypatch.setattr(app, "idempotency_store", store)
+    monkeypatch.setattr(app, "s3_client", FakeS3Client())
+
+    event = {"Records": [{"s3": {"bucket": {"name": "input"},
+                                 "object": {"key": "file.csv",
+                                            "eTag": "abc",
+                                            "size": 10}}}]}
+
+    with pytest.raises(KeyError):
+        app.handle_object_creation(event, None)
+
+    # The retry can claim the object again
+    assert store.claim(idempotency_key(app.settings.INPUT_BUCKET,
+                                       "file.csv", "abc", 10))
@@ -1,7 +1,15 @@
+import io
 import os
+import json
+import shutil
+import tracemalloc
 import pandas as pd
 
 from application.chalicelib import factory
+from application.chalicelib.__main__ import main
+from application.chalicelib.iso3166.utils import DetailedReportWriter, \
+    ParquetSpool
+from application.chalicelib.iso3166.aliases import ALIAS_PATH, load_aliases
 from application.chalicelib.test.fixtures import generate_file_path,\
     generate_folder_path, generate_output_folder_path,\
     generate_example_file_path
@@ -47,3 +55,319 @@ def test_name_stand_factory(generate_output_folder_path,
     assert type(df) == pd.DataFrame
     assert df["country_name_final"][0] == "People's Republic of China"
     assert df["country_code_final"][0] == "CN"
+
+
+def test_lambda_name_stand_factory_json_lines():
+    data = io.BytesIO(b'{"country": "Canada", "code": "CA"}\n'
+                      b'{"country": "Croatia", "code": "HR"}\n'
+                      b'{"country": "Germany", "code": "DE"}\n')
+
+    df, _ = factory.lambda_name_standardization_factory(data,
+                                                        "test_file.jsonl")
+
+    assert len(df) == 3
+    assert list(df["country_code_final"]) == ["CA", "HR", "DE"]
+
+
+def test_name_stand_factory_manifest_skips_processed_files(
+        generate_folder_path, tmp_path, monkeypatch):
+    manifest_path = os.path.join(tmp_path, "manifest.json")
+    output_path = os.path.join(tmp_path, "output")
+    os.mkdir(output_path)
+
+    factory.name_standardization_factory(generate_folder_path, output_path,
+                                         manifest_path=manifest_path)
+    first_run = sorted(os.listdir(output_path))
+
+    def fail_read(path):
+        raise AssertionError(f"{path} was processed again")
+
+    monkeypatch.setattr(factory.iso3166.utils, "read_data", fail_read)
+    factory.name_standardization_factory(generate_folder_path, output_path,
+                                         manifest_path=manifest_path)
+
+    assert first_run == ["test_data1.csv.parquet", "test_data2.csv.parquet"]
+    assert sorted(os.listdir(output_path)) == first_run
+
+
+def test_cli_glob_input(generate_folder_path, tmp_path, capsys):
+    output_path = os.path.join(tmp_path, "output")
+
+    exit_code = main(["convert",
+                      os.path.join(generate_folder_path, "*.csv"),
+                      "--output", output_path,
+                      "--format", "csv",
+                      "--chunksize", "100",
+                      "--report-dir", str(tmp_path),
+                      "--profile"])
+
+    assert exit_code == 0
+    assert sorted(os.listdir(output_path)) == ["test_data1.csv.csv",
+                                               "test_data2.csv.csv"]
+
+    stderr = capsys.readouterr().err
+    assert "rows/s" in stderr
+    assert "convert" in stderr
+
+
+def test_cli_mapping_output(generate_folder_path, tmp_path):
+    output_path = os.path.join(tmp_path, "output")
+
+    main(["convert",
+          os.path.join(generate_folder_path, "test_data1.csv"),
+          "--output", output_path,
+          "--output-mode", "mapping",
+          "--row-index",
+          "--report-dir", str(tmp_path)])
+
+    assert sorted(os.listdir(output_path)) == [
+        "test_data1.csv.mapping.parquet", "test_data1.csv.rows.parquet"]
+
+    table = pd.read_parquet(os.path.join(output_path,
+                                         "test_data1.csv.mapping.parquet"))
+    rows = pd.read_parquet(os.path.join(output_path,
+                                        "test_data1.csv.rows.parquet"))
+
+    assert list(rows["mapping_row"]) == list(range(len(table)))
+    assert list(table.columns[-2:]) == ["country_name_final",
+                                        "country_code_final"]
+
+
+def test_cli_chunked_file_with_changing_column_types(
+        generate_example_file_path, tmp_path):
+    output_path = os.path.join(tmp_path, "output")
+
+    exit_code = main(["convert", generate_example_file_path,
+                      "--output", output_path,
+                      "--chunksize", "50",
+                      "--report-dir", str(tmp_path)])
+
+    assert exit_code == 0
+    name = os.path.basename(generate_example_file_path)
+    output = pd.read_parquet(os.path.join(output_path, f"{name}.parquet"))
+
+    assert len(output) == len(pd.read_csv(generate_example_file_path))
+    assert "N.A." in set(output["Fert. Rate"])
+    assert output.attrs["detection"]["name_column"] is not None
+
+
+def test_cli_chunked_mapping_output_as_csv(generate_example_file_path,
+                                           tmp_path):
+    output_path = os.path.join(tmp_path, "output")
+    name = os.path.basename(generate_example_file_path)
+
+    main(["convert", generate_example_file_path,
+          "--output", output_path,
+          "--output-mode", "mapping",
+          "--row-index",
+          "--format", "csv",
+          "--chunksize", "50",
+          "--report-dir", str(tmp_path)])
+
+    rows = pd.read_csv(os.path.join(output_path, f"{name}.rows.csv"))
+
+    assert len(rows) == len(pd.read_csv(generate_example_file_path))
+
+
+def test_standardize_file_streams_memory_mapped_inputs(
+        generate_example_file_path, tmp_path, monkeypatch):
+    source = pd.read_csv(generate_example_file_path)
+    source["Fert. Rate"] = source["Fert. Rate"].astype(str)
+    source.to_parquet(os.path.join(tmp_path, "population.parquet"))
+    source.to_feather(os.path.join(tmp_path, "population.arrow"))
+
+    chunks = []
+
+    class RecordingSpool(ParquetSpool):
+        def add(self, df):
+            chunks.append(len(df))
+            super().add(df)
+
+    monkeypatch.setattr(factory.iso3166.utils, "ParquetSpool",
+                        RecordingSpool)
+
+    for name in ("population.parquet", "population.arrow"):
+        chunks.clear()
+        _, output_path, rows = factory.standardize_file(
+            os.path.join(tmp_path, name), name,
+            os.path.join(tmp_path, "output"),
+            factory.iso3166.utils.generate_report_template(), chunksize=50)
+
+        assert chunks == [50, 50, 50, 50, 35]
+        assert rows == len(source)
+        assert len(pd.read_parquet(output_path)) == len(source)
+
+
+def test_cli_same_file_names_in_different_folders(tmp_path):
+    for folder, country in (("a", "Canada"), ("b", "Croatia")):
+        os.makedirs(os.path.join(tmp_path, "input", folder))
+        pd.DataFrame({"country": [country]}).to_csv(
+            os.path.join(tmp_path, "input", folder, "data.csv"), index=False)
+    output_path = os.path.join(tmp_path, "output")
+
+    main(["convert", os.path.join(tmp_path, "input", "**", "*.csv"),
+          "--output", output_path,
+          "--report-dir", str(tmp_path)])
+
+    assert sorted(os.listdir(output_path)) == ["a", "b"]
+    for folder, code in (("a", "CA"), ("b", "HR")):
+        df = pd.read_parquet(os.path.join(output_path, folder,
+                                          "data.csv.parquet"))
+        assert list(df.iloc[:, -1]) == [code]
+
+
+def test_cli_match_counts_and_promote(tmp_path):
+    input_path = os.path.join(tmp_path, "dirty.csv")
+    pd.DataFrame({"country": ["Canada", "Canadaa", "Canadaa", "Croatia"]}
+                 ).to_csv(input_path, index=False)
+    alias_path = os.path.join(tmp_path, "country_alias.json")
+    shutil.copy(ALIAS_PATH, alias_path)
+
+    main(["convert", input_path,
+          "--output", os.path.join(tmp_path, "output"),
+          "--report-dir", str(tmp_path)])
+
+    counts_path = os.path.join(tmp_path, "fuzzy_match_counts.json")
+    with open(counts_path) as fh:
+        assert ["canadaa", "CA", 1] in json.load(fh)
+
+    assert main(["promote", counts_path, "--min-count", "1",
+                 "--aliases", alias_path]) == 0
+    assert load_aliases(alias_path)[1]["canadaa"] == "CA"
+
+
+DIRTY_JSON_LINES = (b'{"country": "Canada", "code": "CA"}\n'
+                    b'{"country": "Xyzzy", "code": "QQ"}\n'
+                    b'{"country": "Croatia", "code": "HR"}\n'
+                    b'{"country": "Xyzzy", "code": "QQ"}\n'
+                    b'{"country": "Germany", "code": "DE"}\n')
+
+
+def test_lambda_name_stand_factory_detailed_report_rows():
+    writer = DetailedReportWriter(io.BytesIO())
+
+    factory.lambda_name_standardization_factory(
+        io.BytesIO(DIRTY_JSON_LINES), "test_file.jsonl", chunksize=3,
+        report_writer=writer)
+    report = pd.read_parquet(writer.close())
+
+    assert list(report["row"]) == [1, 3]
+    assert list(report["value"]) == ["Xyzzy", "Xyzzy"]
+
+
+def test_lambda_name_stand_factory_detailed_report_values():
+    writer = DetailedReportWriter(io.BytesIO(), aggregate=True)
+
+    factory.lambda_name_standardization_factory(
+        io.BytesIO(DIRTY_JSON_LINES), "test_file.jsonl", chunksize=3,
+        report_writer=writer)
+    report = pd.read_parquet(writer.close())
+
+    assert report.to_dict("records") == [{"value": "Xyzzy", "count": 2}]
+
+
+def test_lambda_name_stand_factory_streams_chunks_to_sinks():
+    expected, expected_report = factory.lambda_name_standardization_factory(
+        io.BytesIO(DIRTY_JSON_LINES), "test_file.jsonl", chunksize=2)
+
+    spool = ParquetSpool()
+    df, report = factory.lambda_name_standardization_factory(
+        io.BytesIO(DIRTY_JSON_LINES), "test_file.jsonl", chunksize=2,
+        chunk_sinks=[spool])
+    output = pd.read_parquet(io.BytesIO(spool.close(df.attrs).read()))
+    spool.discard()
+
+    assert df.empty and list(df.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(output, expected)
+    assert output.attrs["reference"] == expected.attrs["reference"]
+    pd.testing.assert_frame_equal(report.drop(columns="time"),
+                                  expected_report.drop(columns="time"))
+
+
+def _streamed_peak(rows):
+    data = io.BytesIO("country,code,comment\n".join(
+        ["", "".join(f"{country},{code},row {i} of the file\n"
+                     for i, (country, code) in zip(
+                         range(rows), [("Canada", "CA"), ("Xyzzy", "QQ"),
+                                       ("Germany", "DE")] * rows))]
+    ).encode())
+
+    spool = ParquetSpool()
+    tracemalloc.start()
+    try:
+        df, _ = factory.lambda_name_standardization_factory(
+            data, "test_file.csv", chunksize=1000, chunk_sinks=[spool])
+        spool.close(df.attrs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        spool.discard()
+
+    return peak
+
+
+def test_lambda_name_stand_factory_streaming_memory_is_bounded():
+    # Four times the rows (and chunks) of the file barely raise the peak
+    small = _streamed_peak(8_000)
+    large = _streamed_peak(32_000)
+
+    assert large < 1.5 * small
+
+
+def test_lambda_name_stand_factory_matches_values_once_per_file(
+        monkeypatch):
+    from application.chalicelib.iso3166 import converter
+
+    calls = []
+    find_country_index = converter._find_country_index
+
+    def counting(value, *args, **kwargs):
+        calls.append(value)
+        return find_country_index(value, *args, **kwargs)
+
+    monkeypatch.setattr(converter, "_find_country_index", counting)
+
+    factory.lambda_name_standardization_factory(
+        io.BytesIO(DIRTY_JSON_LINES * 4), "test_file.jsonl", chunksize=2)
+
+    assert "xyzzy" in calls
+    assert len(calls) == len(set(calls))
+
+
+def test_lambda_name_stand_factory_samples_values_once_per_file():
+    data = (b'{"country": "Canada", "code": "CA"}\n'
+            b'{"country": "Xyzzy", "code": "CA"}\n'
+            b'{"country": "Xyzzq", "code": "CA"}\n'
+            b'{"country": "Croatia", "code": "HR"}\n'
+            b'{"country": "Xyzzq", "code": "HR"}\n'
+            b'{"country": "Xyzzy", "code": "HR"}\n')
+
+    df, _ = factory.lambda_name_standardization_factory(
+        io.BytesIO(data), "test_file.jsonl", chunksize=3, fuzzy_sample=0.5)
+    expected, _ = factory.lambda_name_standardization_factory(
+        io.BytesIO(data), "test_file.jsonl", fuzzy_sample=0.5)
+
+    assert df.attrs["fuzzy_sample"] == expected.attrs["fuzzy_sample"]
+    assert list(df.iloc[:, -1] == "Deferred") == \
+        list(expected.iloc[:, -1] == "Deferred")
+
+
+def test_lambda_name_stand_factory_streams_changing_column_types(
+        generate_example_file_path):
+    with open(generate_example_file_path, "rb") as fh:
+        data = fh.read()
+
+    spool = ParquetSpool()
+    df, _ = factory.lambda_name_standardization_factory(
+        io.BytesIO(data), "population.csv", chunksize=50,
+        chunk_sinks=[spool])
+    output = pd.read_parquet(io.BytesIO(spool.close(df.attrs).read()))
+    spool.discard()
+
+    expected, _ = factory.lambda_name_standardization_factory(
+        io.BytesIO(data), "population.csv")
+
+    assert len(output) == len(expected)
+    assert "N.A." in set(output["Fert. Rate"])
+    assert list(output["country_code_final"]) == \
+        list(expected["country_code_final"])
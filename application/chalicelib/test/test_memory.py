@@ -0,0 +1,29 @@
+from application.chalicelib.core.memory import estimate_footprint, \
+    plan_chunksize, peak_rss_mb, MIN_CHUNKSIZE
+
+MB = 1024 ** 2
+
+
+def test_estimate_footprint_accounts_for_compression():
+    assert estimate_footprint("file.csv.gz", MB) > \
+        estimate_footprint("file.csv", MB)
+
+
+def test_plan_chunksize_in_memory_path():
+    assert plan_chunksize("file.csv", MB, 1024 * MB) is None
+
+
+def test_plan_chunksize_chunked_path():
+    small = plan_chunksize("file.csv", 1024 * MB, 512 * MB)
+    large = plan_chunksize("file.csv", 1024 * MB, 2048 * MB)
+
+    assert MIN_CHUNKSIZE <= small < large
+
+
+def test_plan_chunksize_unchunked_file_type():
+    # A json document can only be parsed as a whole
+    assert plan_chunksize("file.json", 1024 * MB, 512 * MB) is None
+
+
+def test_peak_rss_mb():
+    assert peak_rss_mb() > 0
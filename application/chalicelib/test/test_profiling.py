@@ -0,0 +1,67 @@
+import os
+import time
+import pstats
+import pytest
+
+from application.chalicelib.core.profiling import Profiler, profiled
+
+
+def slow_function(event):
+    time.sleep(0.05)
+    return event
+
+
+def test_profiled_disabled_returns_function():
+    assert profiled(0, sink=None)(slow_function) is slow_function
+
+
+def test_profiled_writes_pstats(tmp_path):
+    profiles = {}
+    handler = profiled(1, sink=profiles.__setitem__)(slow_function)
+
+    assert handler("event") == "event"
+
+    (name, payload), = profiles.items()
+    path = os.path.join(tmp_path, name)
+    with open(path, "wb") as fh:
+        fh.write(payload)
+
+    assert name.startswith("slow_function-") and name.endswith(".prof")
+    assert any(func[2] == "slow_function"
+               for func in pstats.Stats(path).stats)
+
+
+def test_profiler_collapsed_stacks():
+    with Profiler("collapsed", interval=0.001) as profiler:
+        slow_function(None)
+
+    lines = profiler.dump().decode().splitlines()
+
+    assert lines
+    assert any("slow_function (test_profiling.py)" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def failing_sink(name, payload):
+    raise ConnectionError("upload failed")
+
+
+def test_profiled_sink_errors_keep_the_result():
+    handler = profiled(1, sink=failing_sink)(slow_function)
+
+    assert handler("event") == "event"
+
+
+def test_profiled_sink_errors_keep_the_exception():
+    def failing_function(event):
+        raise KeyError(event)
+
+    handler = profiled(1, sink=failing_sink)(failing_function)
+
+    with pytest.raises(KeyError):
+        handler("event")
+
+
+def test_profiled_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        profiled(1, sink=print, profile_format="svg")
@@ -0,0 +1,141 @@
+import os
+import json
+
+import pytest
+import pandas as pd
+
+from application.chalicelib.__main__ import main
+from application.chalicelib.iso3166 import converter
+from application.chalicelib.iso3166.restandardize import restandardize, \
+    restandardize_file, read_attrs
+from application.chalicelib.iso3166.utils import load_partitioned_to_s3
+from application.chalicelib.error.exceptions import FileSavingError
+from application.chalicelib.test.fixtures import FakeS3Client
+
+
+def _convert():
+    test_df = pd.DataFrame({"country": ["Canada", "Zzyzx", "Germany",
+                                        "Zzyzx"]})
+
+    return converter.country_name_conversion(test_df, fuzzy_threshold=95,
+                                             fast_mode=False)
+
+
+def _add_alias(monkeypatch):
+    canada = int(converter.DATA.index[converter.DATA["alpha-2"] == "CA"][0])
+    monkeypatch.setitem(converter.ALIAS_INDEX, "zzyzx", canada)
+    monkeypatch.setattr(converter, "REFERENCE_VERSION", "changed")
+
+
+def test_conversion_records_reference():
+    df = _convert()
+    reference = df.attrs["reference"]
+    mapping = json.loads(reference["mapping"])
+
+    assert reference["version"] == converter.REFERENCE_VERSION
+    assert reference["outputs"] == {"name": "country_name_final",
+                                    "code": "country_code_final"}
+    assert mapping["name"]["canada"] == ["Canada", "CA"]
+    assert mapping["name"]["zzyzx"] is None
+
+
+def test_restandardize_rewrites_changed_rows(monkeypatch):
+    df = _convert()
+    untouched = df.copy()
+    _add_alias(monkeypatch)
+
+    df, rows = restandardize(df)
+
+    assert rows == 2
+    assert list(df.iloc[:, -1]) == ["CA", "CA", "DE", "CA"]
+    assert df.iloc[[0, 2]].equals(untouched.iloc[[0, 2]])
+    assert df.attrs["reference"]["version"] == "changed"
+    assert json.loads(df.attrs["reference"]["mapping"])["name"]["zzyzx"] \
+        == ["Canada", "CA"]
+
+
+def test_restandardize_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "silver.parquet")
+    _convert().to_parquet(path)
+
+    assert restandardize_file(path) == 0
+
+    _add_alias(monkeypatch)
+
+    assert restandardize_file(path) == 2
+    assert list(pd.read_parquet(path).iloc[:, -1]) == ["CA", "CA", "DE",
+                                                       "CA"]
+    assert read_attrs(path)["reference"]["version"] == "changed"
+    assert restandardize_file(path) == 0
+
+
+def test_cli_restandardize(tmp_path, monkeypatch, capsys):
+    _convert().to_parquet(str(tmp_path / "silver.parquet"))
+    _add_alias(monkeypatch)
+
+    assert main(["restandardize", str(tmp_path / "*.parquet")]) == 0
+    assert "2 rows rewritten" in capsys.readouterr().err
+
+
+def test_restandardize_file_without_changed_values(tmp_path, monkeypatch):
+    path = str(tmp_path / "silver.parquet")
+    test_df = pd.DataFrame({"country": ["Canada", "Germanyy"]})
+    converter.country_name_conversion(test_df, fast_mode=False).to_parquet(
+        path)
+    converter.take_match_counts()
+    monkeypatch.setattr(converter, "REFERENCE_VERSION", "changed")
+
+    assert restandardize_file(path) == 0
+    assert read_attrs(path)["reference"]["version"] == "changed"
+    assert list(pd.read_parquet(path).iloc[:, -1]) == ["CA", "DE"]
+
+    # The recorded values were matched again without being counted
+    assert not converter.take_match_counts()
+
+
+def _write_partitions(df, path):
+    client = FakeS3Client()
+    load_partitioned_to_s3(client, "bucket", "silver", df)
+
+    for key, body in client.objects.items():
+        os.makedirs(os.path.dirname(os.path.join(path, key)), exist_ok=True)
+        with open(os.path.join(path, key), "wb") as fh:
+            fh.write(body)
+
+    return os.path.join(path, "silver", "country_code={}",
+                        "part-0.parquet").format
+
+
+def test_restandardize_partitioned_output(tmp_path, monkeypatch):
+    partition = _write_partitions(_convert(), str(tmp_path))
+    _add_alias(monkeypatch)
+
+    # The unmatched rows would need to move to the CA partition
+    with pytest.raises(FileSavingError):
+        restandardize_file(partition("__HIVE_DEFAULT_PARTITION__"))
+
+    untouched = pd.read_parquet(partition("__HIVE_DEFAULT_PARTITION__"))
+    assert list(untouched["country"]) == ["Zzyzx", "Zzyzx"]
+    assert list(untouched["country_name_final"]) == ["None", "None"]
+
+    # Partitions without changed values only record the new version
+    assert restandardize_file(partition("CA")) == 0
+    df = pd.read_parquet(partition("CA"))
+    assert list(df.columns) == ["country", "country_name_final"]
+    assert list(df["country"]) == ["Canada"]
+    assert read_attrs(partition("CA"))["reference"]["version"] == "changed"
+
+
+def test_restandardize_partition_without_code_change(monkeypatch):
+    df = _convert().drop(columns="country_code_final")
+    mapping = json.loads(df.attrs["reference"]["mapping"])
+    mapping["name"]["canada"] = ["Former name of Canada", "CA"]
+    df.attrs["reference"] = {**df.attrs["reference"], "version": "old",
+                             "mapping": json.dumps(mapping)}
+
+    df, rows = restandardize(df)
+
+    assert rows == 1
+    assert list(df["country"]) == ["Canada", "Zzyzx", "Germany", "Zzyzx"]
+    assert df["country_name_final"][0] == "Canada"
+    assert list(df.columns) == ["country", "country_name_final"]
@@ -0,0 +1,89 @@
+import json
+import pytest
+import numpy as np
+import pandas as pd
+
+from application.chalicelib.iso3166.scorers import scorers
+from application.chalicelib.iso3166.utils import calculate_levenshtein_ratio
+from application.chalicelib.iso3166.converter import country_name_conversion
+from application.chalicelib.iso3166.restandardize import diff_mappings
+from application.chalicelib.error.exceptions import DistanceCalculationError
+
+CANDIDATES = np.array(["canada", "croatia", "republicofcroatia",
+                       "unitedstates", "unitedstatesvirginislands", ""],
+                      dtype=object)
+
+
+def test_levenshtein_scores_match_pairwise_ratio():
+    scores = scorers.get("levenshtein")("canadaa", CANDIDATES[:-1])
+
+    expected = [calculate_levenshtein_ratio("canadaa", c)
+                for c in CANDIDATES[:-1]]
+    assert np.allclose(scores, expected)
+
+
+def test_jaro_winkler_scores():
+    scores = scorers.get("jaro_winkler")("martha",
+                                         np.array(["marhta", "", "martha"]))
+
+    assert np.allclose(scores, [0.9611111, 0.0, 1.0])
+
+
+def test_bigram_dice_scores_ignore_word_order():
+    scores = scorers.get("bigram_dice")("croatiarepublicof", CANDIDATES)
+
+    assert scores.argmax() == 2
+    assert scores[-1] == 0
+
+
+def test_token_set_scores_ignore_word_order_and_extra_words():
+    candidates = np.array(["canada", "croatia", "republic of croatia",
+                           "united states virgin islands", ""], dtype=object)
+
+    scores = scorers.get("token_set")("islands virgin united states",
+                                      candidates)
+    assert scores.argmax() == 3
+    assert scores[3] == 1.0
+
+    scores = scorers.get("token_set")("croatia republic", candidates)
+    assert list(scores[1:3]) == [1.0, 1.0]
+    assert scores[-1] == 0
+
+
+def test_prefix_scores_prefer_shorter_completion():
+    scores = scorers.get("prefix")("unitedsta", CANDIDATES)
+
+    assert scores.argmax() == 3
+
+
+@pytest.mark.parametrize("scorer", ["jaro_winkler", "token_set",
+                                    "bigram_dice", "prefix"])
+def test_country_name_conversion_scorers(scorer):
+    test_df = pd.DataFrame({"messy_country": ["Canada", "Canadaa"]})
+
+    df = country_name_conversion(test_df, scorer=scorer)
+
+    assert list(df.iloc[:, -1]) == ["CA", "CA"]
+
+
+def test_country_name_conversion_token_set_records_words():
+    test_df = pd.DataFrame({"messy_country": [
+        "Canada", "Islands Virgin United States", "Kingdom United"]})
+
+    df = country_name_conversion(test_df, scorer="token_set",
+                                 fast_mode=False)
+
+    assert list(df.iloc[:, -1]) == ["CA", "VI", "GB"]
+    assert json.loads(df.attrs["reference"]["words"]) == {
+        "islandsvirginunitedstates": "islands virgin united states",
+        "kingdomunited": "kingdom united"}
+
+    # The recorded words repeat the matches without the data
+    assert not any(diff_mappings(df.attrs)[1].values())
+
+
+def test_country_name_conversion_unknown_scorer():
+    test_df = pd.DataFrame({"messy_country": ["Canada"]})
+
+    with pytest.raises(DistanceCalculationError):
+        country_name_conversion(test_df, scorer="unknown")
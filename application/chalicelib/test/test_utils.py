@@ -1,16 +1,27 @@
 import io
 import os
+import bz2
+import gzip
+import json
 import types
+import tracemalloc
 import pytest
 import pandas as pd
 import boto3
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from application.chalicelib.iso3166.utils import read_data, \
     calculate_levenshtein_ratio, export_to_parquet, generate_report_template, \
-    update_reporting, read_s3_data, load_to_s3
+    update_reporting, read_s3_data, load_to_s3, load_partitioned_to_s3, \
+    wilson_interval, mapping_table, ParquetSpool, MappingSpool
+from application.chalicelib.iso3166 import readers
+from application.chalicelib.iso3166.readers import read_csv, \
+    read_json_lines, split_extension, read_fixed_width, infer_colspecs, \
+    ColspecCache, read_arrow, read_parquet, read_body
 
 from application.chalicelib.test.fixtures import generate_file_path, \
-    generate_folder_path, generate_output_folder_path
+    generate_folder_path, generate_output_folder_path, FakeS3Client
 
 
 def test_read_s3_data(generate_file_path):
@@ -165,6 +176,29 @@ def test_update_reporting():
     assert isinstance(report, pd.DataFrame)
 
 
+def test_update_reporting_estimates_deferred_rows():
+    test_df = pd.DataFrame(
+        {"country_name": ["Canada", "None", "Deferred", "Deferred"],
+         "country_code": ["CA", "None", "Deferred", "Deferred"]})
+    test_df.attrs["fuzzy_sample"] = {"sampled": 4, "unmatched": 2}
+
+    report = update_reporting(test_df, generate_report_template(),
+                              "FileName", detailed=False)
+
+    assert list(report["count_missing"]) == [1, 1]
+    assert list(report["estimated_missing_rate"]) == [0.5, 0.5]
+    assert (report["missing_rate_low"] < 0.5).all()
+    assert (report["missing_rate_high"] > 0.5).all()
+
+
+def test_wilson_interval():
+    low, high = wilson_interval(0, 10)
+
+    assert low == 0.0
+    assert 0.0 < high < 0.5
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+
+
 def test_update_reporting_no_none():
     report_template = generate_report_template()
     test_df = pd.DataFrame(
@@ -181,3 +215,412 @@ def test_update_reporting_no_none():
         detailed=detailed)
 
     assert isinstance(report, pd.DataFrame)
+
+
+def test_load_partitioned_to_s3():
+    client = FakeS3Client()
+    test_df = pd.DataFrame(
+        {"messy_country": ["Canada", "Croatia", "Canada", "nothing"],
+         "country_name": ["Canada", "Republic of Croatia", "Canada", "None"],
+         "country_code": ["CA", "HR", "CA", "None"]})
+
+    load_partitioned_to_s3(client, "bucket", "silver/file.csv", test_df)
+
+    assert sorted(client.objects) == [
+        "silver/file.csv/country_code=CA/part-0.parquet",
+        "silver/file.csv/country_code=HR/part-0.parquet",
+        "silver/file.csv/country_code=__HIVE_DEFAULT_PARTITION__/"
+        "part-0.parquet"]
+
+    partition = pd.read_parquet(io.BytesIO(
+        client.objects["silver/file.csv/country_code=CA/part-0.parquet"]))
+    assert len(partition) == 2
+    assert "country_code" not in partition.columns
+
+
+def test_load_partitioned_to_s3_too_many_partitions():
+    client = FakeS3Client()
+    test_df = pd.DataFrame(
+        {"country_name": ["Republic of Croatia", "Canada"],
+         "country_code": ["HR", "CA"]})
+
+    load_partitioned_to_s3(client, "bucket", "silver/file.csv", test_df,
+                           max_partitions=1)
+
+    assert list(client.objects) == ["silver/file.csv/part-0.parquet"]
+    df = pd.read_parquet(io.BytesIO(
+        client.objects["silver/file.csv/part-0.parquet"]))
+    assert list(df["country_code"]) == ["CA", "HR"]
+
+
+def test_load_partitioned_to_s3_row_groups_and_stale_layout():
+    client = FakeS3Client()
+    test_df = pd.DataFrame(
+        {"country_name_final": ["Canada", "Republic of Croatia"] * 50,
+         "country_code_final": ["CA", "HR"] * 50})
+
+    load_partitioned_to_s3(client, "bucket", "silver/file.csv", test_df)
+    assert "silver/file.csv/country_code=CA/part-0.parquet" in \
+        client.objects
+
+    # A rerun in the single file layout replaces the partitions
+    load_partitioned_to_s3(client, "bucket", "silver/file.csv", test_df,
+                           max_partitions=1, row_group_size=10)
+
+    assert list(client.objects) == ["silver/file.csv/part-0.parquet"]
+    metadata = pq.ParquetFile(io.BytesIO(
+        client.objects["silver/file.csv/part-0.parquet"])).metadata
+    assert metadata.num_row_groups == 10
+    assert metadata.row_group(0).column(1).statistics.max == "CA"
+
+
+def test_parquet_spool_partitions_chunks():
+    client = FakeS3Client()
+    chunks = [pd.DataFrame({"id": [0, 1], "note": [None, None],
+                            "country_code_final": ["CA", "None"]}),
+              pd.DataFrame({"id": [2, 3], "note": ["x", None],
+                            "country_code_final": ["HR", "CA"]})]
+    chunks[0].attrs["detection"] = {"option": "name"}
+
+    spool = ParquetSpool(partitioned=True)
+    for chunk in chunks:
+        spool.add(chunk)
+    spool.upload_partitioned(client, "bucket", "silver/file.csv",
+                             attrs=chunks[0].attrs)
+    spool.discard()
+
+    partition = pd.read_parquet(io.BytesIO(client.objects[
+        "silver/file.csv/country_code=CA/part-0.parquet"]))
+    assert list(partition["id"]) == [0, 3]
+    assert "country_code_final" not in partition.columns
+    assert partition.attrs["detection"] == {"option": "name"}
+
+    # Too many partitions are combined into one file sorted by the code
+    single = ParquetSpool(partitioned=True)
+    for chunk in chunks:
+        single.add(chunk)
+    df = pd.read_parquet(io.BytesIO(single.close().read()))
+    single.discard()
+
+    assert list(df["id"]) == [0, 3, 2, 1]
+    assert list(df["note"]) == [None, None, "x", None]
+
+
+def test_parquet_spool_promotes_changed_column_types():
+    spool = ParquetSpool()
+    spool.add(pd.DataFrame({"rate": [1.5, 2.0], "count": [1, 2],
+                            "note": [None, None]}))
+    spool.add(pd.DataFrame({"rate": ["N.A.", "3.5"], "count": [3.5, None],
+                            "note": [None, "x"]}))
+    df = pd.read_parquet(io.BytesIO(spool.close().read()))
+    spool.discard()
+
+    assert list(df["rate"]) == ["1.5", "2", "N.A.", "3.5"]
+    assert list(df["count"][:3]) == [1.0, 2.0, 3.5]
+    assert list(df["note"]) == [None, None, None, "x"]
+
+
+def test_mapping_spool_matches_mapping_table():
+    test_df = pd.DataFrame(
+        {"messy_country": ["Canada", "Croatia", "Canada", "nothing", None,
+                           "Croatia"],
+         "country_name_final": ["Canada", "Republic of Croatia", "Canada",
+                                "None", "None", "Republic of Croatia"],
+         "country_code_final": ["CA", "HR", "CA", "None", "None", "HR"]})
+    test_df.attrs["detection"] = {"option": "name",
+                                  "name_column": "messy_country",
+                                  "code_column": "country_code"}
+
+    spool = MappingSpool(row_index=True)
+    for start in range(0, len(test_df), 2):
+        spool.add(test_df.iloc[start:start + 2])
+    table, rows = spool.close(test_df.attrs)
+    rows = pd.read_parquet(io.BytesIO(rows.read()))
+    spool.discard()
+
+    expected_table, expected_rows = mapping_table(test_df, row_index=True)
+    pd.testing.assert_frame_equal(table, expected_table)
+    pd.testing.assert_frame_equal(rows, expected_rows)
+
+
+def test_mapping_table():
+    test_df = pd.DataFrame(
+        {"id": range(5),
+         "messy_country": ["Canada", "Croatia", "Canada", "nothing", None],
+         "country_name_final": ["Canada", "Republic of Croatia", "Canada",
+                                "None", "None"],
+         "country_code_final": ["CA", "HR", "CA", "None", "None"]})
+    test_df.attrs["detection"] = {"option": "name",
+                                  "name_column": "messy_country",
+                                  "code_column": "country_code"}
+
+    table, rows = mapping_table(test_df, row_index=True)
+
+    assert list(table.columns) == ["messy_country", "country_name_final",
+                                   "country_code_final"]
+    assert list(table["country_code_final"]) == ["CA", "HR", "None", "None"]
+    assert list(rows["mapping_row"]) == [0, 1, 0, 2, 3]
+    assert table.attrs["detection"] == test_df.attrs["detection"]
+    assert mapping_table(test_df)[1] is None
+
+
+def test_read_csv_sampled_detected_columns_as_strings():
+    data = io.BytesIO(b"country,code,population\n"
+                      b"Canada,CA,38\nCroatia,HR,4\n")
+
+    df = read_csv(data, sample_rows=1)
+
+    assert df["country"].dtype == object
+    assert df["code"].dtype == object
+    assert df["population"].dtype == "int64"
+
+
+def test_read_csv_sampled_pyarrow_engine(generate_file_path):
+    df = read_csv(generate_file_path, engine="pyarrow", categorical=True)
+
+    assert isinstance(df, pd.DataFrame)
+    assert len(df) == len(pd.read_csv(generate_file_path))
+
+
+JSON_LINES = (b'{"country": "Canada", "code": "CA"}\n'
+              b'{"country": "Croatia", "code": "HR"}\n'
+              b'\n'
+              b'{"country": "Germany", "code": "DE"}\n')
+
+
+def test_read_json_lines_chunks():
+    frames = list(read_json_lines(io.BytesIO(JSON_LINES), chunksize=2))
+
+    assert [len(df) for df in frames] == [2, 1]
+    assert list(frames[1]["country"]) == ["Germany"]
+
+
+def test_read_json_lines_fast_parser(monkeypatch):
+    monkeypatch.setattr(readers, "fast_json", json)
+
+    frames = list(read_json_lines(io.BytesIO(JSON_LINES), chunksize=2))
+
+    assert [len(df) for df in frames] == [2, 1]
+
+
+def test_read_s3_data_json_lines_streaming_body(monkeypatch):
+    from botocore.response import StreamingBody
+
+    # More than one 1 KiB block of the body, so lines span the blocks
+    monkeypatch.setattr(readers, "fast_json", json)
+    data = JSON_LINES * 40
+    body = StreamingBody(io.BytesIO(data), len(data))
+
+    frames = list(read_s3_data("test_file.jsonl", body))
+
+    assert sum(len(df) for df in frames) == 120
+    assert list(frames[0]["code"][:3]) == ["CA", "HR", "DE"]
+    assert not body.closed
+
+
+def test_read_s3_data_json_lines():
+    data = read_s3_data("test_file.ndjson", io.BytesIO(JSON_LINES))
+
+    assert isinstance(data, types.GeneratorType)
+    assert sum(len(df) for df in data) == 3
+
+
+class NonSeekableStream(io.RawIOBase):
+    """Stand-in for a S3 response body, which cannot be rewound."""
+
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self._data.readinto(buffer)
+
+
+def test_split_extension():
+    assert split_extension("folder/file.csv.gz") == (".csv", "gzip")
+    assert split_extension("file.json.zst") == (".json", "zstd")
+    assert split_extension("file.txt.bz2") == (".txt", "bz2")
+    assert split_extension("file.csv") == (".csv", None)
+
+
+def test_read_s3_data_gzip_stream(generate_file_path):
+    with open(generate_file_path, "rb") as fh:
+        raw = fh.read()
+
+    df = read_s3_data("test_file.csv.gz",
+                      NonSeekableStream(gzip.compress(raw)))
+
+    assert len(df) == len(pd.read_csv(generate_file_path))
+
+
+def test_read_s3_data_bz2_json_lines():
+    data = read_s3_data("test_file.jsonl.bz2",
+                        NonSeekableStream(bz2.compress(JSON_LINES)))
+
+    assert sum(len(df) for df in data) == 3
+
+
+def test_read_data_compressed_file(tmp_path, generate_file_path):
+    compressed_path = os.path.join(tmp_path, "test_data.csv.gz")
+    with open(generate_file_path, "rb") as fh, \
+            gzip.open(compressed_path, "wb") as out:
+        out.write(fh.read())
+
+    df = next(read_data(compressed_path))
+
+    assert len(df) == len(pd.read_csv(generate_file_path))
+
+
+def zstd_compress(data):
+    sink = pa.BufferOutputStream()
+    with pa.CompressedOutputStream(sink, "zstd") as out:
+        out.write(data)
+    return sink.getvalue().to_pybytes()
+
+
+def test_read_data_zstd_json_file(tmp_path):
+    compressed_path = os.path.join(tmp_path, "test_data.json.zst")
+    with open(compressed_path, "wb") as out:
+        out.write(zstd_compress(
+            b'[{"country": "Canada"}, {"country": "Croatia"}]'))
+
+    df = next(read_data(compressed_path))
+
+    assert list(df["country"]) == ["Canada", "Croatia"]
+
+
+def test_read_s3_data_zstd_json_lines():
+    data = read_s3_data("test_file.jsonl.zst",
+                        NonSeekableStream(zstd_compress(JSON_LINES)))
+
+    assert sum(len(df) for df in data) == 3
+
+
+def test_read_data_compressed_file_closes_handle(tmp_path, monkeypatch,
+                                                 generate_file_path):
+    from application.chalicelib.iso3166 import utils
+
+    compressed_path = os.path.join(tmp_path, "test_data.csv.gz")
+    with open(generate_file_path, "rb") as fh, \
+            gzip.open(compressed_path, "wb") as out:
+        out.write(fh.read())
+
+    handles = []
+
+    def recording_open(*args, **kwargs):
+        handles.append(open(*args, **kwargs))
+        return handles[-1]
+
+    monkeypatch.setattr(utils, "open", recording_open, raising=False)
+
+    next(read_data(compressed_path))
+    assert handles[-1].closed
+
+    # Chunked reads close the file when the iteration is abandoned
+    chunks = next(read_data(compressed_path, chunksize=2))
+    next(chunks)
+    assert not handles[-1].closed
+    chunks.close()
+    assert handles[-1].closed
+
+
+FIXED_WIDTH = (b"country    code population\n"
+               b"Canada     CA   38\n"
+               b"Croatia    HR   4\n"
+               b"Germany    DE   83\n")
+
+
+def test_infer_colspecs():
+    lines = FIXED_WIDTH.decode().splitlines()
+
+    assert infer_colspecs(lines) == [(0, 7), (11, 15), (16, 26)]
+
+
+def test_read_fixed_width_chunks_and_cache(monkeypatch, tmp_path):
+    cache = ColspecCache(os.path.join(tmp_path, "colspecs.json"))
+
+    frames = list(read_fixed_width(NonSeekableStream(FIXED_WIDTH),
+                                   cache=cache, chunksize=2))
+
+    assert [len(df) for df in frames] == [2, 1]
+    assert list(frames[0].columns) == ["country", "code", "population"]
+
+    # Known layouts are read with the cached colspecs
+    monkeypatch.setattr(readers, "infer_colspecs", None)
+    reloaded = ColspecCache(cache.path)
+    df = next(read_fixed_width(io.BytesIO(FIXED_WIDTH), cache=reloaded))
+
+    assert list(df["code"]) == ["CA", "HR", "DE"]
+
+
+def test_read_data_arrow_memory_mapped(tmp_path):
+    test_df = pd.DataFrame({"country": ["Canada", "Croatia"],
+                            "code": ["CA", "HR"]})
+    file_path = os.path.join(tmp_path, "test_data.arrow")
+    test_df.to_feather(file_path)
+
+    df = next(read_data(file_path))
+
+    pd.testing.assert_frame_equal(df, test_df)
+
+
+def test_read_arrow_buffer(tmp_path):
+    test_df = pd.DataFrame({"country": ["Canada"], "code": ["CA"]})
+    buffer = io.BytesIO()
+    test_df.to_feather(buffer)
+    buffer.seek(0)
+
+    pd.testing.assert_frame_equal(read_arrow(buffer), test_df)
+
+
+def test_read_chunked_random_access_files(tmp_path):
+    test_df = pd.DataFrame({"country": ["Canada", "Croatia", "Germany"],
+                            "code": ["CA", "HR", "DE"]})
+    parquet_path = os.path.join(tmp_path, "file.parquet")
+    arrow_path = os.path.join(tmp_path, "file.arrow")
+    test_df.to_parquet(parquet_path, index=False)
+    test_df.to_feather(arrow_path)
+
+    for frames in (read_parquet(parquet_path, chunksize=2),
+                   read_arrow(arrow_path, chunksize=2)):
+        frames = list(frames)
+
+        assert [len(df) for df in frames] == [2, 1]
+        pd.testing.assert_frame_equal(
+            pd.concat(frames, ignore_index=True), test_df)
+
+
+def test_read_s3_data_csv_chunksize():
+    data = b"country,code\nCanada,CA\nCroatia,HR\nGermany,DE\n"
+
+    frames = list(read_s3_data("file.csv", io.BytesIO(data), chunksize=2))
+
+    assert [len(df) for df in frames] == [2, 1]
+
+
+def test_read_body_holds_object_once():
+    data = os.urandom(8 * 1024 ** 2)
+    stream = NonSeekableStream(data)
+
+    tracemalloc.start()
+    try:
+        buffer = read_body(stream, len(data), block_size=1024 ** 2)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert peak < 1.25 * len(data)
+    assert buffer.to_pybytes() == data
+
+
+def test_read_s3_data_parquet_buffer():
+    test_df = pd.DataFrame({"country": ["Canada", "Croatia"],
+                            "code": ["CA", "HR"]})
+    raw = test_df.to_parquet(index=False)
+
+    df = read_s3_data("file.parquet", pa.BufferReader(
+        read_body(io.BytesIO(raw), len(raw))))
+
+    pd.testing.assert_frame_equal(df, test_df)
@@ -0,0 +1,255 @@
+import sys
+import time
+import random
+import argparse
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import boto3
+import numpy as np
+import pandas as pd
+
+from . import app as chalice_app
+from .chalicelib.iso3166.converter import DATA
+
+# moto is a development dependency, the harness is not deployed
+try:
+    from moto import mock_aws
+except ImportError:
+    try:
+        from moto import mock_s3 as mock_aws
+    except ImportError:
+        mock_aws = None
+
+REGION = "us-east-1"
+
+
+def synthetic_corpus(objects: int = 20,
+                     rows: int = 1_000,
+                     typo_rate: float = 0.1,
+                     seed: int = 0) -> Iterator[Tuple[str, bytes]]:
+    """
+    ## **Function**
+    ----------
+
+    Generates csv uploads with a country name and code column. A share of
+    the names get a typo, so the fuzzy matching path is exercised as well.
+
+    ## **Parameters**
+    ----------
+
+    `objects`:
+        Number of generated objects.
+
+    `rows`:
+        Number of rows of each object.
+
+    `typo_rate`:
+        Share of the names with a typo.
+
+    `seed`:
+        Seed of the random generator, the same seed replays the same corpus.
+
+    `return Iterator[tuple[str, bytes]]`:
+        Returns the key and the content of each object.
+    """
+
+    rng = random.Random(seed)
+    names, codes = list(DATA["name"]), list(DATA["alpha-2"])
+
+    for i in range(objects):
+        picks = [rng.randrange(len(names)) for _ in range(rows)]
+        countries = [_typo(names[pick], rng) if rng.random() < typo_rate
+                     else names[pick] for pick in picks]
+
+        frame = pd.DataFrame({"id": range(rows),
+                              "country": countries,
+                              "code": [codes[pick] for pick in picks],
+                              "value": [rng.random() for _ in range(rows)]})
+
+        yield f"synthetic/object-{i:05d}.csv", \
+            frame.to_csv(index=False).encode()
+
+
+def _typo(value: str, rng: random.Random) -> str:
+    """
+    Drops or doubles one character of a value.
+    """
+
+    position = rng.randrange(len(value))
+    if rng.random() < 0.5:
+        return value[:position] + value[position + 1:]
+
+    return value[:position] + value[position] + value[position:]
+
+
+@contextmanager
+def s3_stand_in(server: bool = False):
+    """
+    ## **Function**
+    ----------
+
+    Starts an in-process S3 stand-in. The default mocks botocore inside the
+    process, the server mode runs a moto server on a local port so the
+    requests go through HTTP like they do against LocalStack.
+
+    ## **Parameters**
+    ----------
+
+    `server`:
+        Boolean value that determines if a moto server is started.
+
+    `return`:
+        Yields a boto3 S3 client connected to the stand-in.
+    """
+
+    if mock_aws is None:
+        raise ImportError("The harness needs moto, install the dev packages")
+
+    credentials = {"region_name": REGION,
+                   "aws_access_key_id": "testing",
+                   "aws_secret_access_key": "testing"}
+
+    if not server:
+        with mock_aws():
+            yield boto3.client("s3", **credentials)
+        return
+
+    from moto.server import ThreadedMotoServer
+
+    moto_server = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    moto_server.start()
+    try:
+        host, port = moto_server.get_host_and_port()
+        yield boto3.client("s3", endpoint_url=f"http://{host}:{port}",
+                           **credentials)
+    finally:
+        moto_server.stop()
+
+
+def replay(corpus: Iterable[Tuple[str, bytes]],
+           server: bool = False) -> Dict[str, float]:
+    """
+    ## **Function**
+    ----------
+
+    Uploads each object of the corpus to the stand-in and runs it through
+    `handle_object_creation`, like the S3 notification of a real upload.
+    The handler uses the client of the stand-in for the duration of the
+    replay, the idempotency store is disabled.
+
+    ## **Parameters**
+    ----------
+
+    `corpus`:
+        The key and content of each object, e.g. `synthetic_corpus()`.
+
+    `server`:
+        Boolean value that determines if a moto server is started.
+
+    `return dict[str, float]`:
+        Returns the latency percentiles and the throughput.
+    """
+
+    settings = chalice_app.settings
+    patched = {"s3_client": chalice_app.s3_client,
+               "idempotency_store": chalice_app.idempotency_store}
+    buckets = {"INPUT_BUCKET": settings.INPUT_BUCKET,
+               "OUTPUT_BUCKET": settings.OUTPUT_BUCKET}
+
+    latencies: List[float] = []
+    total_bytes = 0
+
+    with s3_stand_in(server) as client:
+        settings.INPUT_BUCKET = buckets["INPUT_BUCKET"] or "input"
+        settings.OUTPUT_BUCKET = buckets["OUTPUT_BUCKET"] or "output"
+        chalice_app.s3_client = client
+        chalice_app.idempotency_store = None
+
+        try:
+            for bucket in {settings.INPUT_BUCKET, settings.OUTPUT_BUCKET}:
+                client.create_bucket(Bucket=bucket)
+
+            start_time = time.perf_counter()
+
+            for key, body in corpus:
+                client.put_object(Bucket=settings.INPUT_BUCKET, Key=key,
+                                  Body=body)
+                event = {"Records": [{"s3": {
+                    "bucket": {"name": settings.INPUT_BUCKET},
+                    "object": {"key": key, "size": len(body)}}}]}
+
+                object_start = time.perf_counter()
+                chalice_app.handle_object_creation(event, None)
+                latencies.append(time.perf_counter() - object_start)
+                total_bytes += len(body)
+
+            elapsed = time.perf_counter() - start_time
+
+        finally:
+            for name, value in patched.items():
+                setattr(chalice_app, name, value)
+            for name, value in buckets.items():
+                setattr(settings, name, value)
+
+    return summarize(latencies, total_bytes, elapsed)
+
+
+def summarize(latencies: List[float], total_bytes: int,
+              elapsed: float) -> Dict[str, float]:
+    """
+    ## **Function**
+    ----------
+
+    Summarizes the latencies of a replay.
+
+    `return dict[str, float]`:
+        Returns the number of objects, the p50/p90/p99/max latency in
+        seconds, and the throughput in objects and megabytes per second.
+    """
+
+    if not latencies:
+        return {"objects": 0}
+
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    elapsed = max(elapsed, 1e-9)
+
+    return {"objects": len(latencies),
+            "p50": float(p50),
+            "p90": float(p90),
+            "p99": float(p99),
+            "max": max(latencies),
+            "objects_per_second": len(latencies) / elapsed,
+            "mb_per_second": total_bytes / 1024 ** 2 / elapsed}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    ## **Function**
+    ----------
+
+    Replays a synthetic corpus and prints the statistics, e.g.
+    `python -m application.harness --objects 100 --rows 10000`.
+    """
+
+    parser = argparse.ArgumentParser(prog="python -m application.harness")
+    parser.add_argument("--objects", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=1_000)
+    parser.add_argument("--typo-rate", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server", action="store_true",
+                        help="Replay over HTTP against a moto server.")
+    args = parser.parse_args(argv)
+
+    stats = replay(synthetic_corpus(args.objects, args.rows, args.typo_rate,
+                                    args.seed),
+                   server=args.server)
+
+    for name, value in stats.items():
+        print(f"{name:<20}{value:>12.4f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())